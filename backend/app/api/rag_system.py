@@ -2,13 +2,14 @@ import logging
 import numpy as np
 from openai import OpenAI
 import chromadb
-import faiss
 from typing import Optional, List, Dict, Any
 
 from app.config import settings, NodeType
-from app.pipeline.stages.structural_extractor import FaissIndex
+from app.pipeline.stages.structural_extractor import FaissIndex, EMBEDDING_MODEL
+from app.cache.strategies.embedding_cache import embedding_cache
 from app.graph.knowledge_graph import KnowledgeGraph
 from app.utils import retry_with_exponential_backoff
+from app.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -66,11 +67,11 @@ class GraphRAGSystem:
 
     @retry_with_exponential_backoff()
     def _embed_text(self, text: str) -> np.ndarray:
-        resp = self.openai.embeddings.create(
-            model="text-embedding-3-small",
-            input=text[:8000],
-        )
-        return np.array(resp.data[0].embedding, dtype=np.float32)
+        def request(texts: List[str]) -> List[np.ndarray]:
+            resp = metrics.track_llm_call("embedding", EMBEDDING_MODEL, self.openai.embeddings.create, input=texts[0])
+            return [np.array(resp.data[0].embedding, dtype=np.float32)]
+
+        return embedding_cache.get_or_compute(EMBEDDING_MODEL, [text[:8000]], request, caller="rag")[0]
 
     def query(
         self,
@@ -87,19 +88,10 @@ class GraphRAGSystem:
             }
 
         # 1. Embed query
-        query_vec = self._embed_text(question).reshape(1, -1)
-        faiss.normalize_L2(query_vec)
+        query_vec = self._embed_text(question)
 
         # 2. FAISS search
-        k = min(top_k_faiss, len(self.faiss.id_map))
-        D, I = self.faiss.index.search(query_vec, k)
-        
-        seed_ids = []
-        for i in I[0]:
-            if i != -1:
-                node_id = self.faiss.id_map[i]
-                if node_id not in seed_ids:
-                    seed_ids.append(node_id)
+        seed_ids = [node_id for node_id, _ in self.faiss.search(query_vec, top_k_faiss)]
 
         if not seed_ids:
             return {"response": "Nenhum documento relevante encontrado.", "context": ""}
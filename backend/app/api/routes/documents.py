@@ -7,6 +7,7 @@ import shutil
 from werkzeug.utils import secure_filename
 from app.cache.strategies.redis_cache import cache
 from app.pipeline.orchestrator import orchestrator
+from app.pipeline.job_store import job_store
 
 logger = logging.getLogger(__name__)
 
@@ -62,8 +63,18 @@ def list_documents():
 @router.post("/clear")
 def clear_repository():
     """
-    Clears all uploaded documents, cancels pending jobs, and flushes results cache.
+    Clears all uploaded documents, the job store (jobs, results, checkpoints), the result
+    exports and the results cache. Refused while jobs are queued or running: cancel them first.
     """
+    active = {j["id"] for j in orchestrator.jobs.values() if j.get("status") in ("queued", "processing")}
+    for status in ("queued", "processing"):
+        active.update(j["id"] for j in job_store.list_jobs(status=status))
+    if active:
+        raise HTTPException(
+            status_code=409,
+            detail=f"{len(active)} job(s) still queued or running; cancel them before clearing the repository",
+        )
+
     logger.info("Clearing repository and cache...")
     
     # 1. Delete uploaded files
@@ -78,14 +89,24 @@ def clear_repository():
         logger.error(f"Error deleting files: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to delete files: {str(e)}")
 
-    # 2. Clear job orchestrator
+    # 2. Clear jobs (in memory and in the job store) and their result exports
     orchestrator.jobs.clear()
+    deleted_jobs = job_store.clear()
+    for f in settings.RESULTS_DIR.glob("*.json"):
+        try:
+            os.remove(f)
+        except OSError as e:
+            logger.warning(f"Could not delete result export {f.name}: {e}")
     
     # 3. Invalidate result cache
     cache.invalidate_pattern("job_result_*")
+    cache.invalidate_pattern("job_full_state_*")
+    if orchestrator.job_queue is not None:
+        orchestrator.job_queue.clear_statuses()
     
     return {
         "status": "success",
         "message": "Repository and cache cleared successfully",
-        "deleted_files": deleted_files
+        "deleted_files": deleted_files,
+        "deleted_jobs": deleted_jobs,
     }
@@ -1,5 +1,7 @@
 from fastapi import APIRouter, HTTPException, status
+from typing import Optional
 from app.pipeline.orchestrator import orchestrator
+from app.pipeline.job_store import job_store
 from fastapi.responses import JSONResponse
 
 router = APIRouter()
@@ -9,7 +11,7 @@ def get_graph(job_id: str):
     """
     Get graph data for a completed job in Cytoscape.js format.
     """
-    job_status = orchestrator.get_job_status(job_id)
+    job_status = orchestrator.get_job_status(job_id, sections=["cytoscape", "graph_stats"])
     
     if job_status.get("status") == "not_found":
         raise HTTPException(status_code=404, detail="Job not found")
@@ -36,38 +38,12 @@ def get_graph(job_id: str):
     }
 
 @router.get("/")
-def list_jobs():
+def list_jobs(status: Optional[str] = None, since: Optional[float] = None, limit: Optional[int] = None):
     """
     List all persisted jobs with metadata.
+    Served from the job store index; result payloads are never loaded here.
     """
-    from app.config import settings
-    import json
-    import os
-    
-    jobs = []
     try:
-        if settings.RESULTS_DIR.exists():
-            for f in settings.RESULTS_DIR.glob("*.json"):
-                try:
-                    stats_args = f.stat()
-                    # Read minimal metadata
-                    with open(f, 'r', encoding='utf-8') as jf:
-                        data = json.load(jf)
-                        
-                    jobs.append({
-                        "id": data.get("id", f.stem),
-                        "status": data.get("status", "unknown"),
-                        "date": stats_args.st_mtime,
-                        "filenames": data.get("filenames", ["Unknown Document"]),
-                        "node_count": data.get("results", {}).get("graph_stats", {}).get("node_count", 0),
-                        "edge_count": data.get("results", {}).get("graph_stats", {}).get("edge_count", 0)
-                    })
-                except Exception as e:
-                    # Skip corrupted files
-                    continue
-                    
-        # Sort by date desc
-        jobs.sort(key=lambda x: x["date"], reverse=True)
-        return jobs
+        return job_store.list_jobs(status=status, since=since, limit=limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -16,10 +16,13 @@ import io
 from app.config import settings
 from app.api.seade_kb import SEADE_CONTEXT
 from app.pipeline.orchestrator import orchestrator
+from app.pipeline.job_store import job_store
 from app.utils import retry_with_exponential_backoff
+from app.metrics import metrics
 
 # For structural embeddings
-from app.pipeline.stages.structural_extractor import FaissIndex
+from app.pipeline.stages.structural_extractor import FaissIndex, EMBEDDING_MODEL
+from app.cache.strategies.embedding_cache import embedding_cache
 import chromadb
 
 # These were missing imports in the Flask version or part of the larger app
@@ -42,6 +45,9 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Result sections loaded for a chat session (the ontology and metrics are not needed)
+CHAT_SECTIONS = ["cytoscape", "graph_stats", "document_summary"]
+
 http_client = httpx.Client(verify=settings.VERIFY_SSL)
 client = OpenAI(
     api_key=settings.OPENAI_API_KEY,
@@ -171,32 +177,23 @@ Entidades mais conectadas (hubs):
 
 @retry_with_exponential_backoff()
 def _get_query_embedding(query: str, client: OpenAI) -> np.ndarray:
-    resp = client.embeddings.create(model="text-embedding-3-small", input=query[:8000])
-    return np.array(resp.data[0].embedding, dtype=np.float32)
+    def request(texts: List[str]) -> List[np.ndarray]:
+        resp = metrics.track_llm_call("embedding", EMBEDDING_MODEL, client.embeddings.create, input=texts[0])
+        return [np.array(resp.data[0].embedding, dtype=np.float32)]
+
+    return embedding_cache.get_or_compute(EMBEDDING_MODEL, [query[:8000]], request, caller="nadia")[0]
 
 def _get_structural_context(query: str, client: OpenAI) -> str:
     if not FaissIndex.exists():
         return ""
         
     try:
-        import faiss
-        
         faiss_idx = FaissIndex.load()
         if len(faiss_idx.id_map) == 0:
             return ""
             
-        q_vec = _get_query_embedding(query, client).reshape(1, -1)
-        faiss.normalize_L2(q_vec)
-        
-        k = min(5, len(faiss_idx.id_map))
-        D, I = faiss_idx.index.search(q_vec, k)
-        
-        top_ids = []
-        for i in I[0]:
-            if i != -1:
-                node_id = faiss_idx.id_map[i]
-                if node_id not in top_ids:
-                    top_ids.append(node_id)
+        q_vec = _get_query_embedding(query, client)
+        top_ids = [node_id for node_id, _ in faiss_idx.search(q_vec, 5)]
 
         if not top_ids:
             return ""
@@ -233,10 +230,11 @@ def _get_semantic_context(query: str, client: OpenAI) -> str:
             return ""
             
         # Search by query text (let Chroma use its default embedding function)
-        results = collection.query(
-            query_texts=[query],
-            n_results=4
-        )
+        with metrics.timer("vector_store_operation_duration_seconds", store="chroma_semantic", operation="query"):
+            results = collection.query(
+                query_texts=[query],
+                n_results=4
+            )
         
         docs = results.get("documents", [[]])[0]
         if not docs:
@@ -377,8 +375,8 @@ Escreva o resumo analítico:"""
 
     @retry_with_exponential_backoff()
     def _call_llm_summary(prompt, model):
-        return client.chat.completions.create(
-            model=model,
+        return metrics.track_llm_call(
+            "summary", model, client.chat.completions.create,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.3,
             max_tokens=800
@@ -388,6 +386,7 @@ Escreva o resumo analítico:"""
         response = _call_llm_summary(prompt, settings.OPENAI_MODEL)
         summary = response.choices[0].message.content or ""
         job["results"]["document_summary"] = summary
+        job_store.save_section(job_id, "document_summary", summary)
         logger.info(f"Document summary generated for job {job_id}: {len(summary)} chars")
         return summary
     except Exception as e:
@@ -413,7 +412,7 @@ async def chat(req: ChatRequest):
         edges = cytoscape.get("elements", {}).get("edges", [])
         logger.info(f"Nadia: Lite Mode — {len(nodes)} nodes, {len(edges)} edges")
     elif job_id:
-        job_obj = orchestrator.get_job_status(job_id)
+        job_obj = orchestrator.get_job_status(job_id, sections=CHAT_SECTIONS)
         if not job_obj or job_obj.get("status") != "completed":
             raise HTTPException(status_code=404, detail="Graph not found or not completed")
         stats = job_obj["results"].get("graph_stats", {})
@@ -425,7 +424,7 @@ async def chat(req: ChatRequest):
         if job_id and job_obj and not job_obj.get("results", {}).get("document_summary"):
             live_job = orchestrator.jobs.get(job_id, job_obj)
             _generate_document_summary(nodes, edges, job_id, live_job)
-            job_obj = orchestrator.get_job_status(job_id)
+            job_obj = orchestrator.get_job_status(job_id, sections=CHAT_SECTIONS)
     else:
         raise HTTPException(status_code=400, detail="job_id or cytoscape data is required")
 
@@ -457,7 +456,7 @@ async def chat(req: ChatRequest):
 
         @retry_with_exponential_backoff()
         def _call_llm_chat(msgs, model, temperature=0.4, max_tokens=700):
-            return client.chat.completions.create(model=model, messages=msgs, temperature=temperature, max_tokens=max_tokens)
+            return metrics.track_llm_call("chat", model, client.chat.completions.create, messages=msgs, temperature=temperature, max_tokens=max_tokens)
         
         fallback_res = _call_llm_chat(api_messages, settings.OPENAI_MODEL)
         answer = fallback_res.choices[0].message.content or ""
@@ -8,7 +8,7 @@ def get_ontology(job_id: str):
     """
     Get ontology data for a job.
     """
-    job_status = orchestrator.get_job_status(job_id)
+    job_status = orchestrator.get_job_status(job_id, sections=["ontology", "graph_stats"])
     
     if job_status.get("status") == "not_found":
         raise HTTPException(status_code=404, detail="Job not found")
@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException
+import json
+import asyncio
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from app.pipeline.orchestrator import orchestrator
+from app.pipeline.events import job_events
 from app.config import settings
 from pathlib import Path
 
@@ -10,6 +15,9 @@ router = APIRouter()
 class PipelineStartRequest(BaseModel):
     filenames: List[str]
     config: Optional[Dict[str, Any]] = {}
+    # Scheduling: jobs are served by priority class, then round-robin across submitters
+    submitter: Optional[str] = None
+    priority: Optional[str] = None  # "interactive" | "bulk" (default: by document count)
 
 @router.post("/start", status_code=202)
 def start_pipeline(req: PipelineStartRequest):
@@ -20,7 +28,7 @@ def start_pipeline(req: PipelineStartRequest):
     doc_paths = [settings.UPLOAD_DIR / f for f in req.filenames]
     
     # Start async job
-    job_id = orchestrator.start_job(doc_paths, req.config)
+    job_id = orchestrator.start_job(doc_paths, req.config, submitter=req.submitter, priority=req.priority)
     
     return {
         "job_id": job_id,
@@ -28,10 +36,109 @@ def start_pipeline(req: PipelineStartRequest):
         "message": "Pipeline started successfully"
     }
 
+@router.post("/append/{job_id}", status_code=202)
+def append_to_pipeline(job_id: str, req: PipelineStartRequest):
+    """
+    Adds documents to the graph of a completed job without reprocessing it: only the new
+    documents are extracted and merged. The new job holds the updated corpus graph.
+    """
+    if not req.filenames:
+        raise HTTPException(status_code=400, detail="No filenames provided")
+
+    doc_paths = [settings.UPLOAD_DIR / f for f in req.filenames]
+    result = orchestrator.append_job(job_id, doc_paths, req.config, submitter=req.submitter, priority=req.priority)
+    if result.get("status") == "not_found":
+        raise HTTPException(status_code=404, detail="Job not found")
+    if result.get("error"):
+        raise HTTPException(status_code=409, detail=result["error"])
+
+    return {
+        "job_id": result["job_id"],
+        "base_job_id": job_id,
+        "status": "queued",
+        "message": "Append job started successfully"
+    }
+
 @router.get("/status/{job_id}")
 def get_status(job_id: str):
-    status = orchestrator.get_job_status(job_id)
+    # Polling only needs the status body; result payloads are served by /graphs and /ontology
+    status = orchestrator.get_job_status(job_id, include_results=False)
     if status.get("status") == "not_found":
         raise HTTPException(status_code=404, detail="Job not found")
         
     return status
+
+# Seconds without events before a keep-alive comment is sent (keeps proxies from closing the stream)
+SSE_KEEPALIVE_SECONDS = 15
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@router.get("/events/{job_id}")
+async def stream_events(job_id: str, request: Request):
+    """
+    Server-sent events for a job: a "snapshot" with the current status, then "stage",
+    "progress" (progress, ETA, usage and usage_delta) and a final "status" event.
+    Replaces polling /status; result payloads are never sent on this stream.
+    """
+    # Subscribe before reading the snapshot so no event falls between the two
+    sub = job_events.subscribe(job_id)
+    status = await run_in_threadpool(orchestrator.get_job_status, job_id, False)
+    if status.get("status") == "not_found":
+        job_events.unsubscribe(job_id, sub)
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        try:
+            yield _sse("snapshot", status)
+            if status.get("status") in TERMINAL_STATUSES:
+                return
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    return
+                yield _sse(event["event"], event["data"])
+        finally:
+            job_events.unsubscribe(job_id, sub)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/resume/{job_id}", status_code=202)
+def resume_pipeline(job_id: str):
+    """
+    Resumes a failed or interrupted job from its last completed unit
+    (ingested documents, ontology and already extracted chunks are reused).
+    """
+    result = orchestrator.resume_job(job_id)
+    if result.get("status") == "not_found":
+        raise HTTPException(status_code=404, detail="Job not found")
+    if result.get("error"):
+        raise HTTPException(status_code=409, detail=result["error"])
+
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "restored_units": result.get("restored_units", 0),
+        "message": "Pipeline resumed successfully"
+    }
+
+@router.post("/cancel/{job_id}")
+def cancel_pipeline(job_id: str):
+    """
+    Cancels a queued or running job. A running job stops issuing LLM calls at its
+    next checkpoint and ends with status "cancelled" (it can later be resumed).
+    """
+    result = orchestrator.cancel_job(job_id)
+    if result.get("status") == "not_found":
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {"job_id": job_id, "status": result["status"]}
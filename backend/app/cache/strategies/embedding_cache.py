@@ -0,0 +1,220 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from app.config import settings
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# SQLite bound-parameter budget per IN (...) query
+_SQL_BATCH = 500
+
+
+def _tag(text_sha: str) -> int:
+    # Non-zero 64-bit tag written next to each vector; 0 marks a slot being rewritten
+    return int.from_bytes(bytes.fromhex(text_sha)[:8], "little") | 1
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model, sha256(text)), shared by ingestion and retrieval.
+
+    Vectors live in one memory-mapped float32 file per (model, dimension) under
+    CACHE_DIR/embeddings/ with EMBEDDING_CACHE_MAX_ENTRIES slots; a SQLite index maps keys to
+    slots and recycles the least recently used slot once the file is full. A tag array next to
+    the vectors lets readers in other processes (ingest workers) detect a slot rewritten while
+    they were reading it. Lookups are counted in embedding_cache_requests_total.
+    """
+
+    def __init__(self, directory: str | Path = None, max_entries: int = None):
+        self.directory = Path(directory or settings.CACHE_DIR / "embeddings")
+        self._max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+        self._lock = threading.RLock()
+        # (model, dim) -> (vectors, tags) memmaps
+        self._maps: Dict[Tuple[str, int], tuple] = {}
+        self._hits = 0
+        self._requests = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.EMBEDDING_CACHE_ENABLED
+
+    @property
+    def capacity(self) -> int:
+        return max(1, self._max_entries or settings.EMBEDDING_CACHE_MAX_ENTRIES)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection (and set of maps) per process: SQLite handles and mmaps must not be shared
+        # between processes (ingest pool, worker fleet), and pool processes forked from the
+        # forkserver inherit this module as the server preloaded it
+        if self._conn is None or self._pid != os.getpid():
+            self.directory.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.directory / "index.sqlite"), timeout=30,
+                                   check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " model TEXT NOT NULL, text_sha TEXT NOT NULL, dim INTEGER NOT NULL,"
+                " slot INTEGER NOT NULL, last_used_at REAL NOT NULL,"
+                " PRIMARY KEY (model, text_sha))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_slot ON entries (model, dim, slot)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (model, dim, last_used_at)")
+            # EMBEDDING_CACHE_MAX_ENTRIES may have been lowered since the files were created
+            conn.execute("DELETE FROM entries WHERE slot >= ?", (self.capacity,))
+            self._conn, self._pid, self._maps = conn, os.getpid(), {}
+        return self._conn
+
+    def _map(self, model: str, dim: int):
+        key = (model, dim)
+        if key not in self._maps:
+            stem = f"{re.sub(r'[^A-Za-z0-9_.-]', '_', model)}_{dim}"
+            arrays = []
+            for suffix, dtype, shape in ((".f32", np.float32, (self.capacity, dim)), (".tag", np.uint64, (self.capacity,))):
+                path = self.directory / f"{stem}{suffix}"
+                size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+                path.touch(exist_ok=True)
+                if path.stat().st_size < size:
+                    # Sparse file: disk is only used by the slots actually written
+                    os.truncate(path, size)
+                arrays.append(np.memmap(path, dtype=dtype, mode="r+", shape=shape))
+            self._maps[key] = tuple(arrays)
+        return self._maps[key]
+
+    def _get(self, model: str, shas: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        conn = self._connection()
+        for i in range(0, len(shas), _SQL_BATCH):
+            batch = shas[i : i + _SQL_BATCH]
+            marks = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT text_sha, dim, slot FROM entries WHERE model = ? AND text_sha IN ({marks})",
+                (model, *batch),
+            ).fetchall()
+            for text_sha, dim, slot in rows:
+                vectors, tags = self._map(model, dim)
+                expected = _tag(text_sha)
+                before = int(tags[slot])
+                vec = np.array(vectors[slot], dtype=np.float32)
+                if before == expected and int(tags[slot]) == expected:
+                    found[text_sha] = vec
+            hit = [s for s in batch if s in found]
+            if hit:
+                conn.execute(
+                    f"UPDATE entries SET last_used_at = ? WHERE model = ? AND text_sha IN ({','.join('?' * len(hit))})",
+                    (time.time(), model, *hit),
+                )
+        return found
+
+    def _put(self, model: str, items: List[Tuple[str, np.ndarray]]):
+        conn = self._connection()
+        touched = set()
+        # Writers serialize on the SQLite write lock (also across processes)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for text_sha, vec in items:
+                vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+                dim = vec.shape[0]
+                row = conn.execute(
+                    "SELECT slot FROM entries WHERE model = ? AND text_sha = ? AND dim = ?", (model, text_sha, dim)
+                ).fetchone()
+                if row is not None:
+                    slot = row[0]
+                else:
+                    slot = conn.execute(
+                        "SELECT COALESCE(MAX(slot) + 1, 0) FROM entries WHERE model = ? AND dim = ?", (model, dim)
+                    ).fetchone()[0]
+                    if slot >= self.capacity:
+                        # Full: recycle the least recently used slot
+                        lru_sha, slot = conn.execute(
+                            "SELECT text_sha, slot FROM entries WHERE model = ? AND dim = ? ORDER BY last_used_at LIMIT 1",
+                            (model, dim),
+                        ).fetchone()
+                        conn.execute("DELETE FROM entries WHERE model = ? AND text_sha = ?", (model, lru_sha))
+                vectors, tags = self._map(model, dim)
+                tags[slot] = 0
+                vectors[slot] = vec
+                tags[slot] = _tag(text_sha)
+                touched.add((model, dim))
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (model, text_sha, dim, slot, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                    (model, text_sha, dim, slot, time.time()),
+                )
+            for key in touched:
+                for array in self._maps[key]:
+                    array.flush()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_or_compute(
+        self,
+        model: str,
+        texts: List[str],
+        compute: Callable[[List[str]], List[np.ndarray]],
+        caller: str = None,
+    ) -> List[np.ndarray]:
+        """
+        Embeddings of `texts` (in order). Only the texts not in the cache are passed to
+        `compute` (once each, in order); its results are stored for the next lookup.
+        """
+        if not self.enabled or not texts:
+            return compute(texts) if texts else []
+
+        shas = [hashlib.sha256(t.encode("utf-8")).hexdigest() for t in texts]
+        unique = list(dict.fromkeys(shas))
+        try:
+            with self._lock:
+                found = self._get(model, unique)
+        except Exception as e:
+            logger.warning(f"Embedding cache lookup failed: {e}")
+            found = {}
+
+        text_by_sha = dict(zip(shas, texts))
+        missing = [s for s in unique if s not in found]
+        if missing:
+            vectors = compute([text_by_sha[s] for s in missing])
+            fresh = list(zip(missing, vectors))
+            found.update(fresh)
+            try:
+                with self._lock:
+                    self._put(model, fresh)
+            except Exception as e:
+                logger.warning(f"Embedding cache store failed: {e}")
+
+        hits = sum(1 for s in shas if s not in missing)
+        self._record(hits, len(shas), caller)
+        return [found[s] for s in shas]
+
+    def _record(self, hits: int, total: int, caller: Optional[str]):
+        if hits:
+            metrics.inc("embedding_cache_requests_total", hits, result="hit", caller=caller)
+        if total - hits:
+            metrics.inc("embedding_cache_requests_total", total - hits, result="miss", caller=caller)
+        with self._lock:
+            self._hits += hits
+            self._requests += total
+            metrics.set_gauge("embedding_cache_hit_ratio", self._hits / self._requests)
+
+    def stats(self) -> Dict[str, float]:
+        """Process-lifetime hit rate."""
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "hits": self._hits,
+                "hit_rate": round(self._hits / self._requests, 4) if self._requests else 0.0,
+            }
+
+
+# Global instance
+embedding_cache = EmbeddingCache()
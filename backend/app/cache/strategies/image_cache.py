@@ -0,0 +1,173 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+import numpy as np
+from PIL import Image
+from app.config import settings
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def pixel_hash(img: Image.Image) -> str:
+    """sha256 of the decoded pixels (independent of the PDF encoding of the image)."""
+    h = hashlib.sha256(f"{img.mode}:{img.width}x{img.height}:".encode())
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+def perceptual_hash(img: Image.Image) -> int:
+    """64-bit difference hash (dHash): stable under re-encoding, scaling and small edits."""
+    gray = np.asarray(img.convert("L").resize((9, 8), Image.Resampling.LANCZOS), dtype=np.int16)
+    bits = (gray[:, 1:] > gray[:, :-1]).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+class ImageDescriptionCache:
+    """
+    Persistent cache of vision descriptions (and their embeddings), keyed by the pixel hash of
+    the image, the element type (prompt) and the vision model. Stored in SQLite under
+    CACHE_DIR so entries survive restarts and are shared by ingest worker processes.
+
+    With IMAGE_CACHE_PHASH_DISTANCE > 0, images (not tables: same layout, different numbers)
+    may also reuse the entry of a perceptually near-identical image.
+    """
+
+    def __init__(self, path: str | Path = None):
+        self.path = Path(path or settings.CACHE_DIR / "image_descriptions.sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # (kind, model) -> {phash: pixel_hash}, loaded on first near-match lookup
+        self._phashes: Dict[tuple, Dict[int, str]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.IMAGE_CACHE_ENABLED
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per process: SQLite handles must not be shared between processes (ingest
+        # pool, worker fleet), and pool processes forked from the forkserver inherit this module
+        # as the server preloaded it
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS descriptions ("
+                " pixel_hash TEXT NOT NULL, kind TEXT NOT NULL, model TEXT NOT NULL,"
+                " phash TEXT, description TEXT NOT NULL,"
+                " embedding BLOB, embedding_text_sha TEXT,"
+                " hits INTEGER NOT NULL DEFAULT 0, created_at REAL, last_used_at REAL,"
+                " PRIMARY KEY (pixel_hash, kind, model))"
+            )
+            conn.commit()
+            self._conn, self._pid, self._phashes = conn, os.getpid(), {}
+        return self._conn
+
+    def _near_match(self, conn: sqlite3.Connection, kind: str, model: str, phash: int) -> Optional[str]:
+        index = self._phashes.get((kind, model))
+        if index is None:
+            rows = conn.execute(
+                "SELECT phash, pixel_hash FROM descriptions WHERE kind = ? AND model = ? AND phash IS NOT NULL",
+                (kind, model),
+            ).fetchall()
+            index = self._phashes[(kind, model)] = {int(p, 16): key for p, key in rows}
+        best, best_distance = None, settings.IMAGE_CACHE_PHASH_DISTANCE + 1
+        for candidate, key in index.items():
+            distance = bin(candidate ^ phash).count("1")
+            if distance < best_distance:
+                best, best_distance = key, distance
+        return best
+
+    def lookup(self, img: Image.Image, kind: str, model: str) -> Dict[str, Any]:
+        """
+        Returns {"pixel_hash", "phash", "description", "embedding", "embedding_text_sha"};
+        the last three are None on a miss. The hashes are needed to `store` the result.
+        """
+        entry = {"pixel_hash": pixel_hash(img), "phash": None, "description": None,
+                 "embedding": None, "embedding_text_sha": None}
+        if not self.enabled:
+            return entry
+        if kind == "image":
+            # Stored even when near matching is off, so it can be enabled later
+            entry["phash"] = perceptual_hash(img)
+        near = kind == "image" and settings.IMAGE_CACHE_PHASH_DISTANCE > 0
+        result = "miss"
+        try:
+            with self._lock:
+                conn = self._connection()
+                key = entry["pixel_hash"]
+                row = self._fetch(conn, key, kind, model)
+                if row is None and near:
+                    key = self._near_match(conn, kind, model, entry["phash"])
+                    row = self._fetch(conn, key, kind, model) if key else None
+                    result = "near_hit" if row else "miss"
+                elif row is not None:
+                    result = "hit"
+                if row is not None:
+                    entry["description"], blob, entry["embedding_text_sha"] = row
+                    if blob is not None:
+                        entry["embedding"] = np.frombuffer(blob, dtype=np.float32).copy()
+                    conn.execute(
+                        "UPDATE descriptions SET hits = hits + 1, last_used_at = ? WHERE pixel_hash = ? AND kind = ? AND model = ?",
+                        (time.time(), key, kind, model),
+                    )
+                    conn.commit()
+        except Exception as e:
+            logger.warning(f"Image description cache lookup failed: {e}")
+            result = "error"
+        metrics.inc("image_description_cache_lookups_total", kind=kind, result=result)
+        return entry
+
+    @staticmethod
+    def _fetch(conn: sqlite3.Connection, key: str, kind: str, model: str):
+        return conn.execute(
+            "SELECT description, embedding, embedding_text_sha FROM descriptions WHERE pixel_hash = ? AND kind = ? AND model = ?",
+            (key, kind, model),
+        ).fetchone()
+
+    def store(self, entry: Dict[str, Any], kind: str, model: str, description: str,
+              embedding: Optional[np.ndarray] = None, embedding_text: Optional[str] = None):
+        """Saves a fresh description; the embedding is kept with a hash of the text it encodes."""
+        if not self.enabled:
+            return
+        blob = embedding.astype(np.float32).tobytes() if embedding is not None else None
+        text_sha = hashlib.sha256(embedding_text.encode()).hexdigest() if embedding_text is not None else None
+        phash = f"{entry['phash']:016x}" if entry.get("phash") is not None else None
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO descriptions"
+                    " (pixel_hash, kind, model, phash, description, embedding, embedding_text_sha, hits, created_at, last_used_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                    (entry["pixel_hash"], kind, model, phash, description, blob, text_sha, now, now),
+                )
+                conn.commit()
+                if phash is not None and (kind, model) in self._phashes:
+                    self._phashes[(kind, model)][entry["phash"]] = entry["pixel_hash"]
+        except Exception as e:
+            logger.warning(f"Image description cache store failed: {e}")
+            return
+        # Later duplicates in the same document share this entry and skip the store/embedding
+        entry.update(description=description, embedding=embedding, embedding_text_sha=text_sha)
+
+    @staticmethod
+    def embedding_for(entry: Dict[str, Any], text: str) -> Optional[np.ndarray]:
+        """The cached embedding, if it was computed for exactly `text`."""
+        if entry.get("embedding") is None or entry.get("embedding_text_sha") is None:
+            return None
+        if hashlib.sha256(text.encode()).hexdigest() != entry["embedding_text_sha"]:
+            return None
+        return entry["embedding"]
+
+
+# Global instance
+image_cache = ImageDescriptionCache()
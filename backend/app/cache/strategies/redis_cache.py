@@ -1,5 +1,6 @@
 import redis
 import pickle
+import fnmatch
 import logging
 from typing import Any, Optional
 from app.config import settings
@@ -129,7 +130,7 @@ class RedisCache:
                 logger.info(f"Invalidated cache pattern: {pattern}")
             else:
                 # In-memory pattern matching
-                keys_to_delete = [k for k in self.fallback_cache.keys() if pattern in k]
+                keys_to_delete = [k for k in self.fallback_cache.keys() if fnmatch.fnmatchcase(k, pattern)]
                 for key in keys_to_delete:
                     del self.fallback_cache[key]
                 if keys_to_delete:
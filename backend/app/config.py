@@ -54,11 +54,72 @@ class Settings(BaseSettings):
         "gpt-4o-mini": (0.15, 0.60),
         "gpt-4o": (2.50, 10.00),
         "o1-mini": (3.00, 12.00),
-        "gpt-5.2-thinking": (5.00, 15.00) # Estimated premium pricing
+        "gpt-5.2-thinking": (5.00, 15.00), # Estimated premium pricing
+        "text-embedding-3-small": (0.02, 0.0),
     }
     
     # Pipeline Config
     MAX_WORKERS: int = int(os.getenv("MAX_WORKERS", 1))
+    # Max concurrently running jobs per submitter (0 = no cap; queued jobs are still served round-robin)
+    MAX_JOBS_PER_SUBMITTER: int = int(os.getenv("MAX_JOBS_PER_SUBMITTER", 0))
+    # Max in-flight LLM calls per job during KG extraction (override per job via config["extraction_concurrency"])
+    KG_EXTRACTION_CONCURRENCY: int = int(os.getenv("KG_EXTRACTION_CONCURRENCY", 4))
+    # Worker processes used to ingest multi-PDF jobs (1 = sequential, in-process)
+    INGEST_PROCESSES: int = int(os.getenv("INGEST_PROCESSES", min(4, os.cpu_count() or 1)))
+    # Pages between partial writes of graph/Chroma/Faiss during ingestion of one PDF (0 = only at the end)
+    INGEST_FLUSH_PAGES: int = int(os.getenv("INGEST_FLUSH_PAGES", 50))
+    # Worker processes parsing the pages of one PDF (text, tables, images, renders; 1 = in-process)
+    PARSE_PROCESSES: int = int(os.getenv("PARSE_PROCESSES", min(4, os.cpu_count() or 1)))
+    # Streaming mode: overlap ingestion with ontology/extraction (override per job via config["streaming"])
+    PIPELINE_STREAMING: bool = os.getenv("PIPELINE_STREAMING", "False").lower() == "true"
+    STREAMING_ONTOLOGY_CHUNKS: int = int(os.getenv("STREAMING_ONTOLOGY_CHUNKS", 30))
+    STREAMING_QUEUE_SIZE: int = int(os.getenv("STREAMING_QUEUE_SIZE", 64))
+    # Per-document/ontology/chunk checkpoints used by /pipeline/resume (override via config["checkpoint"])
+    PIPELINE_CHECKPOINTS: bool = os.getenv("PIPELINE_CHECKPOINTS", "True").lower() == "true"
+    # Concurrent vision calls (image/table/page descriptions) per ingested document
+    VISION_CONCURRENCY: int = int(os.getenv("VISION_CONCURRENCY", 4))
+    # Parse-quality score (0-1) from which a table read from the PDF text layer skips the vision model (>1 = always vision)
+    TABLE_TEXT_MIN_SCORE: float = float(os.getenv("TABLE_TEXT_MIN_SCORE", 0.75))
+    # Local pre-filter skipping decorative images before vision calls (see pipeline/stages/image_filter.py)
+    IMAGE_FILTER_ENABLED: bool = os.getenv("IMAGE_FILTER_ENABLED", "True").lower() == "true"
+    # Below this luminance standard deviation (0-255) an image is a flat fill
+    IMAGE_FILTER_MIN_STD: float = float(os.getenv("IMAGE_FILTER_MIN_STD", 6))
+    # Above this width/height ratio an image is a rule, border or banner
+    IMAGE_FILTER_MAX_ASPECT: float = float(os.getenv("IMAGE_FILTER_MAX_ASPECT", 8))
+    # Share of rows that look like lines of text above which an image is always kept
+    IMAGE_FILTER_MIN_TEXT_LIKENESS: float = float(os.getenv("IMAGE_FILTER_MIN_TEXT_LIKENESS", 0.25))
+    # Below this share of edge pixels an image is a gradient or blurred background
+    IMAGE_FILTER_MIN_EDGE_DENSITY: float = float(os.getenv("IMAGE_FILTER_MIN_EDGE_DENSITY", 0.01))
+    # Photos and textures: colour entropy (bits, max 12) above this with the 8 dominant colours below MIN_PALETTE_SHARE
+    IMAGE_FILTER_MAX_ENTROPY: float = float(os.getenv("IMAGE_FILTER_MAX_ENTROPY", 7.0))
+    IMAGE_FILTER_MIN_PALETTE_SHARE: float = float(os.getenv("IMAGE_FILTER_MIN_PALETTE_SHARE", 0.5))
+    # Images smaller than this (pixels, longest side) that are not text are icons
+    IMAGE_FILTER_ICON_SIZE: int = int(os.getenv("IMAGE_FILTER_ICON_SIZE", 128))
+    # Persistent cache of image/table descriptions and embeddings, keyed by pixel hash (CACHE_DIR/image_descriptions.sqlite)
+    IMAGE_CACHE_ENABLED: bool = os.getenv("IMAGE_CACHE_ENABLED", "True").lower() == "true"
+    # Max perceptual-hash distance (of 64 bits) for reusing the description of a near-identical image (0 = exact pixels only)
+    IMAGE_CACHE_PHASH_DISTANCE: int = int(os.getenv("IMAGE_CACHE_PHASH_DISTANCE", 0))
+    # On-disk embedding cache (CACHE_DIR/embeddings) used by ingestion and query embedding
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "True").lower() == "true"
+    # Vectors kept per embedding model before the least recently used are overwritten (1536-dim: ~6 KB each)
+    EMBEDDING_CACHE_MAX_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 100000))
+    # Texts (chunks and visual descriptions) collected per document before one batched embedding pass
+    EMBEDDING_BATCH_WINDOW: int = int(os.getenv("EMBEDDING_BATCH_WINDOW", 1024))
+    # Per-request limits of the embeddings API used to pack those texts
+    EMBEDDING_BATCH_MAX_INPUTS: int = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", 2048))
+    EMBEDDING_BATCH_MAX_TOKENS: int = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", 300000))
+    # Chroma records buffered during ingestion before one batched upsert (always flushed at the end of each document)
+    CHROMA_UPSERT_BATCH: int = int(os.getenv("CHROMA_UPSERT_BATCH", 256))
+    # Per-job limits enforced during KG extraction (0 = none; override via config["budget_usd"], ["budget_tokens"], ["deadline_seconds"])
+    JOB_BUDGET_USD: float = float(os.getenv("JOB_BUDGET_USD", 0))
+    JOB_BUDGET_TOKENS: int = int(os.getenv("JOB_BUDGET_TOKENS", 0))
+    JOB_DEADLINE_SECONDS: float = float(os.getenv("JOB_DEADLINE_SECONDS", 0))
+    # Cheaper model used for the rest of a job that would exceed its limits ("" = never downgrade)
+    BUDGET_FALLBACK_MODEL: str = os.getenv("BUDGET_FALLBACK_MODEL", "gpt-4o-mini")
+    # "local": jobs run in the API process; "queue": the API only enqueues on REDIS_URL and `python worker.py` runs them
+    PIPELINE_EXECUTION: str = os.getenv("PIPELINE_EXECUTION", "local")
+    # Seconds before the workers' lock on the shared stores expires if its holder dies (renewed while held)
+    STORE_LOCK_TTL: int = int(os.getenv("STORE_LOCK_TTL", 60))
     CACHE_TTL: int = 604800 # 7 Days
     
     # SSL Configuration (set to False if encountering hangs on Windows)
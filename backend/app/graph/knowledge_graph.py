@@ -1,7 +1,11 @@
+import os
+import re
 import networkx as nx
 import logging
 import pickle
 import json
+import threading
+from datetime import datetime
 from pathlib import Path
 from collections import deque
 from app.config import NodeType, EdgeType
@@ -12,48 +16,118 @@ class KnowledgeGraph:
     """
     Structural Knowledge Graph representing the hierarchy and relationships within documents.
     Supports GraphRAG context expansion and multi-format persistence.
+
+    Persisted as one shard per document under `{directory}/{name}/` plus a `manifest.json`.
+    Every node id is prefixed with its document id (see `make_doc_id`), so each node and
+    its outgoing edges belong to exactly one shard. Shards are merged lazily: `G` loads all
+    of them on first access, while `add_node`/`add_edge`/`expand_seeds` only load the shards
+    of the documents they touch. `save` rewrites only the shards modified since the last save.
     """
+    MANIFEST = "manifest.json"
+    # Shard for nodes whose id carries no document prefix (e.g. autocreated UNKNOWN nodes)
+    MISC_SHARD = "_misc"
+    _DOC_PREFIX = re.compile(rf"^{NodeType['DOCUMENT']}_[0-9a-f]{{12}}")
+
     def __init__(self, name: str = "structural_graph"):
         self.name = name
-        self.G = nx.DiGraph()
+        self._G = nx.DiGraph()
+        self._lock = threading.RLock()
+        self._directory: Path | None = None
+        # doc_id -> manifest entry of the shard on disk
+        self._manifest: dict[str, dict] = {}
+        self._loaded: set[str] = set()
+        self._dirty: set[str] = set()
+        self._doc_nodes: dict[str, set] = {}
+
+    @property
+    def G(self) -> nx.DiGraph:
+        """The full graph; pending shards are merged in on first access."""
+        self._ensure_loaded(self._manifest.keys())
+        return self._G
+
+    @classmethod
+    def _doc_key(cls, node_id: str) -> str:
+        match = cls._DOC_PREFIX.match(str(node_id))
+        return match.group(0) if match else cls.MISC_SHARD
+
+    def _ensure_loaded(self, docs):
+        with self._lock:
+            for doc in [d for d in docs if d not in self._loaded]:
+                self._loaded.add(doc)
+                entry = self._manifest.get(doc)
+                if entry is None or self._directory is None:
+                    continue
+                try:
+                    with open(self._directory / entry["file"], 'rb') as f:
+                        shard = pickle.load(f)
+                except Exception as e:
+                    logger.error(f"Failed to load graph shard {doc}: {e}")
+                    continue
+                self._G.add_nodes_from(shard["nodes"])
+                self._G.add_edges_from(shard["edges"])
+                self._doc_nodes.setdefault(doc, set()).update(n for n, _ in shard["nodes"])
+
+    def _track(self, node_id: str) -> str:
+        doc = self._doc_key(node_id)
+        self._doc_nodes.setdefault(doc, set()).add(node_id)
+        self._dirty.add(doc)
+        return doc
 
     def add_node(self, node_id: str, node_type: str, **kwargs):
         """Adds a node to the graph, merging attributes if it already exists."""
-        if self.G.has_node(node_id):
-            # Safe attribute merge
-            for k, v in kwargs.items():
-                if k not in self.G.nodes[node_id] or not self.G.nodes[node_id][k]:
-                    self.G.nodes[node_id][k] = v
-        else:
-            self.G.add_node(node_id, type=node_type, **kwargs)
+        with self._lock:
+            self._ensure_loaded([self._doc_key(node_id)])
+            if self._G.has_node(node_id):
+                # Safe attribute merge
+                for k, v in kwargs.items():
+                    if k not in self._G.nodes[node_id] or not self._G.nodes[node_id][k]:
+                        self._G.nodes[node_id][k] = v
+            else:
+                self._G.add_node(node_id, type=node_type, **kwargs)
+            self._track(node_id)
 
     def add_edge(self, source_id: str, target_id: str, edge_type: str, **kwargs):
         """Adds an edge to the graph, with consistency logging."""
-        missing = []
-        if not self.G.has_node(source_id): missing.append(source_id)
-        if not self.G.has_node(target_id): missing.append(target_id)
-        
-        if missing:
-            logger.warning(f"Inconsistent Edge! Missing nodes: {missing} for edge {source_id} -> {target_id}")
-            # Autocreate missing nodes as Unknown type to prevent crash, but logged!
-            for m in missing:
-                self.G.add_node(m, type="UNKNOWN")
+        with self._lock:
+            self._ensure_loaded({self._doc_key(source_id), self._doc_key(target_id)})
+            missing = []
+            if not self._G.has_node(source_id): missing.append(source_id)
+            if not self._G.has_node(target_id): missing.append(target_id)
+
+            if missing:
+                logger.warning(f"Inconsistent Edge! Missing nodes: {missing} for edge {source_id} -> {target_id}")
+                # Autocreate missing nodes as Unknown type to prevent crash, but logged!
+                for m in missing:
+                    self._G.add_node(m, type="UNKNOWN")
+                    self._track(m)
 
-        self.G.add_edge(source_id, target_id, type=edge_type, **kwargs)
+            self._G.add_edge(source_id, target_id, type=edge_type, **kwargs)
+            # Edges are stored with their source node's shard
+            self._track(source_id)
+
+    def remove_document(self, doc_id: str):
+        """Drops every node of a document (and their edges); its shard is deleted on the next save."""
+        with self._lock:
+            self._ensure_loaded([doc_id])
+            nodes = self._doc_nodes.pop(doc_id, set())
+            self._G.remove_nodes_from(nodes)
+            self._dirty.add(doc_id)
 
     def get_node_attr(self, node_id: str) -> dict:
-        if self.G.has_node(node_id):
-            return dict(self.G.nodes[node_id])
+        self._ensure_loaded([self._doc_key(node_id)])
+        if self._G.has_node(node_id):
+            return dict(self._G.nodes[node_id])
         return {}
         
     def get_neighbors(self, node_id: str, edge_type: str = None) -> list:
-        if not self.G.has_node(node_id):
+        self._ensure_loaded([self._doc_key(node_id)])
+        if not self._G.has_node(node_id):
             return []
         
         if edge_type:
-            return [n for n in self.G.successors(node_id) 
-                   if self.G.get_edge_data(node_id, n).get('type') == edge_type]
-        return list(self.G.successors(node_id))
+            return [n for n in self._G.successors(node_id) 
+                   if self._G.get_edge_data(node_id, n).get('type') == edge_type]
+        return list(self._G.successors(node_id))
 
     def nodes_by_type(self, node_type: str) -> list[str]:
         return [n for n, attr in self.G.nodes(data=True) if attr.get("type") == node_type]
@@ -62,10 +136,14 @@ class KnowledgeGraph:
         """BFS Expansion of context nodes starting from seed points."""
         if not seed_ids:
             return []
+
+        # Structural edges never cross documents: only the seeds' shards are needed
+        self._ensure_loaded({self._doc_key(sid) for sid in seed_ids})
+        G = self._G
             
         visited = set(seed_ids)
         # Store as (node_id, depth)
-        queue = deque([(sid, 0) for sid in seed_ids if self.G.has_node(sid)])
+        queue = deque([(sid, 0) for sid in seed_ids if G.has_node(sid)])
         expanded = list(seed_ids)
         
         while queue and len(expanded) < max_nodes:
@@ -75,7 +153,7 @@ class KnowledgeGraph:
                 continue
                 
             # Both forward and backward navigation to find containing pages/docs
-            neighbors = list(self.G.successors(current_id)) + list(self.G.predecessors(current_id))
+            neighbors = list(G.successors(current_id)) + list(G.predecessors(current_id))
             
             for neighbor in neighbors:
                 if neighbor not in visited:
@@ -88,7 +166,7 @@ class KnowledgeGraph:
         # Re-rank based on priority types if provided
         if priority_types:
             def sort_key(n_id):
-                ntype = self.G.nodes[n_id].get("type", "UNKNOWN")
+                ntype = G.nodes[n_id].get("type", "UNKNOWN") if G.has_node(n_id) else "UNKNOWN"
                 try:
                     return priority_types.index(ntype)
                 except ValueError:
@@ -98,7 +176,11 @@ class KnowledgeGraph:
         return expanded
 
     def is_empty(self) -> bool:
-        return self.G.number_of_nodes() == 0
+        return self._G.number_of_nodes() == 0 and not (self._manifest.keys() - self._loaded)
+
+    def document_ids(self) -> list[str]:
+        """Documents with a shard on disk or in memory."""
+        return sorted((self._manifest.keys() | self._doc_nodes.keys()) - {self.MISC_SHARD})
 
     def print_stats(self):
         logger.info(f"--- Graph Stats: {self.name} ---")
@@ -111,65 +193,166 @@ class KnowledgeGraph:
             types[t] = types.get(t, 0) + 1
         logger.info(f"Node Types: {types}")
 
-    def save(self, directory: str | Path = None):
-        """Persist graph in Pickle, JSON, and GML."""
+    @staticmethod
+    def _resolve_dir(directory: str | Path = None) -> Path:
         if directory is None:
             from app.config import settings
             directory = settings.STORAGE_DIR
-        
-        dir_path = Path(directory)
-        dir_path.mkdir(parents=True, exist_ok=True)
-        
-        if self.is_empty():
-            logger.warning("Attempted to save empty graph.")
+        return Path(directory)
+
+    @staticmethod
+    def _write_atomic(path: Path, write):
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+
+    def _read_manifest(self, shard_dir: Path) -> dict[str, dict]:
+        path = shard_dir / self.MANIFEST
+        if not path.exists():
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("shards", {})
+
+    def _shard_payload(self, doc: str) -> dict:
+        nodes = [n for n in self._doc_nodes.get(doc, ()) if self._G.has_node(n)]
+        return {
+            "nodes": [(n, dict(self._G.nodes[n])) for n in nodes],
+            "edges": [(u, v, dict(d)) for u, v, d in self._G.out_edges(nodes, data=True)],
+        }
+
+    def save(self, directory: str | Path = None):
+        """Persist the shards of the documents modified since the last save, then the manifest."""
+        dir_path = self._resolve_dir(directory)
+        shard_dir = dir_path / self.name
+        shard_dir.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+            own = self._directory in (None, shard_dir)
+            if own:
+                dirty = sorted(self._dirty)
+                self._dirty.difference_update(dirty)
+            else:
+                # Saving to another directory writes every shard
+                self._ensure_loaded(self._manifest.keys())
+                dirty = sorted(self._doc_nodes)
+            payloads = {doc: self._shard_payload(doc) for doc in dirty}
+
+        if not payloads:
+            logger.debug(f"Graph '{self.name}' has no modified shards to save.")
             return
 
-        # 1. Pickle (Primary Fast Reload)
-        pkl_path = dir_path / f"{self.name}.pkl"
-        with open(pkl_path, 'wb') as f:
-            pickle.dump(self.G, f)
-            
-        # 2. GML (Standard)
-        gml_path = dir_path / f"{self.name}.gml"
-        nx.write_gml(self.G, gml_path)
-
-        # 3. JSON Node-Link
-        json_path = dir_path / f"{self.name}.json"
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(nx.node_link_data(self.G), f, indent=2)
-            
-        logger.info(f"Graph '{self.name}' saved to {dir_path}")
+        entries = {}
+        removed = []
+        try:
+            for doc, payload in payloads.items():
+                if not payload["nodes"]:
+                    # Document removed (or emptied) since the last save
+                    (shard_dir / f"{doc}.pkl").unlink(missing_ok=True)
+                    removed.append(doc)
+                    continue
+                filename = f"{doc}.pkl"
+                self._write_atomic(shard_dir / filename, lambda f: pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL))
+                label = next((a.get("label") for n, a in payload["nodes"] if n == doc), None)
+                entries[doc] = {
+                    "file": filename,
+                    "label": label,
+                    "nodes": len(payload["nodes"]),
+                    "edges": len(payload["edges"]),
+                    "saved_at": datetime.now().isoformat(),
+                }
+
+            with self._lock:
+                # Re-read so shards written meanwhile by other processes stay listed
+                manifest = self._read_manifest(shard_dir)
+                manifest.update(entries)
+                for doc in removed:
+                    manifest.pop(doc, None)
+                body = json.dumps({"name": self.name, "shards": manifest}, indent=2).encode("utf-8")
+                self._write_atomic(shard_dir / self.MANIFEST, lambda f: f.write(body))
+                if own:
+                    self._directory = shard_dir
+                    self._manifest.update(entries)
+                    for doc in removed:
+                        self._manifest.pop(doc, None)
+        except Exception:
+            if own:
+                with self._lock:
+                    self._dirty.update(payloads)
+            raise
+
+        logger.info(f"Graph '{self.name}': {len(entries)} shard(s) saved, {len(removed)} removed in {shard_dir}")
+
+    def refresh(self, directory: str | Path = None):
+        """
+        Picks up shards saved by other processes since the manifest was read: loaded shards
+        that changed (or were removed) on disk are dropped from memory and reloaded on next
+        access. Shards with unsaved local changes are kept as they are.
+        """
+        shard_dir = self._resolve_dir(directory) / self.name
+        try:
+            manifest = self._read_manifest(shard_dir)
+        except Exception as e:
+            logger.error(f"Failed to read graph manifest {shard_dir / self.MANIFEST}: {e}")
+            return
+        with self._lock:
+            if self._directory not in (None, shard_dir):
+                return
+            for doc in (self._manifest.keys() | manifest.keys()) - self._dirty:
+                if self._manifest.get(doc) == manifest.get(doc):
+                    continue
+                if doc in self._loaded:
+                    self._G.remove_nodes_from(self._doc_nodes.pop(doc, set()))
+                    self._loaded.discard(doc)
+            self._manifest = manifest
+            self._directory = shard_dir
+
+    def export(self, directory: str | Path = None):
+        """Writes the full corpus graph as GML and JSON node-link files (for inspection)."""
+        dir_path = self._resolve_dir(directory)
+        dir_path.mkdir(parents=True, exist_ok=True)
+        G = self.G
+        nx.write_gml(G, dir_path / f"{self.name}.gml")
+        with open(dir_path / f"{self.name}.json", 'w', encoding='utf-8') as f:
+            json.dump(nx.node_link_data(G), f, indent=2)
+        logger.info(f"Graph '{self.name}' exported to {dir_path}")
 
     @classmethod
     def load(cls, directory: str | Path = None) -> "KnowledgeGraph":
-        """Load graph from Pickle (Primary)."""
-        if directory is None:
-            from app.config import settings
-            directory = settings.STORAGE_DIR
-            
+        """Reads the shard manifest; shards themselves are loaded on demand."""
+        dir_path = cls._resolve_dir(directory)
         kg = cls()
-        pkl_path = Path(directory) / f"{kg.name}.pkl"
-        if not pkl_path.exists():
-            return kg
-            
+        shard_dir = dir_path / kg.name
+        kg._directory = shard_dir
+
         try:
-            with open(pkl_path, 'rb') as f:
-                kg.G = pickle.load(f)
-            logger.info(f"Graph '{kg.name}' loaded from {pkl_path}")
-            return kg
+            kg._manifest = kg._read_manifest(shard_dir)
         except Exception as e:
-            logger.error(f"Failed to load graph {kg.name}: {e}")
+            logger.error(f"Failed to read graph manifest {shard_dir / cls.MANIFEST}: {e}")
             return kg
+        if kg._manifest:
+            logger.info(f"Graph '{kg.name}' manifest loaded from {shard_dir} ({len(kg._manifest)} shards)")
+            return kg
+
+        # Single-file graph written by earlier versions: split into shards on the next save
+        pkl_path = dir_path / f"{kg.name}.pkl"
+        if pkl_path.exists():
+            try:
+                with open(pkl_path, 'rb') as f:
+                    kg._G = pickle.load(f)
+                for node_id in kg._G.nodes:
+                    kg._loaded.add(kg._track(node_id))
+                logger.info(f"Graph '{kg.name}' loaded from legacy {pkl_path}; it will be sharded on the next save")
+            except Exception as e:
+                logger.error(f"Failed to load graph {kg.name}: {e}")
+        return kg
 
     @classmethod
     def exists(cls, directory: str | Path = None) -> bool:
-        if directory is None:
-            from app.config import settings
-            directory = settings.STORAGE_DIR
-            
+        dir_path = cls._resolve_dir(directory)
         # Use default name from cls()
         name = cls().name
-        return (Path(directory) / f"{name}.pkl").exists()
+        return (dir_path / name / cls.MANIFEST).exists() or (dir_path / f"{name}.pkl").exists()
 
     def visualize_static(self, output_path: str | Path):
         """Generates static PNG rendering using matplotlib."""
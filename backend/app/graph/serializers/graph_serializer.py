@@ -101,6 +101,27 @@ class GraphSerializer:
             }
         }
     
+    def from_cytoscape(self, data: Dict[str, Any]) -> nx.DiGraph:
+        """
+        Rebuilds the NetworkX graph from `to_cytoscape` output (used when only the
+        serialized result of a job is available). Display-only fields are dropped.
+        """
+        graph = nx.DiGraph()
+        elements = data.get("elements", {})
+        computed = {"id", "label", "community", "color", "degree"}
+        for node in elements.get("nodes", []):
+            node_data = node.get("data", {})
+            attrs = {k: v for k, v in node_data.items() if k not in computed}
+            graph.add_node(node_data["id"], **attrs)
+        for edge in elements.get("edges", []):
+            edge_data = edge.get("data", {})
+            graph.add_edge(
+                edge_data["source"], edge_data["target"],
+                relation=edge_data.get("relation", "related_to"),
+                weight=edge_data.get("weight", 1),
+            )
+        return graph
+
     def to_node_link(self, graph: nx.DiGraph) -> Dict[str, Any]:
         """
         Convert to standard node-link format (D3.js compatible).
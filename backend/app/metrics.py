@@ -0,0 +1,179 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Tuple, Optional
+
+# Latency buckets (seconds): from sub-millisecond vector ops up to slow vision calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "pipeline_jobs_total": ("counter", "Pipeline jobs finished, by final status.", None),
+    "pipeline_stage_duration_seconds": ("histogram", "Wall time spent in each pipeline stage.", DEFAULT_BUCKETS),
+    "llm_request_duration_seconds": ("histogram", "Latency of individual LLM, vision and embedding API calls.", DEFAULT_BUCKETS),
+    "llm_tokens_total": ("counter", "Tokens consumed by API calls, by direction (input/output).", None),
+    "llm_output_tokens_per_second": ("histogram", "Completion tokens generated per second of call latency.", RATE_BUCKETS),
+    "retries_total": ("counter", "Retries issued by retry_with_exponential_backoff, by function.", None),
+    "vector_store_operation_duration_seconds": ("histogram", "Latency of Chroma and Faiss operations.", DEFAULT_BUCKETS),
+    "vision_images_skipped_total": ("counter", "Images skipped by the local decorative-image pre-filter, by reason.", None),
+    "table_extractions_total": ("counter", "Tables read from the PDF text layer or, for low-confidence parses, by the vision model.", None),
+    "image_description_cache_lookups_total": ("counter", "Image/table description cache lookups, by result (hit/near_hit/miss).", None),
+    "embedding_cache_requests_total": ("counter", "Texts looked up in the embedding cache, by result (hit/miss) and caller.", None),
+    "embedding_cache_hit_ratio": ("gauge", "Share of embedding cache lookups served from the cache since process start.", None),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """
+    Minimal thread-safe counters/gauges/histograms rendered in the Prometheus text format
+    (served by GET /metrics). Values are per process; pool processes send theirs back
+    with their results (`snapshot`/`delta` there, `merge` in the parent).
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, list]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = METRICS[name][2]
+        key = self._key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            # [per-bucket counts..., sum, count]
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * len(buckets) + [0.0, 0]
+            idx = bisect.bisect_left(buckets, value)
+            if idx < len(buckets):
+                state[idx] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy of the counters and histograms, to compute a `delta` later."""
+        with self._lock:
+            return {
+                "counters": {name: dict(series) for name, series in self._counters.items()},
+                "histograms": {name: {k: list(v) for k, v in series.items()} for name, series in self._histograms.items()},
+            }
+
+    def delta(self, since: Dict[str, Any]) -> Dict[str, Any]:
+        """Counter and histogram increments recorded after a `snapshot` (picklable, see `merge`)."""
+        now = self.snapshot()
+        counters = {}
+        for name, series in now["counters"].items():
+            old = since["counters"].get(name, {})
+            changed = {k: v - old.get(k, 0.0) for k, v in series.items() if v != old.get(k, 0.0)}
+            if changed:
+                counters[name] = changed
+        histograms = {}
+        for name, series in now["histograms"].items():
+            old = since["histograms"].get(name, {})
+            changed = {}
+            for k, state in series.items():
+                prev = old.get(k)
+                if prev is None:
+                    changed[k] = state
+                elif state[-1] != prev[-1]:
+                    changed[k] = [a - b for a, b in zip(state, prev)]
+            if changed:
+                histograms[name] = changed
+        return {"counters": counters, "histograms": histograms}
+
+    def merge(self, delta: Dict[str, Any]):
+        """Adds the increments recorded by another process (e.g. an ingest pool process)."""
+        with self._lock:
+            for name, series in delta.get("counters", {}).items():
+                target = self._counters.setdefault(name, {})
+                for k, v in series.items():
+                    target[k] = target.get(k, 0.0) + v
+            for name, series in delta.get("histograms", {}).items():
+                target = self._histograms.setdefault(name, {})
+                for k, state in series.items():
+                    current = target.get(k)
+                    target[k] = list(state) if current is None else [a + b for a, b in zip(current, state)]
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def track_llm_call(self, kind: str, model: str, create, **kwargs):
+        """
+        Calls an OpenAI `create` method and records its latency, token counts and
+        output tokens per second under the given call kind (ontology, kg_extraction,
+        vision, embedding, ...).
+        """
+        started = time.perf_counter()
+        resp = create(model=model, **kwargs)
+        elapsed = time.perf_counter() - started
+        self.observe("llm_request_duration_seconds", elapsed, kind=kind, model=model)
+
+        usage = getattr(resp, "usage", None)
+        if usage is not None:
+            input_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            output_tokens = getattr(usage, "completion_tokens", 0) or 0
+            self.inc("llm_tokens_total", input_tokens, kind=kind, model=model, direction="input")
+            if output_tokens:
+                self.inc("llm_tokens_total", output_tokens, kind=kind, model=model, direction="output")
+                if elapsed > 0:
+                    self.observe("llm_output_tokens_per_second", output_tokens / elapsed, kind=kind, model=model)
+        return resp
+
+    @staticmethod
+    def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(key) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        escape = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        body = ",".join(f'{k}="{escape(v)}"' for k, v in pairs)
+        return "{" + body + "}"
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, buckets) in METRICS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind in ("counter", "gauge"):
+                    values = self._counters if kind == "counter" else self._gauges
+                    for key, value in values.get(name, {}).items():
+                        lines.append(f"{name}{self._fmt_labels(key)} {value:g}")
+                    continue
+                for key, state in self._histograms.get(name, {}).items():
+                    cumulative = 0
+                    for bound, count in zip(buckets, state):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self._fmt_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                    lines.append(f"{name}_bucket{self._fmt_labels(key, ('le', '+Inf'))} {state[-1]}")
+                    lines.append(f"{name}_sum{self._fmt_labels(key)} {state[-2]:.6f}")
+                    lines.append(f"{name}_count{self._fmt_labels(key)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+# Global instance
+metrics = MetricsRegistry()
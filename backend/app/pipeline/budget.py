@@ -0,0 +1,222 @@
+import bisect
+import time
+import logging
+from typing import Dict, Any, Optional
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JobBudget:
+    """
+    Token / USD / deadline limits of a job, enforced chunk by chunk during KG extraction.
+
+    Before each chunk is submitted, the remaining spend and time are projected from the
+    per-chunk averages observed so far (including the vision/embedding calls of documents
+    still being ingested in streaming mode). When a limit would be exceeded the job degrades
+    step by step:
+      1. switch extraction to the cheaper BUDGET_FALLBACK_MODEL
+      2. skip the chunks with the least text, keeping as many as the budget still allows
+      3. stop extraction; the job completes with the triples gathered so far
+    Every action and every skipped chunk is recorded in `record` (exposed as job["budget"]).
+    """
+
+    def __init__(
+        self,
+        max_usd: float = 0.0,
+        max_tokens: int = 0,
+        deadline_seconds: float = 0.0,
+        model: str = None,
+        fallback_model: str = None,
+        started_at: float = None,
+    ):
+        self.max_usd = max_usd
+        self.max_tokens = max_tokens
+        self.started_at = started_at or time.time()
+        self.deadline = self.started_at + deadline_seconds if deadline_seconds else None
+        self.fallback_model = fallback_model
+        # Averages over finished chunks (those restored from a previous run included)
+        self._chunks = 0
+        self._input_tokens = 0
+        self._output_tokens = 0
+        # Chunks extracted by this run (throughput)
+        self._timed_chunks = 0
+        # Ingestion calls made while extracting, spread over the chunks
+        self._ingest_tokens = 0
+        self._ingest_cost = 0.0
+        self._first_submit: Optional[float] = None
+        # Sorted text lengths of the chunks seen so far (value threshold for skipping)
+        self._lengths: list = []
+        self.record: Dict[str, Any] = {
+            "limits": {
+                "usd": max_usd or None,
+                "tokens": max_tokens or None,
+                "deadline_seconds": deadline_seconds or None,
+            },
+            "model": model,
+            "projection": {},
+            "actions": [],
+            "skipped_chunks": [],
+            "stopped": False,
+        }
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], model: str, started_at: float) -> Optional["JobBudget"]:
+        """Budget of a job (config overrides the JOB_BUDGET_* settings); None when unlimited."""
+        max_usd = float(config.get("budget_usd", settings.JOB_BUDGET_USD) or 0)
+        max_tokens = int(config.get("budget_tokens", settings.JOB_BUDGET_TOKENS) or 0)
+        deadline = float(config.get("deadline_seconds", settings.JOB_DEADLINE_SECONDS) or 0)
+        if not (max_usd or max_tokens or deadline):
+            return None
+        fallback = config.get("budget_fallback_model", settings.BUDGET_FALLBACK_MODEL) or None
+        return cls(max_usd, max_tokens, deadline, model=model, fallback_model=fallback, started_at=started_at)
+
+    @property
+    def model(self) -> str:
+        return self.record["model"]
+
+    @property
+    def degraded(self) -> bool:
+        return bool(self.record["actions"] or self.record["skipped_chunks"])
+
+    @property
+    def stopped(self) -> bool:
+        return self.record["stopped"]
+
+    def observe(self, usage: Dict[str, Any], model: str = None, kind: str = "chunk"):
+        """
+        Feeds token usage into the per-chunk averages. `kind` is "chunk" (a chunk extracted
+        by this run), "restored" (extracted by a previous run of the job: counts for spend,
+        not for throughput) or "ingestion" (a vision/embedding call priced at `model`, made
+        while chunks are extracted, so its cost recurs for the chunks still to come).
+        """
+        input_tokens = usage.get("prompt_tokens", 0) or 0
+        output_tokens = usage.get("completion_tokens", 0) or 0
+        if kind == "ingestion":
+            pricing = settings.MODEL_PRICING.get(model, (0.0, 0.0))
+            self._ingest_tokens += input_tokens + output_tokens
+            self._ingest_cost += (input_tokens * pricing[0] + output_tokens * pricing[1]) / 1_000_000
+            return
+        self._chunks += 1
+        if kind == "chunk":
+            self._timed_chunks += 1
+        self._input_tokens += input_tokens
+        self._output_tokens += output_tokens
+
+    def _chunk_cost(self, model: str) -> float:
+        pricing = settings.MODEL_PRICING.get(model, (0.0, 0.0))
+        extraction = (self._input_tokens * pricing[0] + self._output_tokens * pricing[1]) / 1_000_000
+        return (extraction + self._ingest_cost) / self._chunks
+
+    def _chunk_tokens(self) -> float:
+        return (self._input_tokens + self._output_tokens + self._ingest_tokens) / self._chunks
+
+    def _rate(self, now: float) -> Optional[float]:
+        """Chunks per second extracted by this run, once there is anything to measure."""
+        if self._first_submit is None or now <= self._first_submit or not self._timed_chunks:
+            return None
+        # Throughput already reflects the concurrent calls
+        return self._timed_chunks / (now - self._first_submit)
+
+    def _affordable(self, spent: Dict[str, Any], now: float, in_flight: int) -> Dict[str, float]:
+        """Chunks each limit still allows, beyond those already in flight."""
+        allowed = {}
+        if self.max_usd:
+            per_chunk = self._chunk_cost(self.model)
+            if per_chunk > 0:
+                allowed["cost"] = (self.max_usd - spent["total_cost"]) / per_chunk - in_flight
+        if self.max_tokens:
+            per_chunk = self._chunk_tokens()
+            if per_chunk > 0:
+                allowed["tokens"] = (self.max_tokens - spent["input_tokens"] - spent["output_tokens"]) / per_chunk - in_flight
+        rate = self._rate(now) if self.deadline else None
+        if rate:
+            allowed["deadline"] = (self.deadline - now) * rate - in_flight
+        return allowed
+
+    def _project(self, spent: Dict[str, Any], now: float, pending: int):
+        projection = {}
+        if self.max_usd:
+            projection["cost_usd"] = round(spent["total_cost"] + pending * self._chunk_cost(self.model), 6)
+        if self.max_tokens:
+            projection["tokens"] = int(spent["input_tokens"] + spent["output_tokens"] + pending * self._chunk_tokens())
+        rate = self._rate(now) if self.deadline else None
+        if rate:
+            projection["seconds"] = round(now - self.started_at + pending / rate, 1)
+        self.record["projection"] = projection
+
+    def _action(self, action: str, reason: str, chunk_index: int, **extra):
+        entry = {"action": action, "reason": reason, "chunk_index": chunk_index,
+                 "elapsed_seconds": round(time.time() - self.started_at, 1), **extra}
+        self.record["actions"].append(entry)
+        logger.warning(f"Budget: {action} at chunk {chunk_index} ({reason}) {extra or ''}")
+
+    def stop(self, reason: str, chunk_index: int, not_processed: int):
+        """Ends extraction: chunks from `chunk_index` on are not extracted."""
+        self.record["stopped"] = True
+        self._action("stop", reason, chunk_index, chunks_not_processed=not_processed)
+
+    def skip(self, chunk: Dict[str, Any], chunk_index: int, reason: str):
+        meta = chunk.get("metadata", {})
+        self.record["skipped_chunks"].append({
+            "chunk_index": chunk_index,
+            "id": chunk.get("id"),
+            "doc_id": meta.get("doc_id"),
+            "page_num": meta.get("page_num"),
+            "chars": len(chunk.get("text", "")),
+            "reason": reason,
+        })
+
+    def decide(self, chunk: Dict[str, Any], chunk_index: int, spent: Dict[str, Any], remaining: int, in_flight: int) -> str:
+        """
+        "run", "skip" or "stop" for the next chunk. `spent` is the job's usage so far and
+        `remaining` counts the chunks not yet submitted, this one included.
+        """
+        now = time.time()
+        if self._first_submit is None:
+            self._first_submit = now
+
+        exhausted = None
+        if self.deadline and now >= self.deadline:
+            exhausted = "deadline"
+        elif self.max_usd and spent["total_cost"] >= self.max_usd:
+            exhausted = "cost"
+        elif self.max_tokens and spent["input_tokens"] + spent["output_tokens"] >= self.max_tokens:
+            exhausted = "tokens"
+        if exhausted:
+            self.stop(exhausted, chunk_index, remaining)
+            return "stop"
+
+        length = len(chunk.get("text", ""))
+        bisect.insort(self._lengths, length)
+        if not self._chunks:
+            # Nothing to project from yet
+            return "run"
+
+        allowed = self._affordable(spent, now, in_flight)
+        over = {reason: n for reason, n in allowed.items() if n < remaining}
+        # A cheaper model saves money (and is usually faster) but does not use fewer tokens
+        downgrade_for = [r for r in ("cost", "deadline") if r in over]
+        if (downgrade_for and self.fallback_model and self.fallback_model != self.model
+                and self._chunk_cost(self.fallback_model) < self._chunk_cost(self.model)):
+            reason = downgrade_for[0]
+            self._action("downgrade_model", reason, chunk_index, from_model=self.model, to_model=self.fallback_model)
+            self.record["model"] = self.fallback_model
+            allowed = self._affordable(spent, now, in_flight)
+            over = {reason: n for reason, n in allowed.items() if n < remaining}
+        self._project(spent, now, remaining + in_flight)
+
+        if not over:
+            return "run"
+        reason = min(over, key=over.get)
+        keep = over[reason]
+        if keep < 1:
+            self.stop(reason, chunk_index, remaining)
+            return "stop"
+
+        # Keep the longest chunks: skip this one if it falls in the shortest (1 - keep/remaining) share
+        threshold = self._lengths[min(len(self._lengths) - 1, int(len(self._lengths) * (1 - keep / remaining)))]
+        if length < threshold:
+            self.skip(chunk, chunk_index, reason)
+            return "skip"
+        return "run"
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import logging
+from typing import Dict, Any, List, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+# Events kept per subscriber before the oldest ones are dropped (slow clients)
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class _Subscriber:
+    """One SSE client: an asyncio queue fed thread-safely from pipeline worker threads."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def push(self, event: Optional[Dict[str, Any]]):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event: Optional[Dict[str, Any]]):
+        if self.queue.full():
+            # Progress events supersede each other: dropping the oldest one is safe
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class JobEventBus:
+    """
+    In-process pub/sub of job events (stage transitions, progress/ETA, usage deltas,
+    final status). The orchestrator publishes from worker threads; the SSE route
+    subscribes from the event loop. `None` marks the end of a job's stream.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[_Subscriber]] = {}
+        self._listeners: List[Callable[[str, Optional[Dict[str, Any]]], None]] = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[str, Optional[Dict[str, Any]]], None]):
+        """Receives every event of every job (the worker uses it to forward events to Redis)."""
+        self._listeners.append(listener)
+
+    def subscribe(self, job_id: str) -> _Subscriber:
+        """Must be called from the event loop that will consume the events."""
+        sub = _Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append(sub)
+        return sub
+
+    def unsubscribe(self, job_id: str, sub: _Subscriber):
+        with self._lock:
+            subs = self._subscribers.get(job_id, [])
+            if sub in subs:
+                subs.remove(sub)
+            if not subs:
+                self._subscribers.pop(job_id, None)
+
+    def publish(self, job_id: str, event: Optional[Dict[str, Any]]):
+        for listener in self._listeners:
+            try:
+                listener(job_id, event)
+            except Exception as e:
+                logger.warning(f"Job event listener failed for {job_id}: {e}")
+        self.deliver(job_id, event)
+
+    def deliver(self, job_id: str, event: Optional[Dict[str, Any]]):
+        """Hands an event to the job's SSE subscribers only (used for events relayed from workers)."""
+        with self._lock:
+            subs = list(self._subscribers.get(job_id, []))
+        for sub in subs:
+            try:
+                sub.push(event)
+            except RuntimeError:
+                # Event loop already closed (client gone during shutdown)
+                self.unsubscribe(job_id, sub)
+
+    def close(self, job_id: str):
+        """Ends every open stream of a job."""
+        self.publish(job_id, None)
+
+
+# Global instance
+job_events = JobEventBus()
@@ -0,0 +1,224 @@
+import json
+import time
+import uuid
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Callable
+from app.config import settings
+from app.pipeline.scheduler import PRIORITY_CLASSES
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "kg:pipeline"
+# Seconds between attempts to take a lock held by another process
+LOCK_POLL_SECONDS = 0.2
+
+# In-process stand-in for Redis (REDIS_URL=fakeredis://): one server shared by every client
+_fake_server = None
+
+
+def _fake_client():
+    global _fake_server
+    import fakeredis  # development/test dependency only
+
+    if _fake_server is None:
+        _fake_server = fakeredis.FakeServer()
+    return fakeredis.FakeRedis(server=_fake_server, decode_responses=True)
+
+
+class RedisJobQueue:
+    """
+    Job queue shared by the API and the worker fleet (`python worker.py`) on REDIS_URL.
+
+    - one list per priority class (LPUSH / BRPOP, interactive served first)
+    - kg:pipeline:job:{id}     JSON status body (written by the API on enqueue, then by the worker)
+    - kg:pipeline:cancel:{id}  cancellation flag polled by the worker running the job
+    - kg:pipeline:events:{id}  pub/sub channel carrying the job's progress events
+    - kg:pipeline:lock:stores  lock held by the worker writing the shared Faiss index / graph
+
+    Any redis-py compatible client can be injected; REDIS_URL=fakeredis:// runs the API and
+    workers of one process against an in-memory server (tests, development).
+    """
+
+    def __init__(self, client=None, url: str = None):
+        self.url = url or settings.REDIS_URL
+        self._client = client
+        self._lock = threading.Lock()
+        self._relay: Optional[threading.Thread] = None
+        self._queues = [f"{KEY_PREFIX}:queue:{name}" for name, _ in sorted(PRIORITY_CLASSES.items(), key=lambda p: p[1])]
+
+    @property
+    def client(self):
+        """Lazy connection (same pattern as the Redis cache)."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if self.url.startswith("fakeredis://"):
+                        client = _fake_client()
+                    else:
+                        import redis
+                        client = redis.from_url(self.url, decode_responses=True)
+                    client.ping()
+                    self._client = client
+        return self._client
+
+    def _queue_key(self, priority: str) -> str:
+        return f"{KEY_PREFIX}:queue:{priority if priority in PRIORITY_CLASSES else 'bulk'}"
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"{KEY_PREFIX}:job:{job_id}"
+
+    @staticmethod
+    def _cancel_key(job_id: str) -> str:
+        return f"{KEY_PREFIX}:cancel:{job_id}"
+
+    @staticmethod
+    def _channel(job_id: str) -> str:
+        return f"{KEY_PREFIX}:events:{job_id}"
+
+    @staticmethod
+    def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in job.items() if k != "results" and not k.startswith("_")}
+
+    # --- API side ---
+
+    def enqueue(self, job: Dict[str, Any]):
+        """Stores the job body and pushes its id on the queue of its priority class."""
+        pipe = self.client.pipeline()
+        pipe.set(self._job_key(job["id"]), json.dumps(self._public(job), default=str), ex=settings.CACHE_TTL)
+        pipe.lpush(self._queue_key(job.get("priority")), job["id"])
+        pipe.execute()
+        logger.info(f"Job {job['id']} enqueued on Redis (priority={job.get('priority')})")
+
+    def get_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(self._job_key(job_id))
+        return json.loads(raw) if raw else None
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """Number of queued jobs that will be dequeued before this one."""
+        ahead = 0
+        for key in self._queues:
+            pos = self.client.lpos(key, job_id)
+            if pos is not None:
+                # BRPOP serves the tail of the list first
+                return ahead + self.client.llen(key) - 1 - pos
+            ahead += self.client.llen(key)
+        return None
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Removes a job that no worker has picked up yet (returns True). Otherwise flags it
+        so the worker running it stops at its next cancellation check.
+        """
+        for key in self._queues:
+            if self.client.lrem(key, 0, job_id):
+                return True
+        self.client.set(self._cancel_key(job_id), "1", ex=settings.CACHE_TTL)
+        return False
+
+    def start_event_relay(self, publish: Callable[[str, Any], None]):
+        """Forwards the events published by workers to the in-process event bus (SSE)."""
+        with self._lock:
+            if self._relay is not None:
+                return
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(f"{KEY_PREFIX}:events:*")
+
+            def _forward():
+                prefix = f"{KEY_PREFIX}:events:"
+                for message in pubsub.listen():
+                    try:
+                        job_id = message["channel"][len(prefix):]
+                        publish(job_id, json.loads(message["data"]))
+                    except Exception as e:
+                        logger.warning(f"Dropped malformed job event: {e}")
+
+            self._relay = threading.Thread(target=_forward, name="job-event-relay", daemon=True)
+            self._relay.start()
+
+    # --- Worker side ---
+
+    def dequeue(self, timeout: int = 5) -> Optional[Dict[str, Any]]:
+        """Blocks up to `timeout` seconds for the next job (highest priority class first)."""
+        item = self.client.brpop(self._queues, timeout=timeout)
+        if item is None:
+            return None
+        _, job_id = item
+        job = self.get_status(job_id)
+        if job is None:
+            logger.warning(f"Dequeued job {job_id} has no stored body; skipping")
+            return None
+        return job
+
+    def is_cancelled(self, job_id: str) -> bool:
+        return bool(self.client.exists(self._cancel_key(job_id)))
+
+    def report(self, job: Dict[str, Any]):
+        """Stores a job's current status body (read by the API's /status and /events)."""
+        self.client.set(self._job_key(job["id"]), json.dumps(self._public(job), default=str), ex=settings.CACHE_TTL)
+
+    def publish_event(self, job_id: str, event: Optional[Dict[str, Any]]):
+        """Publishes a progress event; `None` ends the job's event streams."""
+        self.client.publish(self._channel(job_id), json.dumps(event, default=str))
+
+    def finish(self, job_id: str):
+        self.client.delete(self._cancel_key(job_id))
+
+    @contextmanager
+    def store_lock(self, ttl: int = None):
+        """
+        Cross-process lock on the shared stores (STORAGE_DIR): SET NX with a TTL, renewed by a
+        background thread while held, so a crashed worker releases it after `ttl` seconds.
+        Renewal and release only act on the holder's own token (WATCH/MULTI, no Lua scripts).
+        """
+        ttl_ms = int((ttl or settings.STORE_LOCK_TTL) * 1000)
+        key = f"{KEY_PREFIX}:lock:stores"
+        token = uuid.uuid4().hex
+        while not self.client.set(key, token, nx=True, px=ttl_ms):
+            time.sleep(LOCK_POLL_SECONDS)
+        released = threading.Event()
+
+        def _renew():
+            while not released.wait(ttl_ms / 3000):
+                if not self._if_holder(key, token, lambda pipe: pipe.pexpire(key, ttl_ms)):
+                    logger.error("Lost the shared store lock (expired while held)")
+                    return
+
+        renewer = threading.Thread(target=_renew, name="store-lock-renew", daemon=True)
+        renewer.start()
+        try:
+            yield
+        finally:
+            released.set()
+            renewer.join()
+            self._if_holder(key, token, lambda pipe: pipe.delete(key))
+
+    def _if_holder(self, key: str, token: str, command: Callable[[Any], Any]) -> bool:
+        """Runs `command` in a transaction if `key` still holds `token`."""
+        import redis
+
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) != token:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                command(pipe)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def clear_statuses(self) -> int:
+        """Deletes the stored status bodies of all jobs (repository clear)."""
+        keys = list(self.client.scan_iter(match=self._job_key("*")))
+        if keys:
+            self.client.delete(*keys)
+        return len(keys)
+
+
+# Global instance
+job_queue = RedisJobQueue()
@@ -0,0 +1,413 @@
+import json
+import time
+import threading
+import logging
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable
+import orjson
+import zstandard
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Result sections are stored as zstd-compressed orjson blobs
+ZSTD_LEVEL = 3
+
+
+def dump_json(value: Any, indent: bool = False) -> bytes:
+    """Plain UTF-8 JSON of a job or section (numpy values and non-string keys included)."""
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_INDENT_2 if indent else 0)
+    return orjson.dumps(value, default=str, option=option)
+
+
+def pack_json(value: Any) -> bytes:
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(dump_json(value))
+
+
+def unpack_json(blob: bytes) -> Any:
+    return orjson.loads(zstandard.ZstdDecompressor().decompress(blob))
+
+
+class JobStore:
+    """
+    Durable job store backed by SQLAlchemy (DATABASE_URL, SQLite by default).
+    Status bodies live in the jobs table; each result section (ontology, cytoscape,
+    graph_stats, document_summary, ...) is a separate compressed row, so readers only
+    load the sections they need. Indexed by id, status and creation date.
+    """
+
+    def __init__(self, url: str = None):
+        self.url = url or settings.DATABASE_URL
+        self._engine = None
+        self._table = None
+        self._checkpoints = None
+        self._sections = None
+        self._ready = False
+        self._lock = threading.RLock()
+
+    def _ensure_engine(self):
+        """Lazy engine/table creation (same pattern as the Redis cache connection)."""
+        if self._ready:
+            return
+        with self._lock:
+            if self._engine is not None:
+                return
+            from sqlalchemy import (
+                create_engine, MetaData, Table, Column, String, Float, Integer, Text, LargeBinary, Index, inspect
+            )
+
+            connect_args = {"check_same_thread": False} if self.url.startswith("sqlite") else {}
+            engine = create_engine(self.url, connect_args=connect_args, future=True)
+            metadata = MetaData()
+            table = Table(
+                "pipeline_jobs", metadata,
+                Column("id", String(64), primary_key=True),
+                Column("status", String(32), nullable=False, index=True),
+                Column("created_at", Float, nullable=False, index=True),
+                Column("updated_at", Float, nullable=False),
+                Column("filenames", Text, nullable=False, default="[]"),
+                Column("node_count", Integer, nullable=False, default=0),
+                Column("edge_count", Integer, nullable=False, default=0),
+                Column("status_body", Text, nullable=False),
+                Column("results_body", Text, nullable=True),  # legacy: whole results as JSON text
+                Column("fingerprint", String(64), nullable=True, index=True),
+                Column("result_sections", Text, nullable=True),  # JSON list of stored section names
+                Column("reused_from", String(64), nullable=True),  # source job whose results this job serves
+                Index("ix_pipeline_jobs_status_created", "status", "created_at"),
+            )
+            checkpoints = Table(
+                "pipeline_checkpoints", metadata,
+                Column("job_id", String(64), primary_key=True),
+                Column("unit", String(255), primary_key=True),
+                Column("created_at", Float, nullable=False),
+                Column("payload", Text, nullable=False),
+            )
+            sections = Table(
+                "pipeline_job_results", metadata,
+                Column("job_id", String(64), primary_key=True),
+                Column("section", String(64), primary_key=True),
+                Column("body", LargeBinary, nullable=False),
+            )
+            is_new = not inspect(engine).has_table("pipeline_jobs")
+            metadata.create_all(engine)
+            if not is_new and "reused_from" in self._add_missing_columns(engine, table):
+                self._backfill_reused_from(engine, table)
+            self._table = table
+            self._checkpoints = checkpoints
+            self._sections = sections
+            self._engine = engine
+
+            if is_new:
+                self._import_legacy_results(settings.RESULTS_DIR)
+            # Jobs still "running" in the store belong to a previous process
+            # (in queue mode they belong to the worker fleet, which outlives any single process)
+            if settings.PIPELINE_EXECUTION != "queue":
+                self.mark_interrupted()
+            self._ready = True
+            logger.info(f"Job store ready at {self.url}")
+
+    @staticmethod
+    def _add_missing_columns(engine, table) -> List[str]:
+        """
+        Minimal forward migration: adds columns (and their indexes) introduced after the table
+        was created. Returns the names of the added columns.
+        """
+        from sqlalchemy import inspect, text
+        existing = {c["name"] for c in inspect(engine).get_columns(table.name)}
+        added = []
+        with engine.begin() as conn:
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                added.append(column.name)
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+                logger.info(f"Job store migration: added column {table.name}.{column.name}")
+                for index in table.indexes:
+                    if column.name in index.columns:
+                        index.create(conn)
+        return added
+
+    @staticmethod
+    def _backfill_reused_from(engine, table):
+        """
+        Fills the reused_from column of jobs stored before it existed (it was only in the status
+        body), together with the graph counts of their source job.
+        """
+        with engine.begin() as conn:
+            rows = conn.execute(
+                table.select().with_only_columns(table.c.id, table.c.status_body)
+                .where(table.c.status_body.like('%"reused_from"%'))
+            ).all()
+            for r in rows:
+                source = json.loads(r.status_body).get("reused_from")
+                if source:
+                    conn.execute(table.update().where(table.c.id == r.id).values(
+                        reused_from=source, **JobStore._source_counts(conn, table, source),
+                    ))
+
+    @staticmethod
+    def _source_counts(conn, table, source_id: str) -> Dict[str, int]:
+        """Node/edge counts of the job whose results a reused job serves."""
+        source = conn.execute(
+            table.select().with_only_columns(table.c.node_count, table.c.edge_count).where(table.c.id == source_id)
+        ).first()
+        return {"node_count": source.node_count if source else 0, "edge_count": source.edge_count if source else 0}
+
+    @staticmethod
+    def _split(job: Dict[str, Any]) -> tuple[Dict[str, Any], Dict[str, Any]]:
+        """Splits a job dict into its status body and its public results (internal `_` keys dropped)."""
+        status_body = {k: v for k, v in job.items() if k != "results" and not k.startswith("_")}
+        results = {k: v for k, v in job.get("results", {}).items() if not k.startswith("_")}
+        return status_body, results
+
+    def save(self, job: Dict[str, Any], include_results: bool = True):
+        """Upserts a job. With include_results=False only the status row is touched."""
+        self._ensure_engine()
+        status_body, results = self._split(job)
+        stats = results.get("graph_stats", {})
+        now = time.time()
+
+        row = {
+            "status": job.get("status", "unknown"),
+            "updated_at": now,
+            "filenames": json.dumps(job.get("filenames", []), ensure_ascii=False),
+            "node_count": int(stats.get("node_count", 0) or 0),
+            "edge_count": int(stats.get("edge_count", 0) or 0),
+            "status_body": json.dumps(status_body, ensure_ascii=False, default=str),
+            "fingerprint": job.get("fingerprint"),
+            "reused_from": job.get("reused_from"),
+        }
+        # A reused job references the results of its source job, never duplicates them; sections
+        # saved on the job itself afterwards (save_section) are left in place
+        reused = bool(job.get("reused_from"))
+        if include_results and not reused:
+            row["results_body"] = None
+            row["result_sections"] = json.dumps(sorted(results))
+        elif not reused:
+            # Keep counts from a previously stored result
+            row.pop("node_count")
+            row.pop("edge_count")
+
+        t = self._table
+        with self._engine.begin() as conn:
+            if reused:
+                # Its graph is the source's: list_jobs shows the same counts for both
+                row.update(self._source_counts(conn, t, job["reused_from"]))
+            updated = conn.execute(t.update().where(t.c.id == job["id"]).values(**row)).rowcount
+            if not updated:
+                row.setdefault("node_count", 0)
+                row.setdefault("edge_count", 0)
+                row.setdefault("result_sections", None)
+                conn.execute(t.insert().values(
+                    id=job["id"],
+                    created_at=job.get("created_at") or job.get("start_time") or now,
+                    **row,
+                ))
+            if include_results and not reused:
+                self._write_sections(conn, job["id"], results, replace=True)
+
+    def _write_sections(self, conn, job_id: str, results: Dict[str, Any], replace: bool = False):
+        s = self._sections
+        if replace:
+            conn.execute(s.delete().where(s.c.job_id == job_id))
+        else:
+            conn.execute(s.delete().where((s.c.job_id == job_id) & s.c.section.in_(list(results))))
+        if results:
+            conn.execute(s.insert(), [
+                {"job_id": job_id, "section": name, "body": pack_json(value)}
+                for name, value in results.items()
+            ])
+
+    def save_section(self, job_id: str, section: str, value: Any):
+        """
+        Adds or replaces a single result section (e.g. a summary generated after the job). On a
+        reused job the section is stored with the job and overrides the source's on reads.
+        """
+        self._ensure_engine()
+        t = self._table
+        with self._engine.begin() as conn:
+            row = conn.execute(
+                t.select().with_only_columns(t.c.result_sections).where(t.c.id == job_id)
+            ).first()
+            if row is None:
+                return
+            names = set(json.loads(row.result_sections or "[]")) | {section}
+            self._write_sections(conn, job_id, {section: value})
+            conn.execute(t.update().where(t.c.id == job_id).values(result_sections=json.dumps(sorted(names))))
+
+    def get(self, job_id: str, include_results: bool = True, sections: Iterable[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Loads a job. Results are only read when include_results=True, and then only the
+        requested `sections` (all of them by default). A reused job serves its source's
+        sections, overridden by the ones saved on the job itself.
+        """
+        self._ensure_engine()
+        t = self._table
+        cols = [t.c.status_body]
+        if include_results:
+            cols += [t.c.result_sections, t.c.results_body]
+        with self._engine.connect() as conn:
+            row = conn.execute(t.select().with_only_columns(*cols).where(t.c.id == job_id)).first()
+            if row is None:
+                return None
+            job = json.loads(row.status_body)
+            if not include_results:
+                return job
+
+            wanted = set(sections) if sections is not None else None
+            results = {}
+            if row.result_sections is not None:
+                s = self._sections
+                query = s.select().with_only_columns(s.c.section, s.c.body).where(s.c.job_id == job_id)
+                if wanted is not None:
+                    query = query.where(s.c.section.in_(list(wanted)))
+                results = {r.section: unpack_json(r.body) for r in conn.execute(query)}
+
+        if row.result_sections is None and row.results_body:
+            legacy = json.loads(row.results_body)
+            self._convert_legacy_results(job_id, legacy)
+            results = {k: v for k, v in legacy.items() if wanted is None or k in wanted}
+        if job.get("reused_from"):
+            source = self.get(job["reused_from"], include_results=True, sections=sections)
+            results = {**(source.get("results", {}) if source else {}), **results}
+        job["results"] = results
+        return job
+
+    def _convert_legacy_results(self, job_id: str, results: Dict[str, Any]):
+        """Rewrites a whole-JSON results body as sections the first time it is read."""
+        t = self._table
+        try:
+            with self._engine.begin() as conn:
+                self._write_sections(conn, job_id, results, replace=True)
+                conn.execute(t.update().where(t.c.id == job_id).values(
+                    results_body=None, result_sections=json.dumps(sorted(results))
+                ))
+        except Exception as e:
+            logger.warning(f"Could not convert legacy results of job {job_id}: {e}")
+
+    def find_by_fingerprint(self, fingerprint: str) -> Optional[str]:
+        """
+        Id of the newest completed job that computed its own results for this content
+        fingerprint (reused jobs may hold a few sections of their own, never the full result).
+        """
+        self._ensure_engine()
+        t = self._table
+        with self._engine.connect() as conn:
+            row = conn.execute(
+                t.select().with_only_columns(t.c.id)
+                .where(
+                    (t.c.fingerprint == fingerprint) & (t.c.status == "completed") & t.c.reused_from.is_(None)
+                    & (t.c.result_sections.isnot(None) | t.c.results_body.isnot(None))
+                )
+                .order_by(t.c.created_at.desc())
+                .limit(1)
+            ).first()
+        return row.id if row else None
+
+    def list_jobs(self, status: str = None, since: float = None, limit: int = None) -> List[Dict[str, Any]]:
+        """Job summaries (newest first) read from indexed columns only."""
+        self._ensure_engine()
+        t = self._table
+        query = t.select().with_only_columns(
+            t.c.id, t.c.status, t.c.created_at, t.c.updated_at, t.c.filenames, t.c.node_count, t.c.edge_count
+        )
+        if status:
+            query = query.where(t.c.status == status)
+        if since is not None:
+            query = query.where(t.c.created_at >= since)
+        query = query.order_by(t.c.created_at.desc())
+        if limit:
+            query = query.limit(limit)
+
+        with self._engine.connect() as conn:
+            rows = conn.execute(query).all()
+        return [{
+            "id": r.id,
+            "status": r.status,
+            "date": r.updated_at,
+            "created_at": r.created_at,
+            "filenames": json.loads(r.filenames or "[]"),
+            "node_count": r.node_count,
+            "edge_count": r.edge_count,
+        } for r in rows]
+
+    def mark_interrupted(self, job_ids: List[str] = None) -> int:
+        """Flags jobs left queued/processing by a previous process as failed."""
+        self._ensure_engine()
+        t = self._table
+        with self._engine.connect() as conn:
+            rows = conn.execute(
+                t.select().with_only_columns(t.c.id, t.c.status_body)
+                .where(t.c.status.in_(("queued", "processing")))
+            ).all()
+
+        count = 0
+        for r in rows:
+            if job_ids is not None and r.id not in job_ids:
+                continue
+            job = json.loads(r.status_body)
+            job["status"] = "failed"
+            job["error"] = "Job interrupted by a server restart"
+            self.save(job, include_results=False)
+            count += 1
+        if count:
+            logger.warning(f"Marked {count} interrupted jobs as failed")
+        return count
+
+    def save_checkpoint(self, job_id: str, unit: str, payload: Dict[str, Any]):
+        """
+        Records a completed unit of work for a job (e.g. "doc:0", "ontology", "chunk:42",
+        "stage:kg_extraction"). Re-saving the same unit replaces it.
+        """
+        self._ensure_engine()
+        t = self._checkpoints
+        body = json.dumps(payload, ensure_ascii=False, default=str)
+        with self._engine.begin() as conn:
+            conn.execute(t.delete().where((t.c.job_id == job_id) & (t.c.unit == unit)))
+            conn.execute(t.insert().values(job_id=job_id, unit=unit, created_at=time.time(), payload=body))
+
+    def load_checkpoints(self, job_id: str) -> Dict[str, Dict[str, Any]]:
+        """All checkpoints of a job keyed by unit."""
+        self._ensure_engine()
+        t = self._checkpoints
+        with self._engine.connect() as conn:
+            rows = conn.execute(
+                t.select().with_only_columns(t.c.unit, t.c.payload).where(t.c.job_id == job_id)
+            ).all()
+        return {r.unit: json.loads(r.payload) for r in rows}
+
+    def clear_checkpoints(self, job_id: str):
+        self._ensure_engine()
+        t = self._checkpoints
+        with self._engine.begin() as conn:
+            conn.execute(t.delete().where(t.c.job_id == job_id))
+
+    def clear(self) -> int:
+        """Deletes every job with its result sections and checkpoints; returns the number of jobs."""
+        self._ensure_engine()
+        with self._engine.begin() as conn:
+            conn.execute(self._sections.delete())
+            conn.execute(self._checkpoints.delete())
+            return conn.execute(self._table.delete()).rowcount
+
+    def _import_legacy_results(self, results_dir: Path):
+        """One-off backfill of result JSON files written before the job store existed."""
+        imported = 0
+        for f in Path(results_dir).glob("*.json"):
+            try:
+                with open(f, "r", encoding="utf-8") as jf:
+                    job = json.load(jf)
+                if "id" not in job:
+                    continue
+                job.setdefault("created_at", f.stat().st_mtime)
+                self.save(job)
+                imported += 1
+            except Exception as e:
+                logger.warning(f"Skipping legacy result file {f.name}: {e}")
+        if imported:
+            logger.info(f"Imported {imported} legacy job results into the job store")
+
+
+# Global instance
+job_store = JobStore()
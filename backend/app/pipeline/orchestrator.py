@@ -1,25 +1,52 @@
 import uuid
+import time
 import threading
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Dict, Any, List, Iterable, Optional, Callable
 from app.config import settings
 
-from app.pipeline.stages.structural_extractor import StructuralExtractor
+from app.pipeline.stages.structural_extractor import StructuralExtractor, UsageMeter, ingest_pdf_fragment, init_ingest_process
 from app.pipeline.stages.ontology import OntologyBuilder
 from app.pipeline.stages.kg_extraction import KGExtractor
 from app.pipeline.stages.normalization import NormalizationStage
 from app.pipeline.stages.graph_builder import GraphBuilder
 from app.graph.knowledge_graph import KnowledgeGraph
+from app.pipeline.job_store import job_store, dump_json
+from app.pipeline.scheduler import JobScheduler, JobCancelled
+from app.pipeline.budget import JobBudget
+from app.pipeline.events import job_events
+from app.pipeline.job_queue import job_queue
+from app.metrics import metrics
+from app.utils import hash_file, process_context
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever a stage changes its output, so content-addressed reuse does not return stale results
+PIPELINE_VERSION = "2"
+
+# Config keys that only affect how a job runs, not what it produces (ignored by the job fingerprint)
+EXECUTION_ONLY_CONFIG = {"extraction_concurrency", "ingest_processes", "checkpoint", "reuse", "force_reingest", "priority"}
+
+# Stages whose wall time is recorded in job["stage_timings"] and /metrics
+PIPELINE_STAGES = ("structural_mapping", "ontology", "kg_extraction", "normalization", "semantic_storage", "graph_building")
+
 class PipelineOrchestrator:
-    def __init__(self):
+    def __init__(self, execution: str = None):
         # In-memory job store (replace with Redis in prod)
         self.jobs: Dict[str, Dict[str, Any]] = {}
-        # Thread pool for async execution
-        self.executor = ThreadPoolExecutor(max_workers=settings.MAX_WORKERS)
+        # "queue": jobs are handed to the worker fleet through Redis instead of local threads
+        self.job_queue = job_queue if (execution or settings.PIPELINE_EXECUTION) == "queue" else None
+        # Priority/fair-share queue feeding the pipeline worker threads
+        self.scheduler = JobScheduler(
+            self._run_pipeline,
+            max_workers=settings.MAX_WORKERS,
+            max_per_submitter=settings.MAX_JOBS_PER_SUBMITTER,
+        )
+        self._cancel_events: Dict[str, threading.Event] = {}
+        # Usage is added from extraction, vision and ingestion threads
+        self._usage_lock = threading.Lock()
         
         self._stages_initialized = False
         self.structural_extractor = None
@@ -47,13 +74,23 @@ class PipelineOrchestrator:
         self.kg_extractor = KGExtractor()
         self.normalizer = NormalizationStage()
         self.graph_builder = GraphBuilder()
-        self.structural_kg = KnowledgeGraph()
+        # Reload the persisted corpus graph so resumed jobs and new ingests extend it
+        self.structural_kg = KnowledgeGraph.load(settings.STORAGE_DIR)
         self._stages_initialized = True
         logger.info("Pipeline Stages Initialized.")
 
-    def start_job(self, document_paths: List[Any], config: Dict[str, Any] = None) -> str:
-        self._ensure_initialized()
+    def start_job(
+        self,
+        document_paths: List[Any],
+        config: Dict[str, Any] = None,
+        submitter: str = None,
+        priority: str = None,
+    ) -> str:
+        if self.job_queue is None:
+            self._ensure_initialized()
         job_id = str(uuid.uuid4())
+        # Single-document jobs are interactive by default; larger batches are backfills
+        priority = priority or (config or {}).get("priority") or ("interactive" if len(document_paths) <= 1 else "bulk")
         
         self.jobs[job_id] = {
             "id": job_id,
@@ -63,33 +100,198 @@ class PipelineOrchestrator:
             "results": {},
             "usage": {"input_tokens": 0, "output_tokens": 0, "total_cost": 0.0},
             "error": None,
-            "filenames": [str(p.name) for p in document_paths]
+            "filenames": [str(p.name) for p in document_paths],
+            "document_paths": [str(p) for p in document_paths],
+            "config": config or {},
+            "completed_stages": [],
+            "priority": priority,
+            "submitter": submitter or "anonymous",
+            "created_at": time.time()
         }
-        
-        # Submit to thread pool
-        self.executor.submit(self._run_pipeline, job_id, document_paths, config or {})
+        job = self.jobs[job_id]
+        # Identical submissions complete here, without waiting for a scheduler slot
+        if self._reuse_previous_result(job, document_paths, config or {}):
+            # Reads go through the job store, which serves the source job's sections
+            self.jobs.pop(job_id, None)
+            self._persist_job(job)
+            metrics.inc("pipeline_jobs_total", status="completed")
+            self._emit_status(job)
+            return job_id
+        self._persist_job(job, include_results=False)
+        self._submit(job)
         
         return job_id
 
-    def get_job_status(self, job_id: str) -> Dict[str, Any]:
-        import json
+    def _submit(self, job: Dict[str, Any]):
+        """Hands a queued job to the local scheduler or, in queue mode, to the worker fleet."""
+        if self.job_queue is not None:
+            # Workers own the job from here on; its status is read back from Redis
+            self.jobs.pop(job["id"], None)
+            self.job_queue.enqueue(job)
+            return
+
+        self._cancel_events[job["id"]] = threading.Event()
+        self.scheduler.submit(
+            job["id"], (job["id"], [Path(p) for p in job["document_paths"]], job.get("config", {})),
+            priority=job.get("priority", "interactive"), submitter=job.get("submitter", "anonymous"),
+        )
+
+    def append_job(
+        self,
+        base_job_id: str,
+        document_paths: List[Any],
+        config: Dict[str, Any] = None,
+        submitter: str = None,
+        priority: str = None,
+    ) -> Dict[str, Any]:
+        """
+        Starts a job that adds documents to the graph of a completed job: only the new
+        documents are extracted, their entities are resolved against the existing ones
+        and the result is the merged corpus graph. The base job is left untouched.
+        """
+        base = self.get_job_status(base_job_id, include_results=False)
+        if base.get("status") == "not_found":
+            return {"status": "not_found"}
+        if base.get("status") != "completed":
+            return {"status": base.get("status"), "error": "Documents can only be appended to a completed job"}
+
+        config = {**(config or {}), "append_to": base_job_id}
+        return {"status": "queued", "job_id": self.start_job(document_paths, config, submitter=submitter, priority=priority)}
+
+    def _load_append_base(self, job: Dict[str, Any], config: Dict[str, Any]):
+        """Loads the ontology and graph of the job being appended to into job["_append_base"]."""
+        base_id = config.get("append_to")
+        if not base_id:
+            return
+        base = self.get_job_status(base_id, sections=["ontology", "cytoscape"])
+        if base.get("status") != "completed":
+            raise ValueError(f"Cannot append to job {base_id} (status: {base.get('status')})")
+
+        results = base.get("results", {})
+        # The NetworkX graph is only kept in memory; otherwise it is rebuilt from the stored result
+        graph = self.jobs.get(base_id, {}).get("results", {}).get("_graph")
+        if graph is None:
+            graph = self.graph_builder.serializer.from_cytoscape(results.get("cytoscape", {}))
+        job["_append_base"] = {
+            "id": base_id,
+            "ontology": results.get("ontology", {"entities": [], "relations": []}),
+            "graph": graph,
+        }
+        job["corpus_filenames"] = base.get("corpus_filenames", base.get("filenames", [])) + job["filenames"]
+        logger.info(f"Job {job['id']} appends to {base_id} ({graph.number_of_nodes()} existing entities)")
+
+    def cancel_job(self, job_id: str) -> Dict[str, Any]:
+        """
+        Cancels a job. Queued jobs are dropped immediately; running jobs stop issuing
+        LLM/vision calls at the next checkpoint and end with status "cancelled".
+        """
+        job = self.jobs.get(job_id)
+        if not job and self.job_queue is not None:
+            return self._cancel_queued_job(job_id)
+        if not job:
+            stored = job_store.get(job_id, include_results=False)
+            return {"status": stored["status"] if stored else "not_found"}
+        if job["status"] not in ("queued", "processing"):
+            return {"status": job["status"]}
+
+        if self.scheduler.cancel(job_id):
+            job["status"] = "cancelled"
+            self._set_stage(job, "cancelled")
+            self._persist_job(job, include_results=False)
+            self._cancel_events.pop(job_id, None)
+            metrics.inc("pipeline_jobs_total", status="cancelled")
+            self._emit_status(job)
+            return {"status": "cancelled"}
+
+        event = self._cancel_events.get(job_id)
+        if event:
+            event.set()
+        job["cancel_requested"] = True
+        return {"status": "cancelling"}
+
+    def _cancel_queued_job(self, job_id: str) -> Dict[str, Any]:
+        """Queue mode: drops the job from Redis or flags it for the worker running it."""
+        job = self.job_queue.get_status(job_id) or job_store.get(job_id, include_results=False)
+        if not job:
+            return {"status": "not_found"}
+        if job["status"] not in ("queued", "processing"):
+            return {"status": job["status"]}
+
+        if self.job_queue.cancel(job_id):
+            job["status"] = "cancelled"
+            job["current_stage"] = "cancelled"
+            self.job_queue.report(job)
+            self._persist_job(job, include_results=False)
+            metrics.inc("pipeline_jobs_total", status="cancelled")
+            self._emit_status(job)
+            return {"status": "cancelled"}
+        return {"status": "cancelling"}
+
+    def _check_cancelled(self, job: Dict[str, Any]):
+        event = self._cancel_events.get(job["id"])
+        if event is not None and event.is_set():
+            raise JobCancelled(f"Job {job['id']} cancelled")
+
+    def _is_cancelled(self, job: Dict[str, Any]) -> bool:
+        event = self._cancel_events.get(job["id"])
+        return event is not None and event.is_set()
+
+    def resume_job(self, job_id: str) -> Dict[str, Any]:
+        """
+        Re-queues a failed/interrupted job under the same id. Completed units (ingested
+        documents, ontology, extracted chunks) are restored from checkpoints, so only
+        the remaining work is redone.
+        """
+        if self.job_queue is None:
+            self._ensure_initialized()
+        job = self.jobs.get(job_id) or job_store.get(job_id, include_results=False)
+        if not job:
+            return {"status": "not_found"}
+        if job.get("status") not in ("failed", "cancelled"):
+            return {"status": job.get("status"), "error": "Only failed, cancelled or interrupted jobs can be resumed"}
+        if "document_paths" not in job:
+            return {"status": job.get("status"), "error": "Job predates checkpointing and cannot be resumed"}
+
+        checkpoints = job_store.load_checkpoints(job_id)
+        job.update({
+            "status": "queued",
+            "progress": 0.0,
+            "current_stage": "queued",
+            "results": {},
+            "usage": {"input_tokens": 0, "output_tokens": 0, "total_cost": 0.0},
+            "error": None,
+            "completed_stages": [],
+            "resume_count": job.get("resume_count", 0) + 1,
+            "cancel_requested": False,
+            "_checkpoints": checkpoints,
+        })
+        self.jobs[job_id] = job
+        self._persist_job(job, include_results=False)
+        self._submit(job)
+        logger.info(f"Resuming job {job_id} with {len(checkpoints)} checkpointed units")
+        return {"status": "queued", "restored_units": len(checkpoints)}
+
+    def get_job_status(self, job_id: str, include_results: bool = True, sections: List[str] = None) -> Dict[str, Any]:
+        """
+        Returns the public view of a job. With include_results=False (status polling) the
+        result payload is neither loaded from the job store nor returned; `sections`
+        restricts the results to the named sections (e.g. ["cytoscape", "graph_stats"]).
+        """
         job = self.jobs.get(job_id)
         
-        # If not in memory, try disk storage first (most reliable)
+        # Queue mode: live status of queued/running jobs is reported by the workers through Redis
+        if not job and self.job_queue is not None:
+            job = self._live_status(job_id, include_results)
+        
+        # If not in memory, try the durable job store (indexed by job_id)
         if not job:
-            # Try to find by UUID suffix (glob)
-            matches = list(settings.RESULTS_DIR.glob(f"*_{job_id}.json"))
-            if not matches and (settings.RESULTS_DIR / f"{job_id}.json").exists():
-                matches = [settings.RESULTS_DIR / f"{job_id}.json"]
-            
-            if matches:
-                try:
-                    with open(matches[0], 'r', encoding='utf-8') as f:
-                        job = json.load(f)
-                        # Cache it back to memory for speed
-                        self.jobs[job_id] = job
-                except Exception as e:
-                    logger.error(f"Error loading job from disk {job_id}: {e}")
+            try:
+                job = job_store.get(job_id, include_results=include_results, sections=sections)
+                if job and include_results and sections is None:
+                    # Cache it back to memory for speed
+                    self.jobs[job_id] = job
+            except Exception as e:
+                logger.error(f"Error loading job {job_id} from job store: {e}")
 
         # If still not found, try Redis cache
         if not job:
@@ -101,29 +303,577 @@ class PipelineOrchestrator:
                 return {"status": "not_found"}
         
         # Create a copy and filter out non-serializable/internal items (starting with _)
-        public_job = job.copy()
-        public_job["results"] = {k: v for k, v in job.get("results", {}).items() if not k.startswith("_")}
+        public_job = {k: v for k, v in job.items() if k != "results" and not k.startswith("_")}
+        if include_results:
+            public_job["results"] = {
+                k: v for k, v in job.get("results", {}).items()
+                if not k.startswith("_") and (sections is None or k in sections)
+            }
+        if public_job.get("status") == "queued":
+            queue = self.job_queue if job_id not in self.jobs and self.job_queue is not None else self.scheduler
+            public_job["queue_position"] = queue.queue_position(job_id)
         
         return public_job
 
+    def _live_status(self, job_id: str, include_results: bool) -> Optional[Dict[str, Any]]:
+        try:
+            # Worker events are relayed to the local bus so /pipeline/events works in queue mode
+            self.job_queue.start_event_relay(job_events.deliver)
+            live = self.job_queue.get_status(job_id)
+        except Exception as e:
+            logger.error(f"Error reading job {job_id} from the Redis queue: {e}")
+            return None
+        # Finished jobs carry their results in the job store
+        if live and (live.get("status") in ("queued", "processing") or not include_results):
+            return live
+        return None
+
+    def _persist_job(self, job: Dict[str, Any], include_results: bool = True):
+        try:
+            job_store.save(job, include_results=include_results)
+        except Exception as e:
+            logger.error(f"❌ Failed to persist job {job['id']} to job store: {e}")
+
+    def _job_fingerprint(self, doc_paths: List[Any], config: Dict[str, Any]) -> str:
+        """Content hash over (document bytes, result-affecting config, model, pipeline version)."""
+        import json
+        import hashlib
+        h = hashlib.sha256()
+        for path in doc_paths:
+            h.update(hash_file(path).encode())
+        relevant_config = {k: v for k, v in config.items() if k not in EXECUTION_ONLY_CONFIG}
+        h.update(json.dumps(relevant_config, sort_keys=True, ensure_ascii=False, default=str).encode())
+        h.update(settings.OPENAI_MODEL.encode())
+        h.update(PIPELINE_VERSION.encode())
+        return h.hexdigest()
+
+    def _reuse_previous_result(self, job: Dict[str, Any], doc_paths: List[Any], config: Dict[str, Any]) -> bool:
+        """
+        Completes a new job instantly when the same documents were already processed with the
+        same config/model (also stores the job fingerprint). The job only references the source
+        job: its result sections are neither loaded nor copied.
+        """
+        try:
+            job["fingerprint"] = self._job_fingerprint(doc_paths, config)
+            if not config.get("reuse", True):
+                return False
+            source_id = job_store.find_by_fingerprint(job["fingerprint"])
+            if not source_id or source_id == job["id"]:
+                return False
+            source = job_store.get(source_id, include_results=False)
+        except Exception as e:
+            logger.warning(f"Result reuse lookup failed for job {job['id']}: {e}")
+            return False
+        if not source:
+            return False
+
+        logger.info(f"♻️ Job {job['id']} reuses results of {source_id} (fingerprint {job['fingerprint'][:12]})")
+        job["reused_from"] = source_id
+        job["completed_stages"] = source.get("completed_stages", [])
+        job["current_stage"] = source.get("current_stage", "graph_building")
+        job["progress"] = 1.0
+        job["status"] = "completed"
+        job["start_time"] = job["end_time"] = time.time()
+        job["duration"] = 0.0
+        return True
+
+    def _checkpoint(self, job: Dict[str, Any], unit: str, payload: Dict[str, Any]):
+        """Persists a completed unit of work (skipped when config["checkpoint"] is False)."""
+        if not job.get("config", {}).get("checkpoint", settings.PIPELINE_CHECKPOINTS):
+            return
+        try:
+            job_store.save_checkpoint(job["id"], unit, payload)
+        except Exception as e:
+            logger.warning(f"Checkpoint {unit} for job {job['id']} failed: {e}")
+
+    def _restored(self, job: Dict[str, Any], unit: str) -> Optional[Dict[str, Any]]:
+        """Returns the checkpoint of a unit completed by a previous run of this job, if any."""
+        return job.get("_checkpoints", {}).get(unit)
+
+    def _set_stage(self, job: Dict[str, Any], stage: str, timed: bool = True):
+        """Makes `stage` current; its wall time is recorded until the next stage unless `timed` is False."""
+        self._stop_stage_clock(job)
+        job["current_stage"] = stage
+        if timed and stage in PIPELINE_STAGES:
+            job["_stage_clock"] = (stage, time.perf_counter())
+        job_events.publish(job["id"], {
+            "event": "stage",
+            "data": {"status": job["status"], "current_stage": stage, "progress": job["progress"]},
+        })
+
+    def _stop_stage_clock(self, job: Dict[str, Any]):
+        """Adds the wall time of the running stage to job["stage_timings"]."""
+        clock = job.pop("_stage_clock", None)
+        if clock is None:
+            return
+        stage, started = clock
+        self._record_stage_time(job, stage, time.perf_counter() - started)
+
+    def _record_stage_time(self, job: Dict[str, Any], stage: str, elapsed: float):
+        timings = job.setdefault("stage_timings", {})
+        timings[stage] = round(timings.get(stage, 0.0) + elapsed, 3)
+        metrics.observe("pipeline_stage_duration_seconds", elapsed, stage=stage)
+
+    def _record_llm_latency(self, job: Dict[str, Any], result: Dict[str, Any]):
+        """Keeps the latency of each LLM call made for the job (restored checkpoints carry none)."""
+        if result.get("latency") is None:
+            return
+        completion_tokens = (result.get("usage") or {}).get("completion_tokens", 0)
+        job.setdefault("_llm_calls", []).append((result["latency"], completion_tokens))
+
+    def _job_metrics(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Per-job timing summary stored in results["metrics"]."""
+        calls = job.get("_llm_calls", [])
+        latencies = sorted(c[0] for c in calls)
+        total = sum(latencies)
+        llm = {"calls": len(calls), "total_seconds": round(total, 3)}
+        if latencies:
+            llm.update({
+                "mean_seconds": round(total / len(latencies), 3),
+                "p50_seconds": round(latencies[len(latencies) // 2], 3),
+                "p95_seconds": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+                "max_seconds": round(latencies[-1], 3),
+                "output_tokens_per_second": round(sum(c[1] for c in calls) / total, 1) if total else None,
+            })
+        return {"stage_seconds": dict(job.get("stage_timings", {})), "llm": llm}
+
+    def _emit_progress(self, job: Dict[str, Any]):
+        """Publishes status, progress, ETA and the token/cost usage accrued since the previous event."""
+        usage = job["usage"]
+        last = job.get("_usage_emitted") or {}
+        job["_usage_emitted"] = dict(usage)
+        job_events.publish(job["id"], {
+            "event": "progress",
+            "data": {
+                "status": job["status"],
+                "progress": job["progress"],
+                "estimated_total_time": job.get("estimated_total_time"),
+                "usage": dict(usage),
+                "usage_delta": {k: round(v - last.get(k, 0), 6) for k, v in usage.items()},
+            },
+        })
+
+    def _emit_status(self, job: Dict[str, Any]):
+        """Publishes the final status of a job and ends its event streams."""
+        data = {k: job.get(k) for k in ("status", "current_stage", "progress", "usage", "budget", "error", "duration", "reused_from")}
+        data["completed_stages"] = job.get("completed_stages", [])
+        job_events.publish(job["id"], {"event": "status", "data": data})
+        job_events.close(job["id"])
+
+    def _mark_stage(self, job: Dict[str, Any], stage: str):
+        job["completed_stages"].append(stage)
+        self._checkpoint(job, f"stage:{stage}", {})
+        self._persist_job(job, include_results=False)
+
     def _update_job_usage(self, job: Dict[str, Any], usage: Dict[str, Any], model_override: str = None):
         """
         Updates job token usage and calculates cumulative cost.
+        Each call is priced at its own model, so jobs mixing models (budget downgrades) add up.
         """
         if not usage:
             return
             
-        job["usage"]["input_tokens"] += usage.get("prompt_tokens", 0)
-        job["usage"]["output_tokens"] += usage.get("completion_tokens", 0)
+        input_tokens = usage.get("prompt_tokens", 0)
+        output_tokens = usage.get("completion_tokens", 0)
         
         # Calculate cost
         model = model_override or settings.OPENAI_MODEL
         pricing = settings.MODEL_PRICING.get(model, (0.0, 0.0))
         
-        input_cost = (job["usage"]["input_tokens"] / 1_000_000) * pricing[0]
-        output_cost = (job["usage"]["output_tokens"] / 1_000_000) * pricing[1]
+        input_cost = (input_tokens / 1_000_000) * pricing[0]
+        output_cost = (output_tokens / 1_000_000) * pricing[1]
+        
+        with self._usage_lock:
+            job["usage"]["input_tokens"] += input_tokens
+            job["usage"]["output_tokens"] += output_tokens
+            job["usage"]["total_cost"] = round(job["usage"]["total_cost"] + input_cost + output_cost, 6)
+
+    def _charge_ingestion(self, job: Dict[str, Any], usage_by_model: Dict[str, Dict[str, int]]):
+        """
+        Adds vision/embedding usage of the job's ingestion (per model) to the job. Calls made
+        while chunks are being extracted (streaming mode) also feed the job's budget.
+        """
+        budget = job.get("_budget")
+        for model, usage in (usage_by_model or {}).items():
+            self._update_job_usage(job, usage, model_override=model)
+            if budget is not None:
+                budget.observe(usage, model=model, kind="ingestion")
+
+    def _ingestion_meter(self, job: Dict[str, Any]) -> UsageMeter:
+        """Meter of one document's ingestion; each call is charged to the job as it returns."""
+        return UsageMeter(lambda model, usage: self._charge_ingestion(job, {model: usage}))
+
+    def _ingest_documents(self, job: Dict[str, Any], doc_paths: List[Any], config: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Structural ingestion of every document in the job.
+        Multi-document jobs are parsed in worker processes (one fragment per PDF) and the
+        fragments are merged into the shared graph/Faiss/Chroma in document order.
+        Documents whose bytes were already ingested are not read again unless
+        config["force_reingest"] is set.
+        """
+        force = bool(config.get("force_reingest", False))
+        # Documents already ingested by a previous run of this job are restored from checkpoints
+        restored = {i: self._restored(job, f"doc:{i}") for i in range(len(doc_paths))}
+        todo = [i for i, cp in restored.items() if cp is None]
+        processes = min(len(todo), max(1, int(config.get("ingest_processes", settings.INGEST_PROCESSES))))
+        per_doc: Dict[int, List[Dict[str, Any]]] = {i: cp["chunks"] for i, cp in restored.items() if cp is not None}
+        for cp in restored.values():
+            if cp is not None:
+                self._charge_ingestion(job, cp.get("usage"))
+
+        if processes <= 1:
+            for i in todo:
+                self._check_cancelled(job)
+                job["progress"] = (i / len(doc_paths)) * 0.25
+                self._emit_progress(job)
+                # Call the new ingest_pdf which populates Faiss, ChromaDB and Structural Graph
+                usage = self._ingestion_meter(job)
+                per_doc[i] = self.structural_extractor.ingest_pdf(
+                    doc_paths[i], self.structural_kg, should_stop=lambda: self._is_cancelled(job), force=force, usage=usage
+                )
+                # A document cut short by a cancellation must not be checkpointed as complete
+                self._check_cancelled(job)
+                self._checkpoint(job, f"doc:{i}", {"filename": Path(doc_paths[i]).name, "chunks": per_doc[i], "usage": usage.by_model})
+        else:
+            # Unchanged documents are served from the stores instead of a worker
+            for i in list(todo) if not force else []:
+                stored = self.structural_extractor.ingested_chunks(Path(doc_paths[i]), self.structural_kg)
+                if stored is not None:
+                    per_doc[i] = stored
+                    todo.remove(i)
+                    self._checkpoint(job, f"doc:{i}", {"filename": Path(doc_paths[i]).name, "chunks": stored})
+            logger.info(f"Ingesting {len(todo)} documents with {processes} worker processes")
+            fragments: Dict[int, Dict[str, Any]] = {}
+            with ProcessPoolExecutor(
+                max_workers=processes, mp_context=process_context(), initializer=init_ingest_process
+            ) as pool:
+                futures = {pool.submit(ingest_pdf_fragment, Path(doc_paths[i])): i for i in todo}
+                done = 0
+                for future in as_completed(futures):
+                    if self._is_cancelled(job):
+                        for f in futures:
+                            f.cancel()
+                        self._check_cancelled(job)
+                    fragments[futures[future]] = future.result()
+                    metrics.merge(fragments[futures[future]].pop("metrics", {}))
+                    self._charge_ingestion(job, fragments[futures[future]].get("usage"))
+                    done += 1
+                    # Parsing takes most of the stage; the merge below fills the remainder
+                    job["progress"] = (done / len(todo)) * 0.20
+                    self._emit_progress(job)
+
+            for i in sorted(fragments):
+                per_doc[i] = self.structural_extractor.merge_fragment(fragments[i], self.structural_kg)
+                self._checkpoint(job, f"doc:{i}", {
+                    "filename": fragments[i]["filename"], "chunks": per_doc[i], "usage": fragments[i].get("usage", {}),
+                })
+
+        # Replaced documents may leave orphan vectors behind
+        self.structural_extractor.compact_vectors(self.structural_kg)
+        return [c for i in range(len(doc_paths)) for c in per_doc[i]]
+
+    def _extract_triples_concurrent(
+        self,
+        job: Dict[str, Any],
+        chunks: Iterable[Dict[str, Any]],
+        ontology: Dict[str, Any],
+        config: Dict[str, Any],
+        start_time: float,
+        initial_heuristic: float,
+        total_hint: Optional[Callable[[], int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Runs KG extraction with a bounded number of in-flight LLM calls.
+        `chunks` may be a list or a lazily fed iterator (streaming mode); it is only pulled
+        when a slot frees up. Triples are returned in chunk order; progress, usage and ETA
+        are updated as calls finish. Retries stay per chunk (inside KGExtractor.extract_triples).
+        With a budget/deadline (see JobBudget) each chunk is checked before it is submitted and
+        extraction may downgrade the model, skip chunks or stop early with partial results.
+        """
+        import time
+        if total_hint is None:
+            chunk_list = list(chunks)
+            chunks = chunk_list
+            total_hint = lambda: len(chunk_list)
+
+        max_in_flight = max(1, int(config.get("extraction_concurrency", settings.KG_EXTRACTION_CONCURRENCY)))
+        user_instructions = config.get("user_instructions", "")
+        results: Dict[int, List[Dict[str, Any]]] = {}
+        pending: Dict[Any, int] = {}
+        budget = JobBudget.from_config(config, self.kg_extractor.processing_model(user_instructions), start_time)
+        if budget is not None:
+            job["budget"] = budget.record
+            # Ingestion still running alongside (streaming mode) charges it too
+            job["_budget"] = budget
+
+        def _record(idx: int, kg_res: Dict[str, Any]):
+            results[idx] = kg_res.get("triples", [])
+            self._update_job_usage(job, kg_res.get("usage", {}), model_override=kg_res.get("model"))
+            self._record_llm_latency(job, kg_res)
+
+        def _harvest(finished):
+            for future in finished:
+                idx = pending.pop(future)
+                kg_res = future.result()
+                _record(idx, kg_res)
+                if budget is not None:
+                    budget.observe(kg_res.get("usage", {}))
+                self._checkpoint(job, f"chunk:{idx}", {
+                    "triples": kg_res.get("triples", []),
+                    "usage": kg_res.get("usage", {}),
+                    "model": kg_res.get("model"),
+                })
+
+                # Granular updates: 0.40 to 0.85 (never moves backwards while the total still grows)
+                total = max(total_hint(), len(results), 1)
+                job["progress"] = max(job["progress"], 0.40 + (0.45 * (len(results) / total)))
+
+                # Smoother time estimation: 
+                # Combine initial heuristic with actual speed, weighted by progress
+                elapsed = time.time() - start_time
+                real_time_est = elapsed / job["progress"]
+                # As progress increases, we trust real-time data more
+                weight = job["progress"]
+                job["estimated_total_time"] = (real_time_est * weight) + (initial_heuristic * (1 - weight))
+                self._emit_progress(job)
+
+        logger.info(f"KG extraction with up to {max_in_flight} concurrent calls")
+        with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="kg-extract") as pool:
+            try:
+                for i, chunk in enumerate(chunks):
+                    restored = self._restored(job, f"chunk:{i}")
+                    if restored is not None:
+                        _record(i, restored)
+                        if budget is not None:
+                            # Spent by the previous run: the projections start from it
+                            budget.observe(restored.get("usage", {}), kind="restored")
+                        continue
+                    if len(pending) >= max_in_flight:
+                        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        _harvest(finished)
+                    self._check_cancelled(job)
+                    model = None
+                    if budget is not None:
+                        remaining = max(total_hint() - i, 1)
+                        decision = budget.decide(chunk, i, job["usage"], remaining, len(pending))
+                        if decision == "stop":
+                            break
+                        if decision == "skip":
+                            continue
+                        if budget.degraded:
+                            model = budget.model
+                    pending[pool.submit(
+                        self.kg_extractor.extract_triples, chunk, ontology,
+                        user_instructions=user_instructions, model=model,
+                    )] = i
+                    _harvest([f for f in pending if f.done()])
+                while pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    _harvest(finished)
+            except Exception:
+                # A chunk exhausted its retries (or the job was cancelled): stop issuing new calls
+                for f in pending:
+                    f.cancel()
+                raise
+            finally:
+                job.pop("_budget", None)
+
+        if budget is not None and budget.degraded:
+            # Downgraded/partial results must not be reused for an identical submission
+            job["fingerprint"] = None
+        return [t for idx in sorted(results) for t in results[idx]]
+
+    def _build_ontology(self, job: Dict[str, Any], chunks: List[Dict[str, Any]], config: Dict[str, Any]) -> Dict[str, Any]:
+        base = job.get("_append_base")
+        if base is not None:
+            # Appending to a corpus: reuse its ontology so new entities share the existing types
+            job["results"]["ontology"] = base["ontology"]
+            job["progress"] = 0.40
+            self._emit_progress(job)
+            return base["ontology"]
+
+        ontology_res = self._restored(job, "ontology")
+        if ontology_res is None:
+            self._check_cancelled(job)
+            ontology_res = self.ontology_builder.build(
+                chunks, 
+                user_instructions=config.get("user_instructions", "")
+            )
+            self._checkpoint(job, "ontology", {
+                "ontology": ontology_res.get("ontology", ontology_res),
+                "usage": ontology_res.get("usage", {}),
+            })
+        ontology = ontology_res.get("ontology", ontology_res)
+        self._update_job_usage(job, ontology_res.get("usage", {}))
+        self._record_llm_latency(job, ontology_res)
+        
+        job["results"]["ontology"] = ontology
+        job["progress"] = 0.40
+        self._emit_progress(job)
+        return ontology
+
+    def _run_batch_stages(self, job: Dict[str, Any], doc_paths: List[Any], config: Dict[str, Any], start_time: float):
+        """Stages 1-4 run back to back: every document is ingested before the ontology is built."""
+        # STAGE 1 & 2: Structural Extraction (Vision, PDF Parsing, FAISS, ChromaDB, Struct Graph)
+        self._set_stage(job, "structural_mapping")
+        all_chunks = self._ingest_documents(job, doc_paths, config)
+            
+        self.structural_kg.save(settings.STORAGE_DIR)
+        job["progress"] = 0.25
+        self._mark_stage(job, "structural_mapping")
+        
+        # STAGE 3: Ontology
+        self._set_stage(job, "ontology")
+        ontology = self._build_ontology(job, all_chunks, config)
+        self._mark_stage(job, "ontology")
+        
+        # STAGE 4: KG Extraction
+        self._set_stage(job, "kg_extraction")
+        total = len(all_chunks)
         
-        job["usage"]["total_cost"] = round(input_cost + output_cost, 6)
+        # Refined estimation
+        initial_heuristic = 3.0 + (len(doc_paths) * 5.0) + (total * 0.5)
+        
+        all_triples = self._extract_triples_concurrent(
+            job, all_chunks, ontology, config, start_time, initial_heuristic
+        )
+        self._mark_stage(job, "kg_extraction")
+        return ontology, all_triples
+
+    def _run_streaming_stages(self, job: Dict[str, Any], doc_paths: List[Any], config: Dict[str, Any], start_time: float):
+        """
+        Stages 1-4 overlapped: a producer thread ingests documents page by page and pushes
+        chunks into a bounded queue. The ontology is built from the first N chunks, then the
+        remaining chunks flow into extraction while later pages are still being ingested.
+        If extraction ends early (budget stop) ingestion still runs to the end, as in batch
+        mode; only a failure or cancellation stops it. The producer touches no job fields:
+        its stage time and completion are recorded here once it is joined.
+        """
+        import queue
+        import itertools
+
+        sample_size = max(1, int(config.get("ontology_sample_chunks", settings.STREAMING_ONTOLOGY_CHUNKS)))
+        chunk_queue: "queue.Queue" = queue.Queue(maxsize=settings.STREAMING_QUEUE_SIZE)
+        end_of_stream = object()
+        stop = threading.Event()
+        # Extraction is over: the rest of the ingestion no longer feeds the queue
+        draining = threading.Event()
+        produced: List[Dict[str, Any]] = []
+        ingest_errors: List[Exception] = []
+        # Chunks and pages ingested so far, to extrapolate the job's chunk count (budget, progress)
+        page_counts = [self.structural_extractor.page_count(Path(p)) for p in doc_paths]
+        ingested = {"chunks": 0, "pages": 0, "documents": 0, "done": False, "completed": False, "seconds": 0.0}
+
+        def _put(item) -> bool:
+            # Blocks while the queue is full (backpressure) unless the consumer has given up
+            while not stop.is_set():
+                if draining.is_set():
+                    return True
+                try:
+                    chunk_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def _on_chunks(page_chunks: List[Dict[str, Any]], doc_index: int):
+            for c in page_chunks:
+                if not _put(c):
+                    raise RuntimeError("Streaming consumer stopped")
+                ingested["chunks"] += 1
+            if page_chunks:
+                last_page = max(int(c["metadata"]["page_num"]) for c in page_chunks)
+                ingested["pages"] = sum(page_counts[:doc_index]) + min(last_page, page_counts[doc_index] or last_page)
+
+        def _expected_chunks() -> int:
+            """Exact once ingestion is over; until then chunks per page read so far times all pages."""
+            chunks, pages = ingested["chunks"], ingested["pages"]
+            if ingested["done"] or not pages:
+                return max(chunks, len(produced))
+            return max(chunks, len(produced), round(chunks * sum(page_counts) / pages))
+
+        def _produce():
+            # Ingestion overlaps the later stages, so it is timed here rather than by the stage clock
+            started = time.perf_counter()
+            try:
+                for i, path in enumerate(doc_paths):
+                    restored = self._restored(job, f"doc:{i}")
+                    if restored is not None:
+                        self._charge_ingestion(job, restored.get("usage"))
+                        _on_chunks(restored["chunks"], i)
+                    else:
+                        usage = self._ingestion_meter(job)
+                        chunks = self.structural_extractor.ingest_pdf(
+                            path, self.structural_kg, on_chunks=lambda c, i=i: _on_chunks(c, i),
+                            should_stop=lambda: self._is_cancelled(job),
+                            force=bool(config.get("force_reingest", False)), usage=usage,
+                        )
+                        self._check_cancelled(job)
+                        self._checkpoint(job, f"doc:{i}", {"filename": Path(path).name, "chunks": chunks, "usage": usage.by_model})
+                    ingested["pages"] = sum(page_counts[: i + 1])
+                    ingested["documents"] = i + 1
+                self.structural_extractor.compact_vectors(self.structural_kg)
+                self.structural_kg.save(settings.STORAGE_DIR)
+                ingested["completed"] = True
+            except JobCancelled as e:
+                ingest_errors.append(e)
+            except Exception as e:
+                if not stop.is_set():
+                    logger.exception(f"Streaming ingestion failed for job {job['id']}")
+                    ingest_errors.append(e)
+            finally:
+                ingested["seconds"] = time.perf_counter() - started
+                ingested["done"] = True
+                _put(end_of_stream)
+
+        def _stream():
+            while True:
+                item = chunk_queue.get()
+                job["ingested_documents"] = ingested["documents"]
+                if item is end_of_stream:
+                    return
+                produced.append(item)
+                yield item
+
+        producer = threading.Thread(target=_produce, name=f"ingest-{job['id'][:8]}", daemon=True)
+        producer.start()
+        stream = _stream()
+        try:
+            # STAGE 1 & 2 (overlapped): wait only for the ontology sample
+            self._set_stage(job, "structural_mapping", timed=False)
+            head = list(itertools.islice(stream, sample_size))
+            if ingest_errors:
+                raise ingest_errors[0]
+            job["progress"] = 0.25
+
+            # STAGE 3: Ontology from the first chunks
+            self._set_stage(job, "ontology")
+            ontology = self._build_ontology(job, head, config)
+            self._mark_stage(job, "ontology")
+
+            # STAGE 4: KG Extraction fed by the queue
+            self._set_stage(job, "kg_extraction")
+            initial_heuristic = 3.0 + (len(doc_paths) * 5.0) + (len(doc_paths) * sample_size * 0.5)
+            all_triples = self._extract_triples_concurrent(
+                job, itertools.chain(head, stream), ontology, config, start_time, initial_heuristic,
+                total_hint=_expected_chunks,
+            )
+            if not ingested["done"]:
+                logger.info(f"Extraction of job {job['id']} ended early: ingestion continues without it")
+            draining.set()
+            producer.join()
+        finally:
+            stop.set()
+            producer.join()
+            self._record_stage_time(job, "structural_mapping", ingested["seconds"])
+            job["ingested_documents"] = ingested["documents"]
+
+        if ingest_errors:
+            raise ingest_errors[0]
+        if ingested["completed"]:
+            self._mark_stage(job, "structural_mapping")
+        self._mark_stage(job, "kg_extraction")
+        return ontology, all_triples
 
     def _run_pipeline(self, job_id: str, doc_paths: List[Any], config: Dict[str, Any]):
         job = self.jobs[job_id]
@@ -134,78 +884,57 @@ class PipelineOrchestrator:
             job["status"] = "processing"
             job["start_time"] = start_time
             job["estimated_total_time"] = 30.0 + (len(doc_paths) * 10.0) # Heuristic
+            self._persist_job(job, include_results=False)
             
-            # STAGE 1 & 2: Structural Extraction (Vision, PDF Parsing, FAISS, ChromaDB, Struct Graph)
-            job["current_stage"] = "structural_mapping"
-            all_chunks = []
-            
-            for i, path in enumerate(doc_paths):
-                job["progress"] = (i / len(doc_paths)) * 0.25
-                # Call the new ingest_pdf which populates Faiss, ChromaDB and Structural Graph
-                chunks = self.structural_extractor.ingest_pdf(path, self.structural_kg)
-                all_chunks.extend(chunks)
-                
-            self.structural_kg.save(settings.STORAGE_DIR)
-            job["progress"] = 0.25
-            
-            # STAGE 3: Ontology
-            job["current_stage"] = "ontology"
-            ontology_res = self.ontology_builder.build(
-                all_chunks, 
-                user_instructions=config.get("user_instructions", "")
-            )
-            ontology = ontology_res.get("ontology", ontology_res)
-            self._update_job_usage(job, ontology_res.get("usage", {}))
-            
-            job["results"]["ontology"] = ontology
-            job["progress"] = 0.40
-            
-            # STAGE 4: KG Extraction
-            job["current_stage"] = "kg_extraction"
-            all_triples = []
-            total = len(all_chunks)
-            
-            # Refined estimation
-            initial_heuristic = 3.0 + (len(doc_paths) * 5.0) + (total * 0.5)
+            self._load_append_base(job, config)
+            base = job.get("_append_base")
             
-            for i, chunk in enumerate(all_chunks):
-                kg_res = self.kg_extractor.extract_triples(
-                    chunk, 
-                    ontology, 
-                    user_instructions=config.get("user_instructions", "")
-                )
-                triples = kg_res.get("triples", [])
-                self._update_job_usage(job, kg_res.get("usage", {}), model_override=kg_res.get("model"))
-                
-                all_triples.extend(triples)
-                # Granular updates: 0.40 to 0.85
-                job["progress"] = 0.40 + (0.45 * (i / total if total > 0 else 1))
-                
-                # Smoother time estimation: 
-                # Combine initial heuristic with actual speed, weighted by progress
-                elapsed = time.time() - start_time
-                if job["progress"] > 0:
-                    real_time_est = elapsed / job["progress"]
-                    # As progress increases, we trust real-time data more
-                    weight = job["progress"]
-                    job["estimated_total_time"] = (real_time_est * weight) + (initial_heuristic * (1 - weight))
+            if config.get("streaming", settings.PIPELINE_STREAMING):
+                ontology, all_triples = self._run_streaming_stages(job, doc_paths, config, start_time)
+            else:
+                ontology, all_triples = self._run_batch_stages(job, doc_paths, config, start_time)
             
             # STAGE 5: Prune unused ontology types (after we know what was extracted)
-            job["current_stage"] = "normalization"
-            ontology = self.ontology_builder.prune_unused_types(ontology, all_triples)
-            job["results"]["ontology"] = ontology  # Update with pruned version
+            self._set_stage(job, "normalization")
+            if base is None:
+                ontology = self.ontology_builder.prune_unused_types(ontology, all_triples)
+                job["results"]["ontology"] = ontology  # Update with pruned version
             
             normalized_triples = self.normalizer.normalize(all_triples)
+            if base is not None:
+                # Map new entities onto the corpus entities they refer to
+                existing = {name: {data.get("type", "UNKNOWN")} for name, data in base["graph"].nodes(data=True)}
+                normalized_triples = self.normalizer.resolve_against(normalized_triples, existing)
             
             # STAGE 6: Store semantic entities in ChromaDB
-            job["current_stage"] = "semantic_storage"
-            self.kg_extractor.store_entities(normalized_triples)
+            self._set_stage(job, "semantic_storage")
+            merged_graph = None
+            if base is None:
+                self.kg_extractor.store_entities(normalized_triples)
+            else:
+                # Only entities touched by the new triples are re-stored, with their full corpus context
+                merged_graph = self.graph_builder.merge(base["graph"], normalized_triples)
+                touched = {t["source"] for t in normalized_triples} | {t["target"] for t in normalized_triples}
+                self.kg_extractor.store_entities(
+                    self.graph_builder.triples_from_graph(merged_graph, touched), only=touched
+                )
             
             job["progress"] = 0.90
+            self._emit_progress(job)
             
             # STAGE 6: Graph Building
-            job["current_stage"] = "graph_building"
-            graph_result = self.graph_builder.build_graph(normalized_triples)
+            self._set_stage(job, "graph_building")
+            if merged_graph is None:
+                graph_result = self.graph_builder.build_graph(normalized_triples)
+            else:
+                graph_result = self.graph_builder.serialize(merged_graph)
+                base_nodes = base["graph"].number_of_nodes()
+                job["results"]["append"] = {
+                    "base_job_id": base["id"],
+                    "new_triples": len(normalized_triples),
+                    "new_entities": merged_graph.number_of_nodes() - base_nodes,
+                    "updated_entities": len(touched & set(base["graph"].nodes)),
+                }
             
             # Store NetworkX graph (internal) and serialized formats (public)
             job["results"]["_graph"] = graph_result["graph"]
@@ -219,27 +948,52 @@ class PipelineOrchestrator:
             cache.set(f"{cache_key_base}_cytoscape", graph_result["cytoscape"])
             cache.set(f"{cache_key_base}_stats", graph_result["stats"])
             
+            # Timings are in place before pollers can observe the completed status
+            self._stop_stage_clock(job)
+            job["results"]["metrics"] = self._job_metrics(job)
+            
             job["progress"] = 1.0
             job["status"] = "completed"
             job["end_time"] = time.time()
             job["duration"] = job["end_time"] - start_time
             
+            # Checkpoints are only needed to resume unfinished jobs
+            try:
+                job_store.clear_checkpoints(job_id)
+            except Exception as e_cp:
+                logger.warning(f"Could not clear checkpoints for job {job_id}: {e_cp}")
+            
+        except JobCancelled:
+            logger.info(f"Job {job_id} cancelled")
+            job["status"] = "cancelled"
+            self._set_stage(job, "cancelled")
         except Exception as e:
             logger.exception(f"Job {job_id} failed")
             job["status"] = "failed"
             job["error"] = str(e)
         finally:
             # --- ALWAYS SAVE STATE FOR PERSISTENCE ---
-            import json
+            self._stop_stage_clock(job)
+            job["results"]["metrics"] = self._job_metrics(job)
+            metrics.inc("pipeline_jobs_total", status=job["status"])
+            job.pop("_checkpoints", None)
+            job.pop("_usage_emitted", None)
+            job.pop("_llm_calls", None)
+            job.pop("_append_base", None)
+            self._cancel_events.pop(job_id, None)
             from app.cache.strategies.redis_cache import cache
             
-            # 1. Disk (backend/app/storage/results)
+            # 1. Job store (status and results kept separately, indexed by id/status/date)
+            self._persist_job(job)
+            
+            # 2. Disk export (backend/app/storage/results)
             # Use primary filename + UUID for easier manual lookup
             primary_name = job.get("filenames", ["result"])[0]
             # Sanitize name
             import re
             safe_name = re.sub(r'[^a-zA-Z0-9_\-]', '_', primary_name)
             
+            # Plain JSON (VisualizePage imports it); only the job store sections are compressed
             result_path = settings.RESULTS_DIR / f"{safe_name}_{job_id}.json"
             try:
                 # Filter out the NetworkX graph object for JSON serialization
@@ -247,18 +1001,21 @@ class PipelineOrchestrator:
                 if "results" in job:
                     serializable_job["results"] = {k: v for k, v in job["results"].items() if k != "_graph"}
                 
-                with open(result_path, 'w', encoding='utf-8') as f:
-                    json.dump(serializable_job, f, indent=2, ensure_ascii=False)
+                with open(result_path, 'wb') as f:
+                    f.write(dump_json(serializable_job, indent=True))
                 logger.info(f"💾 Job {job_id} state persisted to {result_path} (Status: {job['status']})")
             except Exception as e_save:
                 logger.error(f"❌ Critical failure saving job {job_id}: {e_save}")
 
-            # 2. Redis Cache
+            # 3. Redis Cache
             try:
                 cache.set(f"job_full_state_{job_id}", job)
             except:
                 pass
             # ----------------------------------------
 
+            # 4. Final event for /pipeline/events subscribers
+            self._emit_status(job)
+
 # Global instance
 orchestrator = PipelineOrchestrator()
@@ -0,0 +1,131 @@
+import threading
+import logging
+from collections import OrderedDict, deque
+from typing import Dict, Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_CLASSES = {
+    "interactive": 0,  # single-document jobs started from the UI
+    "bulk": 1,         # multi-document backfills
+}
+
+
+class JobCancelled(Exception):
+    """Raised inside a running pipeline once its job has been cancelled."""
+
+
+class JobScheduler:
+    """
+    Priority queue in front of the pipeline worker threads.
+    Jobs are grouped by priority class; within a class, submitters are served round-robin
+    (optionally capped at `max_per_submitter` running jobs) so one large backfill
+    cannot block everyone else's small jobs.
+    """
+
+    def __init__(self, runner: Callable[..., Any], max_workers: int, max_per_submitter: int = 0):
+        self._runner = runner
+        self._max_workers = max(1, max_workers)
+        self._max_per_submitter = max_per_submitter
+        # priority -> submitter -> FIFO of (job_id, args)
+        self._queues: Dict[int, "OrderedDict[str, deque]"] = {p: OrderedDict() for p in PRIORITY_CLASSES.values()}
+        self._queued: Dict[str, Tuple[int, str]] = {}
+        self._running: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._workers: list = []
+
+    def _ensure_workers(self):
+        """Worker threads are started lazily on the first submission."""
+        if self._workers:
+            return
+        for i in range(self._max_workers):
+            t = threading.Thread(target=self._worker_loop, name=f"pipeline-worker-{i}", daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def submit(self, job_id: str, args: tuple, priority: str = "interactive", submitter: str = "anonymous"):
+        level = PRIORITY_CLASSES.get(priority, PRIORITY_CLASSES["bulk"])
+        with self._cond:
+            self._ensure_workers()
+            self._queues[level].setdefault(submitter, deque()).append((job_id, args))
+            self._queued[job_id] = (level, submitter)
+            self._cond.notify()
+        logger.info(f"Job {job_id} queued (priority={priority}, submitter={submitter})")
+
+    def cancel(self, job_id: str) -> bool:
+        """Removes a job that has not started yet. Returns False if it is not queued."""
+        with self._cond:
+            entry = self._queued.pop(job_id, None)
+            if entry is None:
+                return False
+            level, submitter = entry
+            queue = self._queues[level].get(submitter)
+            if queue is not None:
+                for item in list(queue):
+                    if item[0] == job_id:
+                        queue.remove(item)
+                if not queue:
+                    del self._queues[level][submitter]
+            return True
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """Approximate number of queued jobs that will be served before this one."""
+        with self._cond:
+            entry = self._queued.get(job_id)
+            if entry is None:
+                return None
+            level, submitter = entry
+            own = self._queues[level][submitter]
+            rank = next(i for i, item in enumerate(own) if item[0] == job_id)
+            ahead = sum(len(q) for p, subs in self._queues.items() if p < level for q in subs.values())
+            # Round-robin order: submitters ahead in the rotation get one extra turn before ours
+            before_us = True
+            for other, q in self._queues[level].items():
+                if other == submitter:
+                    before_us = False
+                    continue
+                ahead += min(len(q), rank + 1 if before_us else rank)
+            return ahead + rank
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "queued": {name: sum(len(q) for q in self._queues[level].values()) for name, level in PRIORITY_CLASSES.items()},
+                "running_by_submitter": dict(self._running),
+                "workers": self._max_workers,
+            }
+
+    def _pop_next(self) -> Tuple[str, tuple, str]:
+        with self._cond:
+            while True:
+                for level in sorted(self._queues):
+                    submitters = self._queues[level]
+                    for submitter in list(submitters):
+                        if self._max_per_submitter and self._running.get(submitter, 0) >= self._max_per_submitter:
+                            continue
+                        queue = submitters[submitter]
+                        job_id, args = queue.popleft()
+                        # Round-robin: the submitter just served goes to the back of its class
+                        if queue:
+                            submitters.move_to_end(submitter)
+                        else:
+                            del submitters[submitter]
+                        self._queued.pop(job_id, None)
+                        self._running[submitter] = self._running.get(submitter, 0) + 1
+                        return job_id, args, submitter
+                self._cond.wait()
+
+    def _worker_loop(self):
+        while True:
+            job_id, args, submitter = self._pop_next()
+            try:
+                self._runner(*args)
+            except Exception:
+                logger.exception(f"Unhandled error running job {job_id}")
+            finally:
+                with self._cond:
+                    self._running[submitter] -= 1
+                    if not self._running[submitter]:
+                        del self._running[submitter]
+                    self._cond.notify_all()
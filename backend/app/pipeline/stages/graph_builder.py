@@ -1,5 +1,5 @@
 import networkx as nx
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable
 import logging
 from app.graph.serializers import GraphSerializer
 
@@ -14,7 +14,11 @@ class GraphBuilder:
         Constructs a NetworkX Directed Graph from triples.
         Returns both the graph and serialized formats.
         """
-        G = nx.DiGraph()
+        return self.serialize(self.merge(nx.DiGraph(), triples))
+
+    def merge(self, base_graph: nx.DiGraph, triples: List[Dict[str, Any]]) -> nx.DiGraph:
+        """Returns a copy of `base_graph` with the triples added (the base graph is left untouched)."""
+        G = base_graph.copy()
         
         logger.info(f"Building graph from {len(triples)} triples...")
         
@@ -58,7 +62,9 @@ class GraphBuilder:
                 G.add_edge(src, tgt, relation=rel, weight=1)
                 
         logger.info(f"Graph built: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges.")
-        
+        return G
+
+    def serialize(self, G: nx.DiGraph) -> Dict[str, Any]:
         # Serialize graph for frontend
         cytoscape_data = self.serializer.to_cytoscape(G)
         graph_stats = self.serializer.get_graph_stats(G)
@@ -69,3 +75,28 @@ class GraphBuilder:
             "stats": graph_stats  # Graph statistics
         }
 
+    @staticmethod
+    def triples_from_graph(G: nx.DiGraph, nodes: Iterable[str]) -> List[Dict[str, Any]]:
+        """Triples (in the extraction format) for every edge touching the given nodes."""
+        def describe(node_id: str) -> tuple:
+            data = G.nodes[node_id]
+            attrs = {k: v for k, v in data.items() if k not in ("type", "description")}
+            return data.get("type", "Unknown"), data.get("description", ""), attrs
+
+        triples = []
+        seen = set()
+        for node in nodes:
+            if node not in G:
+                continue
+            for src, tgt, edge in list(G.in_edges(node, data=True)) + list(G.out_edges(node, data=True)):
+                if (src, tgt) in seen:
+                    continue
+                seen.add((src, tgt))
+                src_type, src_desc, src_attrs = describe(src)
+                tgt_type, tgt_desc, tgt_attrs = describe(tgt)
+                triples.append({
+                    "source": src, "source_type": src_type, "source_desc": src_desc, "source_attributes": src_attrs,
+                    "target": tgt, "target_type": tgt_type, "target_desc": tgt_desc, "target_attributes": tgt_attrs,
+                    "relation": edge.get("relation", "relacionado_com"),
+                })
+        return triples
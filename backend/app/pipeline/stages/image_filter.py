@@ -0,0 +1,82 @@
+import logging
+from typing import Any, Dict, Tuple
+import numpy as np
+from PIL import Image
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Images are analysed on a thumbnail of at most this size (features are scale-free ratios)
+ANALYSIS_SIZE = 256
+# Luminance step (0-255) between neighbouring pixels counted as an edge
+EDGE_THRESHOLD = 24
+# Share of black/white transitions along a row above which the row looks like a line of text
+TEXT_ROW_TRANSITIONS = 0.04
+# Share of the image held by its two dominant colours for it to count as ink on a background
+TEXT_TWO_TONE_SHARE = 0.7
+
+
+def image_features(img: Image.Image) -> Dict[str, float]:
+    """
+    Cheap NumPy statistics of an image: colour entropy (bits over a 12-bit RGB palette),
+    share of the 8 dominant colours, edge density, text-likeness, aspect ratio and
+    luminance standard deviation (near-uniformity).
+    """
+    thumb = img.convert("RGB")
+    if thumb is img:
+        thumb = img.copy()
+    thumb.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE))
+    rgb = np.asarray(thumb, dtype=np.uint8)
+    gray = rgb.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    h, w = gray.shape
+
+    q = (rgb >> 4).astype(np.uint16)
+    codes = (q[..., 0] << 8) | (q[..., 1] << 4) | q[..., 2]
+    counts = np.bincount(codes.ravel(), minlength=4096)
+    probs = counts[counts > 0] / codes.size
+    ranked = np.sort(counts)[::-1]
+
+    edges = 0.0
+    if h > 1 and w > 1:
+        gx = np.abs(np.diff(gray, axis=1))[:-1, :]
+        gy = np.abs(np.diff(gray, axis=0))[:, :-1]
+        edges = float(((gx + gy) > EDGE_THRESHOLD).mean())
+
+    text_likeness = 0.0
+    if ranked[:2].sum() / codes.size >= TEXT_TWO_TONE_SHARE and w > 1:
+        binary = (gray > gray.mean()).astype(np.int8)
+        transitions = np.abs(np.diff(binary, axis=1)).sum(axis=1) / (w - 1)
+        text_likeness = float((transitions > TEXT_ROW_TRANSITIONS).mean())
+
+    return {
+        "width": img.width,
+        "height": img.height,
+        "aspect": max(img.width, img.height) / max(1, min(img.width, img.height)),
+        "std": float(gray.std()),
+        "entropy": float(-(probs * np.log2(probs)).sum()),
+        "palette_share": float(ranked[:8].sum() / codes.size),
+        "edge_density": edges,
+        "text_likeness": text_likeness,
+    }
+
+
+def classify_image(img: Image.Image) -> Tuple[bool, str, Dict[str, Any]]:
+    """
+    (informative, reason, features) for an extracted image. Charts, diagrams, maps and
+    images of text are kept; flat fills, rules/banners, gradients, photos/textures and
+    small icons are skipped before any vision call. Thresholds: IMAGE_FILTER_* settings.
+    """
+    f = image_features(img)
+    if f["std"] < settings.IMAGE_FILTER_MIN_STD:
+        return False, "uniform", f
+    if f["aspect"] > settings.IMAGE_FILTER_MAX_ASPECT:
+        return False, "aspect", f
+    if f["text_likeness"] >= settings.IMAGE_FILTER_MIN_TEXT_LIKENESS:
+        return True, "text", f
+    if f["edge_density"] < settings.IMAGE_FILTER_MIN_EDGE_DENSITY:
+        return False, "smooth", f
+    if f["entropy"] > settings.IMAGE_FILTER_MAX_ENTROPY and f["palette_share"] < settings.IMAGE_FILTER_MIN_PALETTE_SHARE:
+        return False, "photo", f
+    if max(f["width"], f["height"]) < settings.IMAGE_FILTER_ICON_SIZE:
+        return False, "icon", f
+    return True, "informative", f
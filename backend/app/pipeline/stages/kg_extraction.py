@@ -1,5 +1,6 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set
 import json
+import time
 import logging
 import httpx
 import chromadb
@@ -7,6 +8,7 @@ from pathlib import Path
 from openai import OpenAI
 from app.config import settings, SemanticNodeType
 from app.utils import retry_with_exponential_backoff, make_entity_id
+from app.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -48,9 +50,11 @@ class KGExtractor:
             metadata={"hnsw:space": "cosine"}
         )
 
-    def store_entities(self, triples: List[Dict[str, Any]]):
+    def store_entities(self, triples: List[Dict[str, Any]], only: Optional[Set[str]] = None):
         """
         Extracts unique entities from triples and stores their enriched context in ChromaDB.
+        With `only`, just the entities with those names are (re)stored: incremental updates
+        pass every triple touching them so their context stays complete.
         """
         if not triples:
             return
@@ -92,6 +96,9 @@ class KGExtractor:
             entities[t_id]["rels"].append(f"alvo de {rel} por {s_name}")
 
         # Upsert to ChromaDB
+        if only is not None:
+            entities = {eid: info for eid, info in entities.items() if info["name"] in only}
+
         for eid, info in entities.items():
             # Build rich contextual text
             attrs_text = "; ".join(f"{k}={v}" for k, v in info["attributes"].items())
@@ -105,16 +112,17 @@ class KGExtractor:
                 f"Relações: {rels_text}"
             ).strip()
 
-            self.semantic_collection.upsert(
-                ids=[eid],
-                documents=[full_context],
-                metadatas=[{
-                    "node_type": SemanticNodeType["ENTITY"],
-                    "entity_id": eid,
-                    "name": info["name"],
-                    "type": info["type"]
-                }]
-            )
+            with metrics.timer("vector_store_operation_duration_seconds", store="chroma_semantic", operation="upsert"):
+                self.semantic_collection.upsert(
+                    ids=[eid],
+                    documents=[full_context],
+                    metadatas=[{
+                        "node_type": SemanticNodeType["ENTITY"],
+                        "entity_id": eid,
+                        "name": info["name"],
+                        "type": info["type"]
+                    }]
+                )
         
         logger.info(f"Stored {len(entities)} unique entities in semantic collection.")
 
@@ -179,25 +187,30 @@ RETORNE APENAS JSON SEGUINDO ESTE MODELO EXATO:
 }}
 """
 
+    def processing_model(self, user_instructions: str = "") -> str:
+        # Upgrade model if custom instructions are provided to guarantee adherence
+        return "gpt-4o" if user_instructions else self.model
+
     def extract_triples(
         self,
         chunk: Dict[str, Any],
         ontology: Dict[str, Any],
-        user_instructions: str = ""
+        user_instructions: str = "",
+        model: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Extracts semantic triples from a chunk, with strict post-processing validation.
+        `model` overrides the default choice (used when a job's budget downgrades it).
         """
         prompt = self._build_prompt(chunk, ontology, user_instructions)
         valid_types = {e["name"].upper() for e in ontology.get("entities", [])}
         
-        # Upgrade model if custom instructions are provided to guarantee adherence
-        processing_model = "gpt-4o" if user_instructions else self.model
+        processing_model = model or self.processing_model(user_instructions)
 
         @retry_with_exponential_backoff()
         def _call_llm(messages, model):
-            return self.client.chat.completions.create(
-                model=model,
+            return metrics.track_llm_call(
+                "kg_extraction", model, self.client.chat.completions.create,
                 messages=messages,
                 temperature=0.0
             )
@@ -214,7 +227,9 @@ RETORNE APENAS JSON SEGUINDO ESTE MODELO EXATO:
                 },
                 {"role": "user", "content": prompt}
             ]
+            started = time.perf_counter()
             response = _call_llm(messages, processing_model)
+            latency = time.perf_counter() - started
 
             raw_content = response.choices[0].message.content or ""
             usage = response.usage.model_dump() if hasattr(response, 'usage') else {}
@@ -243,7 +258,7 @@ RETORNE APENAS JSON SEGUINDO ESTE MODELO EXATO:
                 f"Chunk {chunk.get('index', '?')}: "
                 f"{len(raw_triples)} raw → {len(validated)} valid triples"
             )
-            return {"triples": validated, "usage": usage, "model": processing_model}
+            return {"triples": validated, "usage": usage, "model": processing_model, "latency": latency}
 
         except Exception as e:
             logger.error(f"KG extraction failed for chunk {chunk.get('index')}: {e}")
@@ -1,4 +1,4 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable
 from rapidfuzz import process, fuzz
 import logging
 
@@ -73,46 +73,88 @@ class NormalizationStage:
             entity_types = entity_info[entity.lower()]["types"]
             
             for match_name, score, _ in matches:
-                is_match = score >= self.threshold
-                if not is_match:
-                    is_match = self._is_acronym_match(entity, match_name)
-                if not is_match and len(entity) > 10 and len(match_name) > 10:
-                    if entity.lower() in match_name.lower() or match_name.lower() in entity.lower():
-                        is_match = True
-
-                if is_match:
+                if self._names_match(entity, match_name, score):
                     match_types = entity_info[match_name.lower()]["types"]
-                    is_compatible = len(entity_types.intersection(match_types)) > 0 or "UNKNOWN" in entity_types or "UNKNOWN" in match_types
-                    
-                    if is_compatible:
+                    if self._types_compatible(entity_types, match_types):
                         final_canonical[match_name] = current_canonical
                         processed.add(match_name)
         
         # 3. Update triples
-        normalized_triples = []
+        # Map original name -> case-normalized -> fuzzy-canonical
+        normalized_triples = self._rewrite(
+            triples, lambda name: final_canonical.get(canonical_map.get(name.lower(), name), name)
+        )
+                
+        logger.info(f"Normalization complete. Reduced {len(triples)} to {len(normalized_triples)} triples.")
+        return normalized_triples
+
+    def resolve_against(self, triples: List[Dict[str, Any]], existing: Dict[str, set]) -> List[Dict[str, Any]]:
+        """
+        Maps the entities of already normalized triples onto an existing entity set
+        (name -> types, e.g. the nodes of a corpus graph) using the same matching rules
+        as `normalize`. Names without a compatible match are kept as new entities.
+        """
+        if not triples or not existing:
+            return triples
+
+        by_lower = {name.lower(): name for name in existing}
+        existing_names = list(existing)
+
+        new_types: Dict[str, set] = {}
+        for t in triples:
+            for side, type_side in [("source", "source_type"), ("target", "target_type")]:
+                new_types.setdefault(str(t[side]).strip(), set()).add(t.get(type_side, "UNKNOWN"))
+
+        resolved: Dict[str, str] = {}
+        for name, types in new_types.items():
+            exact = by_lower.get(name.lower())
+            if exact is not None and self._types_compatible(types, existing[exact]):
+                resolved[name] = exact
+                continue
+            for match_name, score, _ in process.extract(name, existing_names, scorer=fuzz.WRatio, limit=20):
+                if self._names_match(name, match_name, score) and self._types_compatible(types, existing[match_name]):
+                    resolved[name] = match_name
+                    break
+
+        logger.info(f"Resolved {len(resolved)} of {len(new_types)} entities against {len(existing)} existing entities.")
+        return self._rewrite(triples, lambda name: resolved.get(name, name))
+
+    def _names_match(self, name1: str, name2: str, score: float) -> bool:
+        """Fuzzy score, acronym or (long-name) substring match."""
+        if score >= self.threshold:
+            return True
+        if self._is_acronym_match(name1, name2):
+            return True
+        if len(name1) > 10 and len(name2) > 10:
+            return name1.lower() in name2.lower() or name2.lower() in name1.lower()
+        return False
+
+    @staticmethod
+    def _types_compatible(types1: set, types2: set) -> bool:
+        return len(types1.intersection(types2)) > 0 or "UNKNOWN" in types1 or "UNKNOWN" in types2
+
+    @staticmethod
+    def _rewrite(triples: List[Dict[str, Any]], canonical: Callable[[str], str]) -> List[Dict[str, Any]]:
+        """Renames triple endpoints, dropping self-loops and duplicate (source, target, relation) triples."""
+        rewritten = []
         seen_triples = set()
-        
+
         for t in triples:
-            src = str(t["source"]).strip()
-            tgt = str(t["target"]).strip()
-            
-            # Map original name -> case-normalized -> fuzzy-canonical
-            new_source = final_canonical.get(canonical_map.get(src.lower(), src), src)
-            new_target = final_canonical.get(canonical_map.get(tgt.lower(), tgt), tgt)
-            
+            new_source = canonical(str(t["source"]).strip())
+            new_target = canonical(str(t["target"]).strip())
+
             if new_source.lower() == new_target.lower():
                 continue
-                
+
             triple_key = (new_source.lower(), new_target.lower(), str(t["relation"]).lower())
             if triple_key not in seen_triples:
                 normalized_t = t.copy()
                 normalized_t["source"] = new_source
                 normalized_t["target"] = new_target
-                normalized_triples.append(normalized_t)
+                rewritten.append(normalized_t)
                 seen_triples.add(triple_key)
-                
-        logger.info(f"Normalization complete. Reduced {len(triples)} to {len(normalized_triples)} triples.")
-        return normalized_triples
+
+        return rewritten
 
     def _is_acronym_match(self, name1: str, name2: str) -> bool:
         """Checks if one name could be an acronym of the other."""
@@ -1,7 +1,9 @@
 from typing import List, Dict, Any
 import json
+import time
 from app.config import settings
 from app.utils import retry_with_exponential_backoff
+from app.metrics import metrics
 import logging
 import httpx
 from openai import OpenAI
@@ -93,8 +95,8 @@ TEXTO PARA ANÁLISE:
 
         @retry_with_exponential_backoff()
         def _call_llm(messages, model):
-            return self.client.chat.completions.create(
-                model=model,
+            return metrics.track_llm_call(
+                "ontology", model, self.client.chat.completions.create,
                 messages=messages,
                 temperature=0.0
             )
@@ -105,7 +107,9 @@ TEXTO PARA ANÁLISE:
                 {"role": "system", "content": "Você é um arquiteto de ontologias especialista em extração de Grafos de Conhecimento Científico. Responda apenas com o JSON da ontologia."},
                 {"role": "user", "content": prompt}
             ]
+            started = time.perf_counter()
             response = _call_llm(messages, self.model)
+            latency = time.perf_counter() - started
 
             raw_content = response.choices[0].message.content or ""
             ontology = self._parse_json(raw_content)
@@ -118,7 +122,7 @@ TEXTO PARA ANÁLISE:
                 f"Ontology built: {len(ontology.get('entities', []))} entity types, "
                 f"{len(ontology.get('relations', []))} relation types."
             )
-            return {"ontology": ontology, "usage": usage}
+            return {"ontology": ontology, "usage": usage, "latency": latency}
 
         except Exception as e:
             logger.error(f"Ontology generation failed: {e}")
@@ -1,5 +1,13 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator, Tuple
+import io
+import os
+import hashlib
 import logging
+import threading
+from collections import deque
+from itertools import groupby
+from contextlib import closing, contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 import fitz
 import numpy as np
 from PIL import Image
@@ -8,10 +16,15 @@ import chromadb
 from pathlib import Path
 
 from app.config import settings, NodeType, EdgeType
+from app.metrics import metrics
+from app.cache.strategies.image_cache import image_cache
+from app.cache.strategies.embedding_cache import embedding_cache
+from app.pipeline.stages.image_filter import classify_image
+from app.pipeline.stages.table_text import parse_table, describe_parsed_table, is_reliable
 from app.utils import (
     retry_with_exponential_backoff,
     make_doc_id, make_section_id, make_page_id, make_chunk_id,
-    make_image_id, make_table_id,
+    make_image_id, make_table_id, hash_file, process_context,
     clean_text, split_into_chunks, detect_section_title, truncate,
 )
 
@@ -25,77 +38,600 @@ IMG_MAX_SIZE = 1024
 CHUNK_SIZE = 1500
 CHUNK_OVERLAP = 200
 CHUNK_MIN_LENGTH = 100
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Conservative token estimate for packing embedding requests (no tokenizer at hand)
+EMBEDDING_CHARS_PER_TOKEN = 3
+# Upper bound of a single Chroma upsert when the client cannot report its own limit
+CHROMA_MAX_BATCH = 5000
+
+def vector_id(node_id: str) -> int:
+    """Stable, non-negative int64 Faiss id of a node (first 63 bits of sha256 of the node id)."""
+    return int.from_bytes(hashlib.sha256(node_id.encode("utf-8")).digest()[:8], "little") & 0x7FFFFFFFFFFFFFFF
+
 
 class FaissIndex:
-    def __init__(self):
-        self.index = faiss.IndexFlatIP(1536) # Default OpenAI dimension
-        self.id_map: List[str] = []
+    """
+    Inner-product index over L2-normalized vectors, keyed by node id: vectors are stored in an
+    IndexIDMap2 under `vector_id(node_id)`, so re-adding a node replaces its vector and the
+    vectors of a node or a whole document can be removed. `id_map` maps Faiss ids back to node
+    ids; the map file keeps the node ids only (ids are derived from them).
+    """
+    def __init__(self, dim: int = 1536):  # Default OpenAI dimension
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self.id_map: Dict[int, str] = {}
+        # Vectors removed since the last orphan check (see `compact`)
+        self.removed = 0
+
+    def upsert(self, node_id: str, vector: np.ndarray):
+        self.upsert_many([(node_id, vector)])
+
+    def upsert_many(self, items: Iterable[Tuple[str, np.ndarray]]):
+        """
+        Adds or replaces the vectors of several nodes (a node given twice keeps its last vector).
+        Replaced vectors are dropped with a single `remove_ids`, which scans the flat storage
+        once, and the batch is added with one `add_with_ids`.
+        """
+        latest = {node_id: vector for node_id, vector in items}
+        if not latest:
+            return
+        vecs = np.stack([np.asarray(v, dtype=np.float32).reshape(-1) for v in latest.values()])
+        faiss.normalize_L2(vecs)
+        vids = np.array([vector_id(n) for n in latest], dtype=np.int64)
+        replaced = [vid for vid in vids.tolist() if vid in self.id_map]
+        with metrics.timer("vector_store_operation_duration_seconds", store="faiss", operation="upsert"):
+            if replaced:
+                self.index.remove_ids(np.array(replaced, dtype=np.int64))
+            self.index.add_with_ids(vecs, vids)
+        self.id_map.update(zip(vids.tolist(), latest))
 
-    def add(self, node_id: str, vector: np.ndarray):
-        vec = vector.astype(np.float32).reshape(1, -1)
-        faiss.normalize_L2(vec)
-        self.index.add(vec)
-        self.id_map.append(node_id)
+    def remove_ids(self, node_ids: Iterable[str]) -> int:
+        """Drops the vectors of the given nodes (unknown ids are ignored); returns how many were removed."""
+        vids = [vid for vid in {vector_id(n) for n in node_ids} if vid in self.id_map]
+        if vids:
+            with metrics.timer("vector_store_operation_duration_seconds", store="faiss", operation="remove"):
+                self.index.remove_ids(np.array(vids, dtype=np.int64))
+            for vid in vids:
+                del self.id_map[vid]
+            self.removed += len(vids)
+        return len(vids)
+
+    def remove_by_doc(self, doc_id: str) -> int:
+        """Drops the vectors of every node of a document (node ids start with the doc id)."""
+        return self.remove_ids([n for n in self.id_map.values() if n.startswith(doc_id)])
+
+    def compact(self, live_ids: Optional[Iterable[str]] = None) -> int:
+        """
+        Drops orphans: vectors whose node is not in `live_ids` (e.g. left behind by an
+        interrupted replacement) or not in `id_map`. `remove_ids` already shifts the flat
+        storage down, so there is no free space to reclaim and nothing is rebuilt.
+        Returns the number of vectors dropped.
+        """
+        live = set(live_ids) if live_ids is not None else None
+        ids = faiss.vector_to_array(self.index.id_map).astype(np.int64).tolist()
+        orphans = [vid for vid in ids if vid not in self.id_map or (live is not None and self.id_map[vid] not in live)]
+        if orphans:
+            with metrics.timer("vector_store_operation_duration_seconds", store="faiss", operation="compact"):
+                self.index.remove_ids(np.array(orphans, dtype=np.int64))
+        kept = set(ids) - set(orphans)
+        self.id_map = {vid: node_id for vid, node_id in self.id_map.items() if vid in kept}
+        self.removed = 0
+        return len(orphans)
+
+    def search(self, vector: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        """(node_id, score) of the `k` nearest vectors, best first."""
+        k = min(k, self.index.ntotal)
+        if k <= 0:
+            return []
+        query = vector.astype(np.float32).reshape(1, -1)
+        faiss.normalize_L2(query)
+        with metrics.timer("vector_store_operation_duration_seconds", store="faiss", operation="search"):
+            D, I = self.index.search(query, k)
+        return [(self.id_map[vid], float(d)) for d, vid in zip(D[0], I[0]) if vid in self.id_map]
 
     def save(self):
-        faiss.write_index(self.index, str(settings.FAISS_INDEX_FILE))
+        with metrics.timer("vector_store_operation_duration_seconds", store="faiss", operation="save"):
+            faiss.write_index(self.index, str(settings.FAISS_INDEX_FILE))
         import json
         with open(settings.FAISS_MAP_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.id_map, f, ensure_ascii=False)
+            json.dump(list(self.id_map.values()), f, ensure_ascii=False)
 
     @classmethod
     def load(cls) -> "FaissIndex":
-        fi = cls()
-        fi.index = faiss.read_index(str(settings.FAISS_INDEX_FILE))
         import json
+        index = faiss.read_index(str(settings.FAISS_INDEX_FILE))
         with open(settings.FAISS_MAP_FILE, "r", encoding="utf-8") as f:
-            fi.id_map = json.load(f)
+            node_ids = json.load(f)
+        fi = cls(index.d)
+        if isinstance(index, faiss.IndexIDMap2):
+            fi.index = index
+            fi.id_map = {vector_id(n): n for n in node_ids}
+        else:
+            # Index written before ids were stored: positions follow the map, later duplicates win
+            vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, index.d), dtype=np.float32)
+            latest = {n: i for i, n in enumerate(node_ids[: len(vectors)])}
+            fi.upsert_many((node_id, vectors[i]) for node_id, i in latest.items())
+            logger.info(f"Migrated Faiss index to ID-mapped storage: {len(latest)} vectors ({len(node_ids) - len(latest)} duplicates dropped)")
         return fi
 
     @classmethod
     def exists(cls) -> bool:
         return settings.FAISS_INDEX_FILE.exists() and settings.FAISS_MAP_FILE.exists()
 
+class ChromaRecordBuffer:
+    """Collects Chroma records in memory; exposes the same `upsert` signature as a Collection."""
+    def __init__(self):
+        self.records: List[tuple] = []
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[dict]):
+        self.records.extend(zip(ids, documents, metadatas))
+
+
+class ChromaBatchWriter:
+    """
+    Buffers Chroma records and writes them with one `upsert` per batch instead of one per node.
+    Flushes every `flush_size` records (and whenever the owner calls `flush`, e.g. at the end of
+    a document); large flushes are split to respect the collection's max batch size.
+    A record added twice before a flush keeps its latest version (same as sequential upserts).
+    """
+    def __init__(self, collection, flush_size: int = None, max_batch_size: int = None):
+        self.collection = collection
+        self.flush_size = max(1, flush_size or settings.CHROMA_UPSERT_BATCH)
+        self.max_batch_size = max(1, max_batch_size or CHROMA_MAX_BATCH)
+        self._pending: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def add(self, node_id: str, text: str, metadata: dict):
+        with self._lock:
+            self._pending[node_id] = (text, metadata)
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self.flush()
+
+    def extend(self, records: List[tuple]):
+        with self._lock:
+            for node_id, text, metadata in records:
+                self._pending[node_id] = (text, metadata)
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            records, self._pending = list(self._pending.items()), {}
+            for i in range(0, len(records), self.max_batch_size):
+                batch = records[i : i + self.max_batch_size]
+                with metrics.timer("vector_store_operation_duration_seconds", store="chroma", operation="upsert_batch"):
+                    self.collection.upsert(
+                        ids=[node_id for node_id, _ in batch],
+                        documents=[text for _, (text, _) in batch],
+                        metadatas=[meta for _, (_, meta) in batch],
+                    )
+
+
+class EmbeddingBatcher:
+    """
+    Collects the texts to embed across a document (chunks and visual descriptions) and embeds
+    them together every `window` texts and when the owner calls `flush` (end of the document);
+    `embed_fn` packs them into as few API requests as the input/token limits allow. Vectors are
+    added to the Faiss index under their node ids; `on_vector` callbacks receive them as well
+    (None if the embedding failed).
+    """
+    def __init__(self, embed_fn: Callable[[List[str]], List[np.ndarray]], faiss_index, window: int = None):
+        self.embed_fn = embed_fn
+        self.faiss_index = faiss_index
+        self.window = max(1, window or settings.EMBEDDING_BATCH_WINDOW)
+        self._pending: List[tuple] = []
+
+    def add(self, node_id: str, text: str, on_vector: Optional[Callable[[np.ndarray], None]] = None):
+        self._pending.append((node_id, text, on_vector))
+        if len(self._pending) >= self.window:
+            self.flush()
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            vectors = self.embed_fn([text for _, text, _ in pending])
+        except Exception as e:
+            logger.error(f"Erro embedding de {len(pending)} textos: {e}")
+            for _, _, on_vector in pending:
+                if on_vector:
+                    on_vector(None)
+            return
+        self.faiss_index.upsert_many((node_id, vec) for (node_id, _, _), vec in zip(pending, vectors))
+        for (_, _, on_vector), vec in zip(pending, vectors):
+            if on_vector:
+                on_vector(vec)
+
+
+class VisionPool:
+    """
+    Bounded thread pool for the vision calls of one document. Elements are submitted in
+    document order while pages are parsed (at most `window` images wait in memory) and
+    `results` returns them in that same order. Retries stay per call (decorated methods).
+    """
+    def __init__(self, concurrency: int = None, window: int = None):
+        concurrency = max(1, concurrency or settings.VISION_CONCURRENCY)
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="vision")
+        self._window = window or concurrency * 4
+        self._in_flight = set()
+        self._elements: List[tuple] = []
+        # key -> (future, element) of the first submission, for identical images in one document
+        self._by_key: Dict[str, tuple] = {}
+
+    def submit(self, element: Dict[str, Any], fn: Callable, *args, key: str = None):
+        if key is not None and key in self._by_key:
+            future, first = self._by_key[key]
+            element["cache"] = first.get("cache")
+            self._elements.append((element, future))
+            return
+        if len(self._in_flight) >= self._window:
+            _, self._in_flight = wait(self._in_flight, return_when=FIRST_COMPLETED)
+        future = self._pool.submit(fn, *args)
+        self._in_flight.add(future)
+        self._elements.append((element, future))
+        if key is not None:
+            self._by_key[key] = (future, element)
+
+    def add_result(self, element: Dict[str, Any], result: str):
+        """Queues an element whose description is already known (cache hit)."""
+        future = Future()
+        future.set_result(result)
+        self._elements.append((element, future))
+
+    def results(self, should_stop: Optional[Callable[[], bool]] = None):
+        """Yields (element, description); the description is None when the call failed."""
+        elements, self._elements = self._elements, []
+        stopped = False
+        for element, future in elements:
+            if not stopped and should_stop and should_stop():
+                # Calls already running finish; nothing new is started
+                stopped = True
+                for _, f in elements:
+                    f.cancel()
+            if future.cancelled():
+                continue
+            try:
+                yield element, future.result()
+            except Exception as e:
+                logger.warning(f"Erro {element['kind']} {element['index']} pag {element['page_num']}: {e}")
+                yield element, None
+        self._in_flight = set()
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+class UsageMeter:
+    """
+    Token usage of the vision/embedding calls made while ingesting, per model (thread-safe:
+    vision calls run on the VisionPool threads). `on_usage(model, usage)` sees every call.
+    """
+    def __init__(self, on_usage: Optional[Callable[[str, Dict[str, int]], None]] = None):
+        self.by_model: Dict[str, Dict[str, int]] = {}
+        self._on_usage = on_usage
+        self._lock = threading.Lock()
+
+    def add(self, model: str, usage: Dict[str, int]):
+        with self._lock:
+            totals = self.by_model.setdefault(model, {"prompt_tokens": 0, "completion_tokens": 0})
+            for key in totals:
+                totals[key] += usage.get(key, 0) or 0
+        if self._on_usage is not None:
+            self._on_usage(model, usage)
+
+
+class VectorBuffer:
+    """Collects (node_id, vector) pairs in memory; exposes the FaissIndex `upsert`/`upsert_many`/`save` interface."""
+    def __init__(self):
+        self.items: List[tuple] = []
+
+    def upsert(self, node_id: str, vector: np.ndarray):
+        self.items.append((node_id, vector))
+
+    def upsert_many(self, items: Iterable[Tuple[str, np.ndarray]]):
+        self.items.extend(items)
+
+    def save(self):
+        pass
+
+
+class GraphBuffer:
+    """
+    Collects nodes and edges in memory; exposes the KnowledgeGraph `add_node`/`add_edge`/`exists`
+    interface used while a document is read.
+    """
+    def __init__(self):
+        self.nodes: List[tuple] = []
+        self.edges: List[tuple] = []
+        self._known = set()
+
+    def add_node(self, node_id: str, node_type: str, **kwargs):
+        self.nodes.append((node_id, node_type, kwargs))
+        self._known.add(node_id)
+
+    def add_edge(self, source_id: str, target_id: str, edge_type: str, **kwargs):
+        self.edges.append((source_id, target_id, edge_type, kwargs))
+
+    def exists(self, node_id: str) -> bool:
+        return node_id in self._known
+
+
+def _decode_image(doc: fitz.Document, xref: int, width: int, height: int) -> Image.Image:
+    """
+    Decodes an embedded image at about the resolution the vision model gets (IMG_MAX_SIZE):
+    large JPEGs are decoded at a reduced DCT scale, other images are shrunk as pixmaps
+    before the RGB copy. Pixmaps are dropped as soon as their pixels are copied.
+    """
+    shrink = 0
+    while max(width, height) >> (shrink + 1) >= IMG_MAX_SIZE:
+        shrink += 1
+    if shrink:
+        info = doc.extract_image(xref)
+        if info and info.get("ext") in ("jpeg", "jpg") and not info.get("smask") and info.get("colorspace") in (1, 3):
+            img = Image.open(io.BytesIO(info["image"]))
+            img.draft("RGB", (width >> shrink, height >> shrink))
+            return StructuralExtractor._resize_if_needed(img.convert("RGB"))
+
+    pix = fitz.Pixmap(doc, xref)
+    if shrink:
+        pix.shrink(shrink)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.colorspace is None or pix.colorspace.n != 3:
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    del pix
+    return StructuralExtractor._resize_if_needed(img)
+
+
+def _clip_dpi(rect: fitz.Rect, dpi: int) -> int:
+    """Render resolution keeping the longest side of `rect` within IMG_MAX_SIZE pixels."""
+    longest = max(rect.width, rect.height, 1)
+    return max(1, min(dpi, int(72 * IMG_MAX_SIZE / longest)))
+
+
+def parse_page(doc: fitz.Document, page_index: int) -> Dict[str, Any]:
+    """
+    Everything ingestion needs from one page, as a picklable record: cleaned text, section
+    title candidate, images (RGB pixels ready for the vision model), tables and, for text-poor
+    pages without visuals, a page render. Images the local pre-filter finds decorative are only
+    listed in "skipped_images". Tables are parsed from the text layer first: a reliable parse
+    carries its own description, otherwise the table is rendered for the vision model.
+    """
+    page = doc[page_index]
+    text = clean_text(page.get_text())
+    record = {
+        "page_num": page_index + 1,
+        "text": text,
+        "section_title": detect_section_title(text),
+        "images": [],
+        "tables": [],
+        "skipped_images": [],
+        "page_image": None,
+    }
+
+    for img_idx, img_info in enumerate(page.get_images(full=True)):
+        try:
+            xref, width, height = img_info[0], img_info[2], img_info[3]
+            # Size from the image dictionary: small images are never decoded
+            if width < IMG_MIN_SIZE or height < IMG_MIN_SIZE:
+                continue
+            pil_img = _decode_image(doc, xref, width, height)
+            if settings.IMAGE_FILTER_ENABLED:
+                informative, reason, _ = classify_image(pil_img)
+                if not informative:
+                    record["skipped_images"].append({"index": img_idx, "reason": reason})
+                    continue
+            record["images"].append({"index": img_idx, "size": pil_img.size, "pixels": pil_img.tobytes()})
+        except Exception as e:
+            logger.warning(f"Erro imagem {img_idx} pag {page_index+1}: {e}")
+
+    try:
+        for tbl_idx, table in enumerate(page.find_tables()):
+            try:
+                parsed = parse_table(table)
+                entry = {
+                    "index": tbl_idx,
+                    "bbox": tuple(table.bbox),
+                    "raw_md": parsed["markdown"],
+                    "score": parsed["score"],
+                    "description": None,
+                }
+                if is_reliable(parsed):
+                    entry["description"] = describe_parsed_table(parsed)
+                else:
+                    clip = fitz.Rect(table.bbox)
+                    pix = page.get_pixmap(clip=clip, dpi=_clip_dpi(clip, 150))
+                    entry.update(size=(pix.width, pix.height), pixels=pix.samples)
+                    del pix
+                record["tables"].append(entry)
+            except Exception as e:
+                logger.warning(f"Erro na tabela {tbl_idx}: {e}")
+    except Exception:
+        pass
+
+    if len(text) < PAGE_FULL_VISION_THRESHOLD and not record["images"] and not record["tables"]:
+        try:
+            img = StructuralExtractor._render_page(page)
+            record["page_image"] = {"size": img.size, "pixels": img.tobytes()}
+        except Exception as e:
+            logger.warning(f"Erro ao renderizar pag {page_index+1}: {e}")
+    return record
+
+
+# fitz handle of the document parsed by this worker process (see PageParser)
+_worker_doc: Optional[fitz.Document] = None
+
+
+def _open_worker_doc(pdf_path: str):
+    global _worker_doc
+    _worker_doc = fitz.open(pdf_path)
+
+
+def _parse_worker_page(page_index: int) -> Dict[str, Any]:
+    return parse_page(_worker_doc, page_index)
+
+
+class PageParser:
+    """
+    Parsing front end of `ingest_pdf`: fans the pages out to worker processes (each with its
+    own fitz handle) and yields their `parse_page` records in page order, at most `window`
+    pages ahead of the consumer. With one process, or a single page, pages are parsed inline.
+    Parse processes come from `process_context` (never forked from the threaded parent) and
+    open the PDF themselves.
+    """
+    def __init__(self, pdf_path: Path, doc: fitz.Document, processes: int = None, window: int = None):
+        self.pdf_path = pdf_path
+        self.doc = doc
+        self.processes = max(1, min(processes or settings.PARSE_PROCESSES, doc.page_count))
+        self.window = window or self.processes * 2
+
+    def pages(self):
+        if self.processes <= 1:
+            for page_index in range(self.doc.page_count):
+                yield parse_page(self.doc, page_index)
+            return
+
+        pool = ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=process_context(),
+            initializer=_open_worker_doc, initargs=(str(self.pdf_path),),
+        )
+        try:
+            pending = deque()
+            next_page = 0
+            while next_page < self.doc.page_count or pending:
+                while next_page < self.doc.page_count and len(pending) < self.window:
+                    pending.append(pool.submit(_parse_worker_page, next_page))
+                    next_page += 1
+                yield pending.popleft().result()
+        finally:
+            # Also reached when the consumer stops early (cancelled job)
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _record_image(record: Dict[str, Any]) -> Image.Image:
+    return Image.frombytes("RGB", record["size"], record["pixels"])
+
+
 class StructuralExtractor:
     """
     Extrator Multimodal e Estrutural baseado na biblioteca PyMuPDF.
     Migrado de embedding_multimodal/embedding.py.
     """
-    def __init__(self, openai_client):
+    def __init__(self, openai_client, collection=None, faiss_index=None):
         self.client = openai_client
-        self.chroma_client = chromadb.PersistentClient(path=str(settings.CHROMA_PATH))
-        self.collection = self.chroma_client.get_or_create_collection(
-            name=settings.COLLECTION_NAME,
-            metadata={"hnsw:space": "cosine"},
-        )
-        if FaissIndex.exists():
+        max_batch_size = None
+        # Worker mode: records are buffered and merged by the parent process
+        self.worker_mode = collection is not None
+        if collection is not None:
+            self.collection = collection
+        else:
+            self.chroma_client = chromadb.PersistentClient(path=str(settings.CHROMA_PATH))
+            self.collection = self.chroma_client.get_or_create_collection(
+                name=settings.COLLECTION_NAME,
+                metadata={"hnsw:space": "cosine"},
+            )
+            try:
+                max_batch_size = self.chroma_client.get_max_batch_size()
+            except Exception:
+                pass
+        self.chroma_writer = ChromaBatchWriter(self.collection, max_batch_size=max_batch_size)
+        if faiss_index is not None:
+            self.faiss_index = faiss_index
+        elif FaissIndex.exists():
             self.faiss_index = FaissIndex.load()
         else:
             self.faiss_index = FaissIndex()
+        # Writes to the shared stores are serialized between the jobs of this process; the
+        # worker fleet sets `shared_lock` (see RedisJobQueue.store_lock) to extend it across hosts
+        self.shared_lock: Optional[Callable[[], Any]] = None
+        self._store_lock = threading.RLock()
+        self._store_depth = 0
+        # Meter of the document being read (each document is read by its own buffered extractor, see iter_pdf)
+        self._usage: Optional[UsageMeter] = None
+
+    @contextmanager
+    def exclusive_stores(self, kg):
+        """
+        Held while buffered records are merged into the Faiss index, the structural graph and
+        Chroma (never while a document is read or its chunks are consumed).
+        Under a `shared_lock` other processes write the same files: the index and the graph
+        manifest are reloaded on entry, and every writer saves both before leaving, so no
+        process overwrites vectors or shards it has not seen.
+        """
+        with self._store_lock:
+            self._store_depth += 1
+            try:
+                if self._store_depth > 1 or self.shared_lock is None or self.worker_mode:
+                    yield
+                    return
+                with self.shared_lock():
+                    if FaissIndex.exists():
+                        removed = self.faiss_index.removed
+                        self.faiss_index = FaissIndex.load()
+                        # Removals of this process are still pending their orphan check
+                        self.faiss_index.removed = removed
+                    kg.refresh(settings.STORAGE_DIR)
+                    yield
+            finally:
+                self._store_depth -= 1
+
+    @contextmanager
+    def _metered(self, usage: Optional[UsageMeter]):
+        previous, self._usage = self._usage, usage
+        try:
+            yield
+        finally:
+            self._usage = previous
+
+    def _charge(self, model: str, resp):
+        """Reports the token usage of an ingestion call to the meter of the current document."""
+        usage = getattr(resp, "usage", None)
+        if usage is not None and self._usage is not None:
+            self._usage.add(model, {
+                "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+                "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            })
 
     def chroma_upsert(self, node_id: str, text: str, metadata: dict):
-        self.collection.upsert(
-            ids=[node_id],
-            documents=[text],
-            metadatas=[metadata],
-        )
+        """Queues a record; written by the batch writer (flushed at the latest when the document ends)."""
+        self.chroma_writer.add(node_id, text, metadata)
 
     def embed_texts_batch(self, texts: List[str]) -> List[np.ndarray]:
+        texts = [t[:8000] for t in texts]
+        return embedding_cache.get_or_compute(EMBEDDING_MODEL, texts, self._request_embeddings, caller="ingest")
+
+    def _request_embeddings(self, texts: List[str]) -> List[np.ndarray]:
+        """One request per pack of up to EMBEDDING_BATCH_MAX_INPUTS texts / EMBEDDING_BATCH_MAX_TOKENS tokens."""
         vectors = []
-        batch_size = 50
-        for i in range(0, len(texts), batch_size):
-            batch = [t[:8000] for t in texts[i : i + batch_size]]
-            resp = self.client.embeddings.create(model="text-embedding-3-small", input=batch)
-            vectors.extend([np.array(d.embedding, dtype=np.float32) for d in resp.data])
+        batch: List[str] = []
+        batch_tokens = 0
+        for text in texts:
+            tokens = len(text) // EMBEDDING_CHARS_PER_TOKEN + 1
+            if batch and (len(batch) >= settings.EMBEDDING_BATCH_MAX_INPUTS
+                          or batch_tokens + tokens > settings.EMBEDDING_BATCH_MAX_TOKENS):
+                vectors.extend(self._request_embedding_batch(batch))
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            vectors.extend(self._request_embedding_batch(batch))
         return vectors
 
+    @retry_with_exponential_backoff()
+    def _request_embedding_batch(self, batch: List[str]) -> List[np.ndarray]:
+        resp = metrics.track_llm_call("embedding", EMBEDDING_MODEL, self.client.embeddings.create, input=batch)
+        self._charge(EMBEDDING_MODEL, resp)
+        return [np.array(d.embedding, dtype=np.float32) for d in resp.data]
+
     @retry_with_exponential_backoff()
     def embed_text(self, text: str) -> np.ndarray:
-        resp = self.client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text[:8000],
-        )
-        return np.array(resp.data[0].embedding, dtype=np.float32)
+        def request(texts: List[str]) -> List[np.ndarray]:
+            resp = metrics.track_llm_call("embedding", EMBEDDING_MODEL, self.client.embeddings.create, input=texts[0])
+            self._charge(EMBEDDING_MODEL, resp)
+            return [np.array(resp.data[0].embedding, dtype=np.float32)]
+
+        return embedding_cache.get_or_compute(EMBEDDING_MODEL, [text[:8000]], request, caller="ingest")[0]
 
     def _enrich_metadata(self, text: str, base_meta: dict) -> dict:
         import re
@@ -110,7 +646,8 @@ class StructuralExtractor:
         img.save(buf, format=fmt)
         return base64.b64encode(buf.getvalue()).decode("utf-8")
 
-    def _resize_if_needed(self, img: Image.Image, max_size: int = IMG_MAX_SIZE) -> Image.Image:
+    @staticmethod
+    def _resize_if_needed(img: Image.Image, max_size: int = IMG_MAX_SIZE) -> Image.Image:
         if img.width > max_size or img.height > max_size:
             img = img.copy()
             img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
@@ -132,8 +669,8 @@ class StructuralExtractor:
                 "Transcreva os dados principais de forma estruturada. Responda em português."
             )
 
-        resp = self.client.chat.completions.create(
-            model=settings.OPENAI_MODEL,
+        resp = metrics.track_llm_call(
+            f"vision_{element_type}", settings.OPENAI_MODEL, self.client.chat.completions.create,
             messages=[{
                 "role": "user",
                 "content": [
@@ -145,14 +682,23 @@ class StructuralExtractor:
             }],
             max_tokens=1024,
         )
+        self._charge(settings.OPENAI_MODEL, resp)
         return resp.choices[0].message.content
 
-    @retry_with_exponential_backoff()
-    def describe_page_full(self, page: fitz.Page, filename: str, page_num: int) -> str:
-        pix = page.get_pixmap(dpi=PAGE_RENDER_DPI)
+    @staticmethod
+    def _render_page(page: fitz.Page) -> Image.Image:
+        # PyMuPDF is not thread-safe: pages are rendered by the parsing thread (or process) only.
+        # Rendered straight at the final size instead of downscaling a PAGE_RENDER_DPI render
+        pix = page.get_pixmap(dpi=_clip_dpi(page.rect, PAGE_RENDER_DPI))
         img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        img = self._resize_if_needed(img, max_size=IMG_MAX_SIZE)
+        del pix
+        return StructuralExtractor._resize_if_needed(img, max_size=IMG_MAX_SIZE)
+
+    def describe_page_full(self, page: fitz.Page, filename: str, page_num: int) -> str:
+        return self.describe_page_image(self._render_page(page), filename, page_num)
 
+    @retry_with_exponential_backoff()
+    def describe_page_image(self, img: Image.Image, filename: str, page_num: int) -> str:
         prompt = (
             f"Esta é a página {page_num} do documento '{filename}'. "
             "Descreva completamente todo o conteúdo visual desta página para um sistema de busca: "
@@ -162,8 +708,8 @@ class StructuralExtractor:
             "Responda em português, de forma objetiva e detalhada."
         )
 
-        resp = self.client.chat.completions.create(
-            model=settings.OPENAI_MODEL,
+        resp = metrics.track_llm_call(
+            "vision_page", settings.OPENAI_MODEL, self.client.chat.completions.create,
             messages=[{
                 "role": "user",
                 "content": [
@@ -175,38 +721,275 @@ class StructuralExtractor:
             }],
             max_tokens=2048,
         )
+        self._charge(settings.OPENAI_MODEL, resp)
         return resp.choices[0].message.content
 
-    def ingest_pdf(self, pdf_path: Path, kg) -> List[Dict[str, Any]]:
+    def ingest_pdf(
+        self,
+        pdf_path: Path,
+        kg,
+        on_chunks: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        parse_processes: Optional[int] = None,
+        flush_pages: Optional[int] = None,
+        force: bool = False,
+        usage: Optional[UsageMeter] = None,
+    ) -> List[Dict[str, Any]]:
         """
         Processa o PDF extraindo as estruturas e retorna uma lista de dicionarios dos chunks
         no formato que o orchestrator (OntologyBuilder) espera.
+        Se `on_chunks` for informado, os chunks de cada página são entregues assim que
+        a página é lida (modo streaming do orchestrator). Ver `iter_pdf` para o restante
+        (cancelamento, processos de leitura, gravações parciais e reingestão idempotente).
+        O consumo de tokens das chamadas de visão e embeddings é somado em `usage`.
+        """
+        all_returned_chunks = []
+        with closing(self.iter_pdf(pdf_path, kg, should_stop, parse_processes, flush_pages, force, usage)) as stream:
+            for page_chunks in stream:
+                all_returned_chunks.extend(page_chunks)
+                if on_chunks:
+                    on_chunks(page_chunks)
+        logger.info(f"Structural Pipeline completed for {pdf_path.name}. Returning {len(all_returned_chunks)} chunks.")
+        return all_returned_chunks
+
+    def iter_pdf(
+        self,
+        pdf_path: Path,
+        kg,
+        should_stop: Optional[Callable[[], bool]] = None,
+        parse_processes: Optional[int] = None,
+        flush_pages: Optional[int] = None,
+        force: bool = False,
+        usage: Optional[UsageMeter] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Streaming ingest: yields the chunks of each page as soon as the page is read and keeps
+        none of them. Pages are parsed by `parse_processes` processes (PageParser); if
+        `should_stop` returns True (job cancelled) ingestion stops before the next page.
+        Every `flush_pages` pages (INGEST_FLUSH_PAGES) the visual elements queued so far are
+        attached and the window's embeddings, Chroma records and graph nodes are merged into
+        the shared stores, so a crash loses at most one window. Only those merges hold the
+        store lock (`exclusive_stores`); reading, API calls and the consumer run outside it.
+        Documents are fingerprinted by content: unchanged bytes already fully ingested are not
+        read again (their stored chunks are yielded), changed ones replace the previous records
+        of the document. `force` re-ingests regardless. Vision/embedding calls are metered
+        into `usage`.
         """
         filename = pdf_path.name
         doc_id = make_doc_id(filename)
-        all_returned_chunks = []
-        
-        self.chroma_upsert(doc_id, filename, self._enrich_metadata(filename, {
+        content_hash = hash_file(pdf_path)
+        if self.worker_mode:
+            # Everything goes to this extractor's buffers; the parent process merges them
+            with self._metered(usage):
+                yield from self._read_document(pdf_path, doc_id, content_hash, kg, should_stop, parse_processes, flush_pages)
+            return
+
+        if not force:
+            with self.exclusive_stores(kg):
+                stored = self.ingested_chunks(pdf_path, kg, content_hash)
+            if stored is not None:
+                logger.info(f"{filename} unchanged since its last ingestion: reusing {len(stored)} stored chunks")
+                for _, page_chunks in groupby(stored, key=lambda c: c["metadata"]["page_num"]):
+                    yield list(page_chunks)
+                return
+
+        # The document is read into buffers of its own; each flush window is merged into the
+        # shared stores under the store lock, so other documents (jobs, workers) read meanwhile
+        records, vectors, graph = ChromaRecordBuffer(), VectorBuffer(), GraphBuffer()
+        reader = StructuralExtractor(self.client, collection=records, faiss_index=vectors)
+        merges = {"count": 0}
+
+        def _merge_window():
+            window = (records.records, vectors.items, graph.nodes, graph.edges)
+            records.records, vectors.items, graph.nodes, graph.edges = [], [], [], []
+            if merges["count"] and not any(window):
+                return
+            # The first merge replaces the previous ingestion of the document
+            self._merge_buffered(doc_id, *window, kg, purge=merges["count"] == 0)
+            merges["count"] += 1
+
+        try:
+            with reader._metered(usage):
+                yield from reader._read_document(
+                    pdf_path, doc_id, content_hash, graph, should_stop, parse_processes, flush_pages, on_window=_merge_window,
+                )
+        finally:
+            # Also when the consumer closes the stream early: what was read is written out,
+            # only without the completion marker
+            _merge_window()
+
+    def _read_document(
+        self,
+        pdf_path: Path,
+        doc_id: str,
+        content_hash: str,
+        kg,
+        should_stop: Optional[Callable[[], bool]],
+        parse_processes: Optional[int],
+        flush_pages: Optional[int],
+        on_window: Optional[Callable[[], None]] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Reads a document into this extractor's (buffered) stores and yields the chunks of each
+        page; `on_window` runs after every flush window. The completion marker (the document
+        record with its `content_sha256`) is the last record, written only when the document
+        was read to the end.
+        """
+        filename = pdf_path.name
+        doc_meta = {
             "node_type": NodeType["DOCUMENT"],
             "doc_id": doc_id,
             "filename": filename,
             "label": filename,
-        }))
+        }
+        self.chroma_upsert(doc_id, filename, self._enrich_metadata(filename, dict(doc_meta)))
         kg.add_node(doc_id, NodeType["DOCUMENT"], label=filename)
-        
+
         try:
             doc = fitz.open(pdf_path)
         except Exception as e:
             logger.error(f"Failed to open PDF {pdf_path}: {e}")
-            return []
+            self.chroma_writer.flush()
+            return
+
+        if flush_pages is None:
+            flush_pages = settings.INGEST_FLUSH_PAGES
+        try:
+            pages = PageParser(pdf_path, doc, parse_processes).pages()
+            vision = VisionPool()
+            embeddings = EmbeddingBatcher(self.embed_texts_batch, self.faiss_index)
+            try:
+                yield from self._ingest_pages(doc, pages, doc_id, filename, kg, vision, embeddings, should_stop, flush_pages, on_window)
+            finally:
+                pages.close()
+                vision.close()
+                embeddings.flush()
+                self.chroma_writer.flush()
+        finally:
+            # Also on errors and when the consumer closes the stream early; parsing is over
+            doc.close()
+
+        # Completion marker: only a document ingested to the end is skipped next time
+        if not (should_stop and should_stop()):
+            doc_meta["content_sha256"] = content_hash
+            self.chroma_upsert(doc_id, filename, self._enrich_metadata(filename, doc_meta))
+            self.chroma_writer.flush()
+
+    @staticmethod
+    def page_count(pdf_path: Path) -> int:
+        """Pages of a PDF (0 if it cannot be opened); only the page tree is read."""
+        try:
+            with fitz.open(pdf_path) as doc:
+                return doc.page_count
+        except Exception:
+            return 0
+
+    def ingested_chunks(self, pdf_path: Path, kg, content_hash: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Chunks of a document already fully ingested from the same bytes (rebuilt from its
+        Chroma records, in document order), or None if it has to be ingested.
+        """
+        if self.worker_mode:
+            return None
+        doc_id = make_doc_id(pdf_path.name)
+        content_hash = content_hash or hash_file(pdf_path)
+        self.chroma_writer.flush()
+        try:
+            found = self.collection.get(ids=[doc_id], include=["metadatas"])
+            if not found["ids"] or found["metadatas"][0].get("content_sha256") != content_hash:
+                return None
+            if doc_id not in kg.document_ids():
+                return None
+            records = self.collection.get(
+                where={"$and": [{"doc_id": doc_id}, {"node_type": NodeType["CHUNK"]}]},
+                include=["documents", "metadatas"],
+            )
+        except Exception as e:
+            logger.warning(f"Could not check previous ingestion of {pdf_path.name}: {e}")
+            return None
+
+        rows = sorted(
+            zip(records["ids"], records["documents"], records["metadatas"]),
+            key=lambda r: (int(r[2]["page_num"]), int(r[2]["chunk_index"])),
+        )
+        return [
+            {
+                "id": chunk_id,
+                "index": i,
+                "text": text,
+                "tokens": len(text.split()),
+                "metadata": {"doc_id": doc_id, "page_num": meta["page_num"]},
+                "type": "text",
+            }
+            for i, (chunk_id, text, meta) in enumerate(rows)
+        ]
+
+    def _purge_document(self, doc_id: str, kg):
+        """Drops the Chroma records, Faiss vectors and graph nodes of a previous ingestion of the document."""
+        self.chroma_writer.flush()
+        try:
+            self.collection.delete(where={"doc_id": doc_id})
+        except Exception as e:
+            logger.warning(f"Could not delete Chroma records of {doc_id}: {e}")
+        removed = self.faiss_index.remove_by_doc(doc_id)
+        kg.remove_document(doc_id)
+        if removed:
+            logger.info(f"Replaced previous ingestion of {doc_id}: {removed} vectors removed")
+
+    def compact_vectors(self, kg) -> int:
+        """
+        Orphan check of the Faiss index after documents were replaced: vectors of nodes no
+        longer in Chroma are dropped (see `FaissIndex.compact`). No-op if nothing was removed
+        since the last check.
+        """
+        if self.worker_mode or not self.faiss_index.removed:
+            return 0
+        with self.exclusive_stores(kg):
+            self.chroma_writer.flush()
+            try:
+                live_ids = self.collection.get(include=[])["ids"]
+            except Exception as e:
+                logger.warning(f"Could not list Chroma ids, compacting without orphan check: {e}")
+                live_ids = None
+            dropped = self.faiss_index.compact(live_ids)
+            self.faiss_index.save()
+        logger.info(f"Faiss orphan check: {len(self.faiss_index.id_map)} vectors, {dropped} orphans dropped")
+        return dropped
 
+    def _ingest_pages(
+        self,
+        doc: fitz.Document,
+        pages,
+        doc_id: str,
+        filename: str,
+        kg,
+        vision: VisionPool,
+        embeddings: EmbeddingBatcher,
+        should_stop: Optional[Callable[[], bool]],
+        flush_pages: int,
+        on_window: Optional[Callable[[], None]] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Page loop of `iter_pdf`: turns the page records of `pages` (PageParser, page order)
+        into graph nodes, Chroma records and embeddings, and yields the chunks of each page.
+        Images, tables and text-poor pages are queued on `vision` and attached in document
+        order at the end of each flush window, then `on_window` runs.
+        """
         current_section_id: Optional[str] = None
         current_section_title: Optional[str] = None
 
         total_chunk_count = 0
+        # Decorative images skipped by the pre-filter, by reason
+        skipped_images: Dict[str, int] = {}
+        # Text-poor pages whose visual elements may all fail (then described as a whole page)
+        sparse_pages = set()
+        window_pages = 0
 
-        for page_num in range(doc.page_count):
-            page = doc[page_num]
+        for record in pages:
+            page_num = record["page_num"] - 1
+            if should_stop and should_stop():
+                logger.info(f"Ingestion of {filename} stopped at page {page_num + 1} (job cancelled)")
+                break
             page_id = make_page_id(doc_id, page_num + 1)
             page_label = f"Página {page_num + 1} — {filename}"
 
@@ -219,9 +1002,8 @@ class StructuralExtractor:
             kg.add_node(page_id, NodeType["PAGE"], label=page_label)
             kg.add_edge(doc_id, page_id, EdgeType["CONTAINS"])
 
-            raw_text = page.get_text()
-            cleaned_text = clean_text(raw_text)
-            section_title = detect_section_title(cleaned_text)
+            cleaned_text = record["text"]
+            section_title = record["section_title"]
 
             if section_title and section_title != current_section_title:
                 current_section_title = section_title
@@ -242,6 +1024,7 @@ class StructuralExtractor:
                 kg.add_edge(section_id, page_id, EdgeType["CONTAINS"])
 
             # Chunks
+            page_chunks: List[Dict[str, Any]] = []
             chunks = split_into_chunks(cleaned_text, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_MIN_LENGTH)
             prev_chunk_id: Optional[str] = None
             chunk_ids_texts: List[tuple[str, str]] = []
@@ -265,9 +1048,10 @@ class StructuralExtractor:
                 prev_chunk_id = chunk_id
 
                 chunk_ids_texts.append((chunk_id, chunk_text))
+                embeddings.add(chunk_id, chunk_text)
                 
                 # Format required by the semantic part of the pipeline:
-                all_returned_chunks.append({
+                page_chunks.append({
                     "id": chunk_id,
                     "index": total_chunk_count,
                     "text": chunk_text,
@@ -277,133 +1061,266 @@ class StructuralExtractor:
                 })
                 total_chunk_count += 1
 
-            if chunk_ids_texts:
+            for skipped in record["skipped_images"]:
+                skipped_images[skipped["reason"]] = skipped_images.get(skipped["reason"], 0) + 1
+                metrics.inc("vision_images_skipped_total", reason=skipped["reason"])
+
+            # Visual elements: rendered by the parser, described concurrently, attached after the page loop
+            anchor = chunk_ids_texts[0][0] if chunk_ids_texts else None
+            for image in record["images"]:
                 try:
-                    vectors = self.embed_texts_batch([t for _, t in chunk_ids_texts])
-                    for (cid, _), vec in zip(chunk_ids_texts, vectors):
-                        self.faiss_index.add(cid, vec)
+                    img_idx = image["index"]
+                    self._queue_visual(vision, _record_image(image), {
+                        "kind": "image",
+                        "index": img_idx,
+                        "node_id": make_image_id(page_id, img_idx),
+                        "page_id": page_id,
+                        "page_num": page_num + 1,
+                        "anchor": anchor,
+                        "label": f"Figura {img_idx+1} · Pág {page_num+1} · {filename}",
+                        "size": image["size"],
+                    })
                 except Exception as e:
-                    logger.error(f"Erro embedding chunks pág {page_num+1}: {e}")
+                    logger.warning(f"Erro imagem {image['index']} pag {page_num+1}: {e}")
 
-            # Images
-            n_images = 0
-            img_list = page.get_images(full=True)
-            for img_idx, img_info in enumerate(img_list):
+            for table in record["tables"]:
                 try:
-                    xref = img_info[0]
-                    pix = fitz.Pixmap(doc, xref)
-                    if pix.n > 4:
-                        pix = fitz.Pixmap(fitz.csRGB, pix)
-                    if pix.width < IMG_MIN_SIZE or pix.height < IMG_MIN_SIZE:
-                        continue
-
-                    pil_img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    pil_img = self._resize_if_needed(pil_img)
-                    img_id = make_image_id(page_id, img_idx)
-                    desc = self.describe_visual(pil_img, "image")
-                    img_label = f"Figura {img_idx+1} · Pág {page_num+1} · {filename}"
-
-                    self.chroma_upsert(img_id, desc, self._enrich_metadata(desc, {
-                        "node_type": NodeType["IMAGE"],
-                        "doc_id": doc_id,
-                        "page_num": str(page_num + 1),
-                        "image_index": str(img_idx),
-                        "img_width": str(pil_img.width),
-                        "img_height": str(pil_img.height),
-                        "label": img_label,
-                        "preview": truncate(desc, 120),
-                    }))
-                    kg.add_node(img_id, NodeType["IMAGE"], label=img_label)
-                    kg.add_edge(page_id, img_id, EdgeType["CONTAINS"])
-                    
-                    if chunk_ids_texts:
-                        kg.add_edge(chunk_ids_texts[0][0], img_id, EdgeType["SIMILAR_TO"])
-
-                    try:
-                        vec = self.embed_text(desc)
-                        self.faiss_index.add(img_id, vec)
-                    except Exception as e:
-                        logger.warning(f"Embedding imagem {img_id}: {e}")
-                        
-                    n_images += 1
+                    tbl_idx = table["index"]
+                    element = {
+                        "kind": "table",
+                        "index": tbl_idx,
+                        "node_id": make_table_id(page_id, tbl_idx),
+                        "page_id": page_id,
+                        "page_num": page_num + 1,
+                        "anchor": anchor,
+                        "label": f"Tabela {tbl_idx+1} · Pág {page_num+1} · {filename}",
+                        "raw_md": table["raw_md"],
+                    }
+                    # Text-layer parse first; the vision model only reads low-confidence tables
+                    if table["description"] is not None:
+                        vision.add_result(element, table["description"])
+                        metrics.inc("table_extractions_total", method="text")
+                    else:
+                        self._queue_visual(vision, _record_image(table), element)
+                        metrics.inc("table_extractions_total", method="vision")
                 except Exception as e:
-                    logger.warning(f"Erro imagem {img_idx} pag {page_num+1}: {e}")
-            
-            # Tables
-            n_tables = 0
-            try:
-                tables = page.find_tables()
-                for tbl_idx, table in enumerate(tables):
-                    try:
-                        clip = fitz.Rect(table.bbox)
-                        pix = page.get_pixmap(clip=clip, dpi=150)
-                        pil_img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-
-                        table_id = make_table_id(page_id, tbl_idx)
-                        desc = self.describe_visual(pil_img, "table")
-                        table_label = f"Tabela {tbl_idx+1} · Pág {page_num+1} · {filename}"
-
-                        try:
-                            df = table.to_pandas()
-                            raw_md = df.to_markdown(index=False)
-                            full_desc = f"{desc}\n\nDados brutos:\n{raw_md}"
-                        except Exception:
-                            full_desc = desc
-
-                        self.chroma_upsert(table_id, full_desc, self._enrich_metadata(full_desc, {
-                            "node_type": NodeType["TABLE"],
-                            "doc_id": doc_id,
-                            "page_num": str(page_num + 1),
-                            "table_index": str(tbl_idx),
-                            "label": table_label,
-                            "preview": truncate(desc, 120),
-                        }))
-                        kg.add_node(table_id, NodeType["TABLE"], label=table_label)
-                        kg.add_edge(page_id, table_id, EdgeType["CONTAINS"])
-                        
-                        if chunk_ids_texts:
-                            kg.add_edge(chunk_ids_texts[0][0], table_id, EdgeType["SIMILAR_TO"])
-
-                        try:
-                            vec = self.embed_text(full_desc)
-                            self.faiss_index.add(table_id, vec)
-                        except Exception as e:
-                            logger.warning(f"Embedding tabela {table_id}: {e}")
-                            
-                        n_tables += 1
-                    except Exception as e:
-                        logger.warning(f"Erro na tabela {tbl_idx}: {e}")
-            except Exception as e:
-                pass
-            
-            # Fallback
-            if len(cleaned_text) < PAGE_FULL_VISION_THRESHOLD and n_images == 0 and n_tables == 0:
+                    logger.warning(f"Erro na tabela {table['index']}: {e}")
+
+            # Fallback (also applied after the descriptions if every visual element of the page failed)
+            if record["page_image"] is not None:
+                self._submit_page_vision(vision, _record_image(record["page_image"]), page_id, page_num + 1, filename)
+            elif len(cleaned_text) < PAGE_FULL_VISION_THRESHOLD and (record["images"] or record["tables"]):
+                sparse_pages.add(page_num + 1)
+
+            # Free the page's pixels before the consumer (and the next page) runs
+            record = None
+            if page_chunks:
+                yield page_chunks
+
+            window_pages += 1
+            if flush_pages and window_pages >= flush_pages:
+                self._attach_visuals(doc, vision, embeddings, sparse_pages, doc_id, filename, kg, should_stop)
+                sparse_pages = set()
+                window_pages = 0
+                self._flush_window(embeddings)
+                if on_window is not None:
+                    on_window()
+                logger.info(f"Ingestion of {filename}: flushed through page {page_num + 1}")
+
+        if skipped_images:
+            logger.info(f"Pre-filter skipped {sum(skipped_images.values())} decorative images in {filename}: {skipped_images}")
+
+        self._attach_visuals(doc, vision, embeddings, sparse_pages, doc_id, filename, kg, should_stop)
+
+    def _attach_visuals(
+        self,
+        doc: fitz.Document,
+        vision: VisionPool,
+        embeddings: EmbeddingBatcher,
+        sparse_pages: set,
+        doc_id: str,
+        filename: str,
+        kg,
+        should_stop: Optional[Callable[[], bool]],
+    ):
+        """
+        Waits for the descriptions queued on `vision` and attaches them in document order;
+        text-poor pages whose visual elements all failed are then described as whole pages.
+        """
+        described_pages = set()
+        for element, desc in vision.results(should_stop):
+            if desc is not None:
+                self._attach_visual(element, desc, doc_id, kg, embeddings)
+                described_pages.add(element["page_num"])
+
+        retry_pages = sorted(sparse_pages - described_pages)
+        if retry_pages and not (should_stop and should_stop()):
+            for num in retry_pages:
                 try:
-                    full_desc = self.describe_page_full(page, filename, page_num + 1)
-                    fullpg_id = make_image_id(page_id, 9999) 
-                    full_label = f"Visão Completa Pág {page_num+1} · {filename}"
+                    img = self._render_page(doc[num - 1])
+                except Exception as e:
+                    logger.warning(f"Erro ao renderizar pag {num}: {e}")
+                    continue
+                self._submit_page_vision(vision, img, make_page_id(doc_id, num), num, filename)
+            for element, desc in vision.results(should_stop):
+                if desc is not None:
+                    self._attach_visual(element, desc, doc_id, kg, embeddings)
 
-                    self.chroma_upsert(fullpg_id, full_desc, self._enrich_metadata(full_desc, {
-                        "node_type": NodeType["IMAGE"],
-                        "doc_id": doc_id,
-                        "page_num": str(page_num + 1),
-                        "image_index": "full_page",
-                        "label": full_label,
-                        "preview": truncate(full_desc, 120),
-                        "is_full_page": "true",
-                    }))
-                    kg.add_node(fullpg_id, NodeType["IMAGE"], label=full_label)
-                    kg.add_edge(page_id, fullpg_id, EdgeType["CONTAINS"])
-
-                    try:
-                        vec = self.embed_text(full_desc)
-                        self.faiss_index.add(fullpg_id, vec)
-                    except Exception:
-                        pass
-                except Exception:
-                    pass
-
-        self.faiss_index.save()
-        doc.close()
-        logger.info(f"Structural Pipeline completed for {filename}. Returning {len(all_returned_chunks)} chunks.")
-        return all_returned_chunks
+    def _flush_window(self, embeddings: EmbeddingBatcher):
+        """Embeds the texts of the window and hands its Chroma records to the (buffered) collection."""
+        embeddings.flush()
+        self.chroma_writer.flush()
+
+    def _queue_visual(self, vision: "VisionPool", img: Image.Image, element: Dict[str, Any]):
+        """Reuses a cached description of identical pixels, otherwise queues a vision call."""
+        element["cache"] = image_cache.lookup(img, element["kind"], settings.OPENAI_MODEL)
+        if element["cache"]["description"] is not None:
+            vision.add_result(element, element["cache"]["description"])
+        else:
+            key = f"{element['kind']}:{element['cache']['pixel_hash']}"
+            vision.submit(element, self.describe_visual, img, element["kind"], key=key)
+
+    def _submit_page_vision(self, vision: "VisionPool", img: Image.Image, page_id: str, page_num: int, filename: str):
+        vision.submit({
+            "kind": "page",
+            "index": "full_page",
+            "node_id": make_image_id(page_id, 9999),
+            "page_id": page_id,
+            "page_num": page_num,
+            "anchor": None,
+            "label": f"Visão Completa Pág {page_num} · {filename}",
+        }, self.describe_page_image, img, filename, page_num)
+
+    def _attach_visual(self, element: Dict[str, Any], desc: str, doc_id: str, kg, embeddings: EmbeddingBatcher):
+        """Writes a described image/table/page to Chroma and the structural graph, and queues its embedding."""
+        kind = element["kind"]
+        meta = {
+            "node_type": NodeType["TABLE"] if kind == "table" else NodeType["IMAGE"],
+            "doc_id": doc_id,
+            "page_num": str(element["page_num"]),
+            "label": element["label"],
+            "preview": truncate(desc, 120),
+        }
+        text = desc
+        if kind == "image":
+            meta["image_index"] = str(element["index"])
+            meta["img_width"] = str(element["size"][0])
+            meta["img_height"] = str(element["size"][1])
+        elif kind == "table":
+            meta["table_index"] = str(element["index"])
+            if element["raw_md"] is not None:
+                text = f"{desc}\n\nDados brutos:\n{element['raw_md']}"
+        else:
+            meta["image_index"] = "full_page"
+            meta["is_full_page"] = "true"
+
+        node_id = element["node_id"]
+        self.chroma_upsert(node_id, text, self._enrich_metadata(text, meta))
+        kg.add_node(node_id, meta["node_type"], label=element["label"])
+        kg.add_edge(element["page_id"], node_id, EdgeType["CONTAINS"])
+        if element["anchor"]:
+            kg.add_edge(element["anchor"], node_id, EdgeType["SIMILAR_TO"])
+
+        cached = element.get("cache")
+        vec = image_cache.embedding_for(cached, text) if cached else None
+        if vec is not None:
+            self.faiss_index.upsert(node_id, vec)
+            return
+        on_vector = None
+        if cached and cached["description"] is None:
+            # Stored once the embedding is back; duplicates attached later reuse the entry
+            on_vector = lambda v: image_cache.store(
+                cached, kind, settings.OPENAI_MODEL, desc, embedding=v, embedding_text=text if v is not None else None
+            )
+        embeddings.add(node_id, text, on_vector)
+
+    def merge_fragment(self, fragment: Dict[str, Any], kg) -> List[Dict[str, Any]]:
+        """
+        Merges a document fragment produced by `ingest_pdf_fragment` into the shared
+        Chroma collection, Faiss index and structural graph. Callers merge fragments
+        in document order so the resulting state is deterministic.
+        """
+        doc_id = make_doc_id(fragment["filename"])
+        # Workers cannot see the shared stores: a changed document's old records go here
+        self._merge_buffered(doc_id, fragment["records"], fragment["vectors"], fragment["nodes"], fragment["edges"], kg, purge=True)
+        logger.info(
+            f"Merged fragment {fragment['filename']}: {len(fragment['nodes'])} nodes, "
+            f"{len(fragment['vectors'])} vectors, {len(fragment['records'])} Chroma records."
+        )
+        return fragment["chunks"]
+
+    def _merge_buffered(
+        self,
+        doc_id: str,
+        records: List[tuple],
+        vectors: List[tuple],
+        nodes: List[tuple],
+        edges: List[tuple],
+        kg,
+        purge: bool = False,
+    ):
+        """
+        Writes buffered Chroma records, vectors and graph nodes/edges of a document to the
+        shared stores under the store lock (`purge` first drops its previous ingestion).
+        The index and graph are saved before the completion marker is written, so a crash
+        never leaves a document recorded as done with its tail missing.
+        """
+        is_marker = lambda r: r[0] == doc_id and "content_sha256" in r[2]
+        marker = [r for r in records if is_marker(r)]
+        with self.exclusive_stores(kg):
+            if purge:
+                self._purge_document(doc_id, kg)
+            self.chroma_writer.extend([r for r in records if not is_marker(r)])
+            self.faiss_index.upsert_many(vectors)
+            for node_id, node_type, attrs in nodes:
+                kg.add_node(node_id, node_type, **attrs)
+            for src, tgt, edge_type, attrs in edges:
+                kg.add_edge(src, tgt, edge_type, **attrs)
+
+            self.faiss_index.save()
+            kg.save(settings.STORAGE_DIR)
+            if marker:
+                self.chroma_writer.extend(marker[-1:])
+
+
+def init_ingest_process():
+    """
+    Initializer of the document ingest pool (see `process_context`): pool processes start
+    without the parent's logging setup and open their own cache connections on first use.
+    """
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Ingest process {os.getpid()} ready")
+
+
+def ingest_pdf_fragment(pdf_path: Path) -> Dict[str, Any]:
+    """
+    Process-pool entry point: ingests one PDF in isolation and returns its graph fragment,
+    vector batch and Chroma records instead of writing to the shared stores, plus the
+    token usage and metrics it recorded.
+    """
+    import httpx
+    from openai import OpenAI
+
+    http_client = httpx.Client(verify=settings.VERIFY_SSL)
+    api_client = OpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.LLM_BASE_URL, http_client=http_client)
+
+    started_metrics = metrics.snapshot()
+    usage = UsageMeter()
+    records = ChromaRecordBuffer()
+    vectors = VectorBuffer()
+    extractor = StructuralExtractor(api_client, collection=records, faiss_index=vectors)
+    graph = GraphBuffer()
+    # Documents are already spread over processes: pages are parsed inline
+    chunks = extractor.ingest_pdf(pdf_path, graph, parse_processes=1, usage=usage)
+
+    return {
+        "filename": pdf_path.name,
+        "chunks": chunks,
+        "nodes": graph.nodes,
+        "edges": graph.edges,
+        "records": records.records,
+        "vectors": vectors.items,
+        "usage": usage.by_model,
+        # Vision/embedding latency and cache counters recorded here, merged into the parent's /metrics
+        "metrics": metrics.delta(started_metrics),
+    }
@@ -0,0 +1,106 @@
+import re
+import logging
+from typing import Any, Dict, List, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Numbers as printed in SEADE/IBGE tables: "1.234,5", "-0,3", "12,3%", "(1,2)", "R$ 10"
+NUMERIC_RE = re.compile(r"^[-+(]?\s*(R\$\s*)?\d[\d.,\s]*%?\)?$")
+# Statistical placeholders that stand in for a number (zero, not available, suppressed)
+PLACEHOLDERS = {"-", "–", "—", "...", "..", "x", "X", "n.d.", "nd", "(*)"}
+# Years are valid column titles in time series tables
+YEAR_RE = re.compile(r"^(19|20)\d{2}$")
+
+# Weights of the parse-quality signals
+HEADER_WEIGHT = 0.3
+FILL_WEIGHT = 0.35
+CONSISTENCY_WEIGHT = 0.35
+
+
+def _cell(value) -> str:
+    return " ".join(str(value).split()) if value is not None else ""
+
+
+def _is_numeric(value: str) -> bool:
+    return value in PLACEHOLDERS or bool(NUMERIC_RE.match(value))
+
+
+def score_table(header: List[str], rows: List[List[str]]) -> Tuple[float, Dict[str, float]]:
+    """
+    Parse quality (0-1) of a table read from the text layer, from three signals:
+    header (named, distinct column titles: text or years), fill (share of non-empty body
+    cells) and consistency (how far each column is from an even mix of numbers and text:
+    1 = a single type, 0 = half and half).
+    """
+    ncols = max((len(r) for r in rows), default=0)
+    if ncols < 2 or not rows:
+        return 0.0, {"header": 0.0, "fill": 0.0, "consistency": 0.0}
+
+    header_signal = 0.0
+    if header and len(header) == ncols:
+        named = [h for h in header if h and (not _is_numeric(h) or YEAR_RE.match(h))]
+        header_signal = (len(named) / ncols) * (len(set(named)) / max(1, len(named)))
+
+    cells = [r[i] if i < len(r) else "" for r in rows for i in range(ncols)]
+    fill = sum(1 for c in cells if c) / len(cells)
+
+    consistencies, weights = [], []
+    for i in range(ncols):
+        values = [r[i] for r in rows if i < len(r) and r[i]]
+        if not values:
+            continue
+        numeric = sum(1 for v in values if _is_numeric(v))
+        majority = max(numeric, len(values) - numeric) / len(values)
+        consistencies.append((majority - 0.5) / 0.5)
+        weights.append(len(values))
+    consistency = sum(c * w for c, w in zip(consistencies, weights)) / sum(weights) if weights else 0.0
+
+    signals = {"header": round(header_signal, 3), "fill": round(fill, 3), "consistency": round(consistency, 3)}
+    score = HEADER_WEIGHT * header_signal + FILL_WEIGHT * fill + CONSISTENCY_WEIGHT * consistency
+    return round(score, 3), signals
+
+
+def to_markdown(header: List[str], rows: List[List[str]]) -> str:
+    ncols = max([len(header)] + [len(r) for r in rows])
+    escape = lambda v: v.replace("|", "\\|")
+    head = header if header and len(header) == ncols else [f"Coluna {i + 1}" for i in range(ncols)]
+    lines = ["| " + " | ".join(escape(h) for h in head) + " |", "|" + "---|" * ncols]
+    for row in rows:
+        row = row + [""] * (ncols - len(row))
+        lines.append("| " + " | ".join(escape(c) for c in row) + " |")
+    return "\n".join(lines)
+
+
+def parse_table(table) -> Dict[str, Any]:
+    """
+    Structured version of a PyMuPDF table built from the text layer:
+    {"header", "rows", "markdown", "score", "signals"}. An internal header (not
+    `header.external`) is the first extracted row and is not repeated in `rows`.
+    """
+    rows = [[_cell(v) for v in row] for row in table.extract()]
+    header = [_cell(v) for v in (table.header.names or [])]
+    if not table.header.external and rows:
+        rows = rows[1:]
+    rows = [r for r in rows if any(r)]
+    score, signals = score_table(header, rows)
+    return {
+        "header": header,
+        "rows": rows,
+        "markdown": to_markdown(header, rows) if rows else None,
+        "score": score,
+        "signals": signals,
+    }
+
+
+def describe_parsed_table(parsed: Dict[str, Any]) -> str:
+    """Short description used instead of a vision call (the markdown is appended as raw data)."""
+    columns = ", ".join(h for h in parsed["header"] if h)
+    ncols = max(len(r) for r in parsed["rows"])
+    text = f"Tabela com {len(parsed['rows'])} linhas e {ncols} colunas"
+    return f"{text}: {columns}." if columns else f"{text}."
+
+
+def is_reliable(parsed: Dict[str, Any]) -> bool:
+    """True when the text-layer parse is good enough to skip the vision model."""
+    return parsed["markdown"] is not None and parsed["score"] >= settings.TABLE_TEXT_MIN_SCORE
@@ -0,0 +1,119 @@
+import os
+import socket
+import threading
+import logging
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from app.config import settings
+from app.pipeline.events import job_events
+from app.pipeline.job_queue import RedisJobQueue, job_queue
+from app.pipeline.job_store import job_store
+from app.pipeline.orchestrator import PipelineOrchestrator
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the Redis cancellation flags of running jobs
+CANCEL_POLL_SECONDS = 2.0
+
+
+class PipelineWorker:
+    """
+    Pulls jobs from the Redis queue and runs them through the same pipeline stages as the
+    in-process scheduler. Status bodies and progress events are reported back through
+    Redis; results land in the shared job store (DATABASE_URL).
+    """
+
+    def __init__(self, queue: RedisJobQueue = None, concurrency: int = None, orchestrator: PipelineOrchestrator = None):
+        self.queue = queue or job_queue
+        self.concurrency = max(1, concurrency or settings.MAX_WORKERS)
+        self.orchestrator = orchestrator or PipelineOrchestrator(execution="local")
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._running: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        job_events.add_listener(self._forward_event)
+
+    def _forward_event(self, job_id: str, event: Optional[Dict[str, Any]]):
+        with self._lock:
+            job = self._running.get(job_id)
+        if job is None:
+            return
+        self.queue.report(job)
+        self.queue.publish_event(job_id, event)
+
+    def run_job(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        orch = self.orchestrator
+        orch._ensure_initialized()
+        # Other workers write the same Faiss index and graph: serialize and reload around writes
+        orch.structural_extractor.shared_lock = self.queue.store_lock
+
+        job["results"] = {}
+        job["status"] = "processing"
+        job["worker"] = self.worker_id
+        if job.get("resume_count"):
+            job["_checkpoints"] = job_store.load_checkpoints(job_id)
+        orch.jobs[job_id] = job
+        orch._cancel_events[job_id] = threading.Event()
+        with self._lock:
+            self._running[job_id] = job
+        self.queue.report(job)
+
+        logger.info(f"Worker {self.worker_id} running job {job_id}")
+        try:
+            orch._run_pipeline(job_id, [Path(p) for p in job["document_paths"]], job.get("config", {}))
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+            self.queue.report(job)
+            self.queue.finish(job_id)
+            # Results are served from the job store; keep the worker's memory flat
+            orch.jobs.pop(job_id, None)
+
+    def _work_loop(self):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.dequeue(timeout=5)
+            except Exception as e:
+                logger.error(f"Worker {self.worker_id} could not reach the queue: {e}")
+                self._stop.wait(5)
+                continue
+            if job is None:
+                continue
+            if job.get("status") != "queued":
+                logger.info(f"Skipping job {job['id']} (status: {job.get('status')})")
+                continue
+            try:
+                self.run_job(job)
+            except Exception:
+                logger.exception(f"Unhandled error running job {job['id']}")
+
+    def _cancel_loop(self):
+        """Turns Redis cancellation flags into the local events checked by the pipeline."""
+        while not self._stop.wait(CANCEL_POLL_SECONDS):
+            with self._lock:
+                running = list(self._running)
+            for job_id in running:
+                try:
+                    if self.queue.is_cancelled(job_id):
+                        event = self.orchestrator._cancel_events.get(job_id)
+                        if event is not None and not event.is_set():
+                            logger.info(f"Cancellation requested for job {job_id}")
+                            event.set()
+                except Exception as e:
+                    logger.warning(f"Cancellation check failed for job {job_id}: {e}")
+
+    def start(self):
+        threads = [threading.Thread(target=self._cancel_loop, name="worker-cancel", daemon=True)]
+        threads += [
+            threading.Thread(target=self._work_loop, name=f"worker-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for t in threads:
+            t.start()
+        logger.info(f"Worker {self.worker_id} started with {self.concurrency} job slots on {self.queue.url}")
+        return threads
+
+    def stop(self):
+        self._stop.set()
@@ -5,6 +5,7 @@ import time
 import logging
 from functools import wraps
 from app.config import NodeType, SemanticNodeType, EdgeType
+from app.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -43,15 +44,39 @@ def retry_with_exponential_backoff(
                         f"Retrying in {sleep_time:.2f}s (Attempt {num_retries}/{max_retries})"
                     )
                     
+                    metrics.inc("retries_total", function=func.__qualname__)
                     time.sleep(sleep_time)
                     delay *= exponential_base
         return wrapper
     return decorator
 
+def process_context():
+    """
+    multiprocessing context for the ingestion process pools. The API and worker processes run
+    threads (scheduler, extraction pools, HTTP clients) that may hold locks at any moment, so
+    pool processes are never forked from them: they come from a forkserver (spawn where it is
+    not available) and build their own state.
+    """
+    import multiprocessing
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        # Imported once in the (single-threaded) server instead of in every pool process
+        ctx.set_forkserver_preload(["app.pipeline.stages.structural_extractor"])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
 def make_doc_id(filename: str) -> str:
     hash_object = hashlib.sha256(filename.encode())
     return f"{NodeType['DOCUMENT']}_{hash_object.hexdigest()[:12]}"
 
+def hash_file(path, chunk_size: int = 1 << 20) -> str:
+    """sha256 of a file's bytes, read in 1 MiB blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
 def make_page_id(doc_id: str, page_num: int) -> str:
     return f"{doc_id}_{NodeType['PAGE']}_{page_num}"
 
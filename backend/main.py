@@ -1,8 +1,10 @@
 import uvicorn
 import logging
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
+from app.metrics import metrics
 
 # Route imports
 from app.api.routes import documents, pipeline, graphs, ontology, nadia
@@ -36,6 +38,11 @@ app.include_router(nadia.router, prefix=f"{settings.API_V1_STR}/nadia")
 async def health_check():
     return {"status": "ok", "version": "1.0.0", "framework": "fastapi"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Stage timings, LLM/embedding/vision latency, token throughput, retries, vector store timings and cache hit rates."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     logger.info(f"Starting server on port {settings.PORT}...")
     uvicorn.run(app, host="0.0.0.0", port=settings.PORT)
@@ -0,0 +1,134 @@
+"""
+Test setup: every store (uploads, Chroma, Faiss, graph, job database) lives in a temporary
+directory, Redis is the in-process fake (REDIS_URL=fakeredis://) and the OpenAI client and
+Chroma's embedding model are replaced by deterministic stand-ins.
+"""
+import os
+import json
+import re
+import hashlib
+import tempfile
+import time
+import types
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+_STORAGE = Path(tempfile.mkdtemp(prefix="kg-tests-"))
+os.environ.update({
+    "STORAGE_DIR": str(_STORAGE),
+    "UPLOAD_DIR": str(_STORAGE / "documents"),
+    "CACHE_DIR": str(_STORAGE / "cache"),
+    "RESULTS_DIR": str(_STORAGE / "results"),
+    "CHROMA_PATH": str(_STORAGE / "chroma"),
+    "FAISS_INDEX_FILE": str(_STORAGE / "faiss.index"),
+    "FAISS_MAP_FILE": str(_STORAGE / "faiss_map.json"),
+    "DATABASE_URL": f"sqlite:///{_STORAGE / 'jobs.db'}",
+    "REDIS_URL": "fakeredis://",
+    "OPENAI_API_KEY": "sk-test",
+    "PARSE_PROCESSES": "1",
+})
+
+
+def _vector(text: str, dim: int) -> list:
+    seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+    return np.random.default_rng(seed).standard_normal(dim).tolist()
+
+
+class FakeOpenAI:
+    """Answers embedding, vision, ontology and triple-extraction requests without a network."""
+
+    def __init__(self, *args, **kwargs):
+        self.embeddings = types.SimpleNamespace(create=self._embed)
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._chat))
+
+    class _Usage(types.SimpleNamespace):
+        def model_dump(self):
+            return dict(vars(self))
+
+    @classmethod
+    def _usage(cls):
+        return cls._Usage(prompt_tokens=100, completion_tokens=50, total_tokens=150)
+
+    def _embed(self, model, input, **kwargs):
+        texts = input if isinstance(input, list) else [input]
+        data = [types.SimpleNamespace(embedding=_vector(t, 1536)) for t in texts]
+        return types.SimpleNamespace(data=data, usage=self._usage())
+
+    def _chat(self, model, messages, **kwargs):
+        content = messages[-1]["content"]
+        if isinstance(content, list):
+            text = "Descrição visual"
+        elif "Ontologia" in content:
+            text = json.dumps({
+                "entities": [{"name": "ORGANIZACAO", "description": "x"}, {"name": "INDICADOR", "description": "y"}],
+                "relations": [{"label": "mede", "source": "ORGANIZACAO", "target": "INDICADOR"}],
+            })
+        else:
+            match = re.search(r"TEXTO:\n(.*?)\n", content)
+            words = (match.group(1) if match else "texto").split()[:2]
+            text = json.dumps({"triples": [{
+                "source": f"Fundacao {words[0]}", "source_type": "ORGANIZACAO",
+                "target": f"Indicador {words[-1]}", "target_type": "INDICADOR", "relation": "mede",
+            }]})
+        message = types.SimpleNamespace(content=text)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=self._usage())
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    import openai
+    from chromadb.api.types import DefaultEmbeddingFunction
+
+    monkeypatch.setattr(openai, "OpenAI", FakeOpenAI)
+    # Stages that bound the client class at import time
+    monkeypatch.setattr("app.pipeline.stages.ontology.OpenAI", FakeOpenAI)
+    monkeypatch.setattr("app.pipeline.stages.kg_extraction.OpenAI", FakeOpenAI)
+    monkeypatch.setattr(DefaultEmbeddingFunction, "__call__", lambda self, input: [np.array(_vector(t, 8), dtype=np.float32) for t in input])
+    return FakeOpenAI
+
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """Writes a text-only PDF whose content depends on `seed`."""
+    import fitz
+
+    def _make(name: str, pages: int = 2, seed: int = 0) -> Path:
+        doc = fitz.open()
+        for p in range(pages):
+            page = doc.new_page()
+            for line in range(30):
+                page.insert_text((72, 72 + 20 * line), f"Linha {line} pagina {p} documento {seed} emprego renda indicador {line * p + seed}", fontsize=9)
+        path = tmp_path / name
+        doc.save(path)
+        doc.close()
+        return path
+
+    return _make
+
+
+@pytest.fixture
+def wait_job():
+    """Waits for the final status of a job (returned with its results)."""
+
+    def _wait(orch, job_id: str, timeout: float = 120) -> dict:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = orch.get_job_status(job_id)
+            if job.get("status") in ("completed", "failed", "cancelled"):
+                return job
+            time.sleep(0.1)
+        raise AssertionError(f"Job {job_id} did not finish")
+
+    return _wait
+
+
+@pytest.fixture
+def run_job(wait_job):
+    """Starts a job on an orchestrator and waits for its final status."""
+
+    def _run(orch, paths, config, timeout: float = 120, **kwargs) -> dict:
+        return wait_job(orch, orch.start_job(paths, config, **kwargs), timeout)
+
+    return _run
@@ -0,0 +1,33 @@
+from app.pipeline.orchestrator import PipelineOrchestrator
+
+
+def test_append_keeps_the_base_graph(fake_llm, make_pdf, run_job, wait_job, monkeypatch):
+    orch = PipelineOrchestrator(execution="local")
+    base = run_job(orch, [make_pdf("corpus.pdf", seed=60)], {"reuse": False})
+    base_nodes = {n["data"]["id"] for n in base["results"]["cytoscape"]["elements"]["nodes"]}
+    assert base_nodes == {"Fundacao Linha", "Indicador 0"}
+
+    # The new document also names an entity the corpus does not have yet
+    extract = orch.kg_extractor.extract_triples
+
+    def with_new_entity(chunk, *args, **kwargs):
+        result = extract(chunk, *args, **kwargs)
+        result["triples"] = result["triples"] + [{
+            "source": "Programa Emprego", "source_type": "ORGANIZACAO",
+            "target": "Indicador 0", "target_type": "INDICADOR", "relation": "mede",
+        }]
+        return result
+
+    monkeypatch.setattr(orch.kg_extractor, "extract_triples", with_new_entity)
+    started = orch.append_job(base["id"], [make_pdf("addendum.pdf", seed=61)], {"reuse": False})
+    appended = wait_job(orch, started["job_id"])
+
+    assert appended["status"] == "completed"
+    nodes = {n["data"]["id"] for n in appended["results"]["cytoscape"]["elements"]["nodes"]}
+    assert nodes == base_nodes | {"Programa Emprego"}
+    assert appended["results"]["append"] == {
+        "base_job_id": base["id"], "new_triples": 2, "new_entities": 1, "updated_entities": 2,
+    }
+    assert appended["corpus_filenames"] == ["corpus.pdf", "addendum.pdf"]
+    # The base job keeps its own result
+    assert orch.get_job_status(base["id"])["results"]["graph_stats"]["node_count"] == 2
@@ -0,0 +1,56 @@
+from app.pipeline.budget import JobBudget
+
+USAGE = {"prompt_tokens": 1000, "completion_tokens": 500}
+
+
+def _spent(tokens=0, cost=0.0):
+    return {"input_tokens": tokens, "output_tokens": 0, "total_cost": cost}
+
+
+def _chunk(index, chars=100):
+    return {"id": f"c{index}", "text": "x" * chars, "metadata": {}}
+
+
+def test_unlimited_job_has_no_budget():
+    assert JobBudget.from_config({}, "gpt-4o", 0.0) is None
+
+
+def test_runs_until_the_projection_exceeds_the_token_limit():
+    budget = JobBudget(max_tokens=10_000, model="gpt-4o")
+    assert budget.decide(_chunk(0), 0, _spent(), remaining=4, in_flight=0) == "run"
+    budget.observe(USAGE)
+    assert budget.decide(_chunk(1), 1, _spent(1500), remaining=3, in_flight=0) == "run"
+    assert budget.record["projection"]["tokens"] == 1500 + 3 * 1500
+
+    # 6 chunks allowed, 10 left: the shorter ones are skipped
+    assert budget.decide(_chunk(2, chars=10), 2, _spent(1500), remaining=10, in_flight=0) == "skip"
+    assert budget.record["skipped_chunks"][0]["chunk_index"] == 2
+
+
+def test_stops_once_spent():
+    budget = JobBudget(max_tokens=1000, model="gpt-4o")
+    assert budget.decide(_chunk(0), 0, _spent(1000), remaining=5, in_flight=0) == "stop"
+    assert budget.stopped and budget.record["actions"][0]["chunks_not_processed"] == 5
+
+
+def test_downgrades_to_the_cheaper_model_before_skipping():
+    budget = JobBudget(max_usd=0.05, model="gpt-4o", fallback_model="gpt-4o-mini")
+    budget.observe(USAGE)  # 0.0075 USD per chunk on gpt-4o
+    assert budget.decide(_chunk(1), 1, _spent(cost=0.0075), remaining=10, in_flight=0) == "run"
+    assert budget.model == "gpt-4o-mini"
+    assert budget.record["actions"][0]["action"] == "downgrade_model"
+
+
+def test_restored_chunks_seed_the_averages():
+    budget = JobBudget(max_tokens=10_000, model="gpt-4o")
+    budget.observe(USAGE, kind="restored")
+    # A resumed job projects from the previous run's chunks instead of running blind
+    assert budget.decide(_chunk(1), 1, _spent(9000), remaining=10, in_flight=0) == "stop"
+
+
+def test_ingestion_usage_recurs_per_chunk():
+    budget = JobBudget(max_tokens=100_000, model="gpt-4o")
+    budget.observe(USAGE)
+    budget.observe({"prompt_tokens": 500, "completion_tokens": 0}, model="text-embedding-3-small", kind="ingestion")
+    budget.decide(_chunk(1), 1, _spent(2000), remaining=2, in_flight=0)
+    assert budget.record["projection"]["tokens"] == 2000 + 2 * 2000
@@ -0,0 +1,22 @@
+import time
+
+from app.pipeline.events import job_events
+from app.pipeline.orchestrator import PipelineOrchestrator
+
+
+def test_every_event_carries_the_job_status(fake_llm, make_pdf, run_job, monkeypatch):
+    events = []
+    monkeypatch.setattr(job_events, "_listeners", [lambda job_id, event: events.append(event)])
+    orch = PipelineOrchestrator(execution="local")
+
+    job = run_job(orch, [make_pdf("events.pdf", seed=30)], {"reuse": False})
+    # The final event follows the stored status
+    deadline = time.time() + 10
+    while None not in events and time.time() < deadline:
+        time.sleep(0.05)
+
+    events = [e for e in events if e is not None]
+    assert {e["event"] for e in events} == {"stage", "progress", "status"}
+    assert all("status" in e["data"] for e in events)
+    assert [e["data"]["status"] for e in events if e["event"] != "status"][0] == "processing"
+    assert events[-1]["data"]["status"] == job["status"] == "completed"
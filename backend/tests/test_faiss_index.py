@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.pipeline.stages.structural_extractor import FaissIndex, vector_id
+
+
+@pytest.fixture(autouse=True)
+def index_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "FAISS_INDEX_FILE", tmp_path / "faiss.index")
+    monkeypatch.setattr(settings, "FAISS_MAP_FILE", tmp_path / "faiss_map.json")
+
+
+def _vec(seed, dim=8):
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+def _index(node_ids, dim=8):
+    fi = FaissIndex(dim)
+    for i, node_id in enumerate(node_ids):
+        fi.upsert(node_id, _vec(i, dim))
+    return fi
+
+
+def test_vector_ids_are_stable_and_non_negative():
+    assert vector_id("DOCUMENT_a_PAGE_1") == vector_id("DOCUMENT_a_PAGE_1")
+    assert vector_id("DOCUMENT_a_PAGE_1") != vector_id("DOCUMENT_a_PAGE_2")
+    assert 0 <= vector_id("x") < 2 ** 63
+
+
+def test_upsert_replaces_the_vector_of_a_node():
+    fi = _index(["DOCUMENT_a_PAGE_1", "DOCUMENT_a_PAGE_2"])
+    fi.upsert("DOCUMENT_a_PAGE_1", _vec(99))
+
+    assert fi.index.ntotal == 2
+    node_id, score = fi.search(_vec(99), k=1)[0]
+    assert node_id == "DOCUMENT_a_PAGE_1" and score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_remove_by_doc_shrinks_the_index():
+    fi = _index(["DOCUMENT_a_PAGE_1", "DOCUMENT_a_PAGE_2", "DOCUMENT_b_PAGE_1"])
+
+    assert fi.remove_by_doc("DOCUMENT_a") == 2
+    assert fi.index.ntotal == 1 and fi.removed == 2
+    assert [n for n, _ in fi.search(_vec(0), k=5)] == ["DOCUMENT_b_PAGE_1"]
+    assert fi.remove_ids(["unknown"]) == 0
+
+
+def test_compact_drops_orphans_only():
+    fi = _index(["DOCUMENT_a_PAGE_1", "DOCUMENT_a_PAGE_2", "DOCUMENT_b_PAGE_1"])
+    fi.remove_ids(["DOCUMENT_b_PAGE_1"])
+
+    assert fi.compact(["DOCUMENT_a_PAGE_1"]) == 1
+    assert fi.index.ntotal == 1 and fi.removed == 0
+    assert list(fi.id_map.values()) == ["DOCUMENT_a_PAGE_1"]
+    assert fi.compact() == 0
+
+
+def test_save_and_load_round_trip():
+    fi = _index(["DOCUMENT_a_PAGE_1", "DOCUMENT_b_PAGE_1"])
+    fi.save()
+
+    loaded = FaissIndex.load()
+    assert FaissIndex.exists()
+    assert sorted(loaded.id_map.values()) == ["DOCUMENT_a_PAGE_1", "DOCUMENT_b_PAGE_1"]
+    assert loaded.search(_vec(1), k=1)[0][0] == "DOCUMENT_b_PAGE_1"
+
+
+def test_legacy_flat_index_is_migrated_keeping_the_latest_copy():
+    import json
+    import faiss
+
+    flat = faiss.IndexFlatIP(8)
+    vectors = np.stack([_vec(0), _vec(1), _vec(2)])
+    faiss.normalize_L2(vectors)
+    flat.add(vectors)
+    faiss.write_index(flat, str(settings.FAISS_INDEX_FILE))
+    settings.FAISS_MAP_FILE.write_text(json.dumps(["n1", "n2", "n1"]))
+
+    fi = FaissIndex.load()
+    assert fi.index.ntotal == 2
+    assert fi.search(_vec(2), k=1)[0][0] == "n1"
+
+
+def test_upsert_many_replaces_with_one_removal(monkeypatch):
+    fi = _index(["DOCUMENT_a_PAGE_1", "DOCUMENT_a_PAGE_2"])
+    removals = []
+    remove_ids = fi.index.remove_ids
+    monkeypatch.setattr(fi.index, "remove_ids", lambda ids: removals.append(len(ids)) or remove_ids(ids))
+
+    fi.upsert_many([("DOCUMENT_a_PAGE_1", _vec(10)), ("DOCUMENT_a_PAGE_2", _vec(11)), ("DOCUMENT_a_PAGE_3", _vec(12)), ("DOCUMENT_a_PAGE_3", _vec(13))])
+
+    assert removals == [2]
+    assert fi.index.ntotal == 3 and len(fi.id_map) == 3
+    assert fi.search(_vec(13), k=1)[0][0] == "DOCUMENT_a_PAGE_3"
+    assert fi.search(_vec(10), k=1)[0][0] == "DOCUMENT_a_PAGE_1"
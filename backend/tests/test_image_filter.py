@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from app.pipeline.stages.image_filter import classify_image
+
+
+def _bar_chart():
+    img = Image.new("RGB", (500, 350), "white")
+    d = ImageDraw.Draw(img)
+    d.line((50, 20, 50, 300), fill="black")
+    d.line((50, 300, 480, 300), fill="black")
+    colors = [(31, 119, 180), (255, 127, 14), (44, 160, 44), (214, 39, 40), (148, 103, 189)]
+    for i, v in enumerate([120, 200, 90, 250, 170]):
+        d.rectangle((70 + i * 80, 300 - v, 120 + i * 80, 300), fill=colors[i])
+    return img
+
+
+def _text_scan():
+    img = Image.new("RGB", (600, 300), "white")
+    d = ImageDraw.Draw(img)
+    for row in range(14):
+        d.text((10, 10 + row * 20), "Fundacao Seade indicadores de emprego e renda 2023 " * 2, fill="black")
+    return img
+
+
+def _gradient():
+    g = np.tile(np.linspace(0, 255, 400, dtype=np.uint8), (300, 1))
+    return Image.fromarray(np.stack([g, g // 2, 255 - g], -1))
+
+
+def _banner():
+    img = Image.new("RGB", (1000, 90), (10, 60, 120))
+    ImageDraw.Draw(img).rectangle((0, 40, 1000, 50), fill=(250, 200, 0))
+    return img
+
+
+def _line_chart():
+    img = Image.new("RGB", (600, 400), "white")
+    d = ImageDraw.Draw(img)
+    for y in range(50, 360, 50):
+        d.line((40, y, 580, y), fill=(220, 220, 220))
+    d.line([(40 + i * 27, 300 - int(100 * np.sin(i / 4)) - i * 5) for i in range(21)], fill=(200, 0, 0), width=3)
+    return img
+
+
+def _icon():
+    img = Image.new("RGB", (96, 96), "white")
+    ImageDraw.Draw(img).ellipse((10, 10, 86, 86), fill=(0, 120, 200))
+    return img
+
+
+def _noise():
+    return Image.fromarray(np.random.default_rng(0).integers(0, 255, (300, 300, 3), dtype=np.uint8))
+
+
+@pytest.mark.parametrize("make, informative, reason", [
+    (lambda: Image.new("RGB", (300, 200), (230, 230, 240)), False, "uniform"),
+    (_banner, False, "aspect"),
+    (_gradient, False, "smooth"),
+    (_noise, False, "photo"),
+    (_text_scan, True, "text"),
+    (_icon, False, "icon"),
+    (_line_chart, True, "informative"),
+    # Alternating bars and gaps read as text rows; either way the chart is kept
+    (_bar_chart, True, None),
+])
+def test_classification(make, informative, reason):
+    ok, why, features = classify_image(make())
+    assert ok == informative and why == (reason or why), (why, features)
+
+
+def test_grayscale_and_palette_images_are_accepted():
+    ok, _, features = classify_image(_bar_chart().convert("P"))
+    assert ok and features["width"] == 500
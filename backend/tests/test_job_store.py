@@ -0,0 +1,82 @@
+import pytest
+
+from app.config import settings
+from app.pipeline.job_store import JobStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # A new store imports the exports found in RESULTS_DIR
+    monkeypatch.setattr(settings, "RESULTS_DIR", tmp_path / "results")
+    return JobStore(url=f"sqlite:///{tmp_path / 'jobs.db'}")
+
+
+def _job(job_id, **fields):
+    return {"id": job_id, "status": "completed", "created_at": 1.0, "filenames": ["a.pdf"], "results": {}, **fields}
+
+
+def test_sections_are_stored_and_read_separately(store):
+    store.save(_job("a", results={"ontology": {"entities": []}, "graph_stats": {"node_count": 3, "edge_count": 2}}))
+
+    assert store.get("a")["results"] == {"ontology": {"entities": []}, "graph_stats": {"node_count": 3, "edge_count": 2}}
+    assert store.get("a", sections=["graph_stats"])["results"] == {"graph_stats": {"node_count": 3, "edge_count": 2}}
+    assert "results" not in store.get("a", include_results=False)
+    assert store.list_jobs()[0]["node_count"] == 3
+
+
+def test_reused_job_keeps_source_sections_after_save_section(store):
+    store.save(_job("src", fingerprint="f", results={"ontology": {"entities": []}, "cytoscape": {"elements": []}}))
+    store.save(_job("copy", fingerprint="f", reused_from="src"))
+
+    store.save_section("copy", "document_summary", {"text": "resumo"})
+    store.save(_job("copy", fingerprint="f", reused_from="src"))
+
+    results = store.get("copy")["results"]
+    assert results == {"ontology": {"entities": []}, "cytoscape": {"elements": []}, "document_summary": {"text": "resumo"}}
+    assert store.get("copy", sections=["document_summary"])["results"] == {"document_summary": {"text": "resumo"}}
+    # The source is untouched and stays the one reused by later submissions
+    assert "document_summary" not in store.get("src")["results"]
+    assert store.find_by_fingerprint("f") == "src"
+
+
+def test_reused_job_lists_the_source_graph_counts(store):
+    store.save(_job("src", fingerprint="f", results={"graph_stats": {"node_count": 2, "edge_count": 1}}))
+    store.save(_job("copy", fingerprint="f", reused_from="src", created_at=2.0))
+
+    counts = {j["id"]: (j["node_count"], j["edge_count"]) for j in store.list_jobs()}
+    assert counts == {"src": (2, 1), "copy": (2, 1)}
+
+
+def test_find_by_fingerprint_ignores_reused_and_unfinished_jobs(store):
+    store.save(_job("running", fingerprint="f", status="processing"), include_results=False)
+    store.save(_job("copy", fingerprint="f", reused_from="missing"))
+    store.save_section("copy", "document_summary", {"text": "resumo"})
+    assert store.find_by_fingerprint("f") is None
+
+    store.save(_job("src", fingerprint="f", results={"ontology": {}}))
+    assert store.find_by_fingerprint("f") == "src"
+
+
+def test_list_jobs_filters_and_mark_interrupted(store):
+    store.save(_job("old", created_at=1.0))
+    store.save(_job("new", status="processing", created_at=2.0), include_results=False)
+
+    assert [j["id"] for j in store.list_jobs()] == ["new", "old"]
+    assert [j["id"] for j in store.list_jobs(status="processing")] == ["new"]
+    assert [j["id"] for j in store.list_jobs(since=1.5)] == ["new"]
+
+    assert store.mark_interrupted() == 1
+    assert store.get("new", include_results=False)["status"] == "failed"
+    assert store.clear() == 2 and store.list_jobs() == []
+
+
+def test_checkpoints_replace_per_unit_and_clear(store):
+    store.save(_job("a"))
+    store.save_checkpoint("a", "chunk:0", {"n": 1})
+    store.save_checkpoint("a", "chunk:0", {"n": 2})
+    store.save_checkpoint("a", "ontology", {"entities": []})
+    assert store.load_checkpoints("a") == {"chunk:0": {"n": 2}, "ontology": {"entities": []}}
+
+    store.clear_checkpoints("a")
+    assert store.load_checkpoints("a") == {}
+    assert store.get("a")["status"] == "completed"
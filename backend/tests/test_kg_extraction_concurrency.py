@@ -0,0 +1,61 @@
+import threading
+import time
+
+import pytest
+
+from app.pipeline.orchestrator import PipelineOrchestrator
+
+
+class SlowFirstExtractor:
+    """Earlier chunks take longer, so calls finish in reverse order; tracks calls in flight."""
+
+    def __init__(self, total):
+        self.total = total
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.finished = []
+        self._lock = threading.Lock()
+
+    def processing_model(self, user_instructions=""):
+        return "gpt-4o"
+
+    def extract_triples(self, chunk, ontology, user_instructions="", model=None):
+        index = int(chunk["id"])
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01 * (self.total - index))
+        with self._lock:
+            self.in_flight -= 1
+            self.finished.append(index)
+        return {
+            "triples": [{"source": f"s{index}", "target": f"t{index}", "relation": "r"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5},
+            "latency": 0.01,
+        }
+
+
+def _job():
+    return {
+        "id": "concurrency-test", "status": "processing", "progress": 0.0, "results": {}, "config": {"checkpoint": False},
+        "usage": {"input_tokens": 0, "output_tokens": 0, "total_cost": 0.0},
+    }
+
+
+def test_triples_keep_chunk_order_with_bounded_concurrency():
+    total = 12
+    orch = PipelineOrchestrator(execution="local")
+    orch.kg_extractor = SlowFirstExtractor(total)
+    chunks = [{"id": str(i), "text": f"chunk {i}", "metadata": {}} for i in range(total)]
+    job = _job()
+
+    triples = orch._extract_triples_concurrent(
+        job, chunks, {}, {"extraction_concurrency": 3}, time.time(), initial_heuristic=1.0,
+    )
+
+    assert orch.kg_extractor.finished != sorted(orch.kg_extractor.finished)
+    assert [t["source"] for t in triples] == [f"s{i}" for i in range(total)]
+    assert orch.kg_extractor.max_in_flight == 3
+    assert job["usage"]["input_tokens"] == 10 * total
+    assert job["progress"] == pytest.approx(0.85)
+
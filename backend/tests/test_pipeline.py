@@ -0,0 +1,13 @@
+import json
+
+from app.config import settings
+from app.pipeline.orchestrator import PipelineOrchestrator
+
+
+def test_results_are_exported_as_plain_json(fake_llm, make_pdf, run_job):
+    orch = PipelineOrchestrator(execution="local")
+    job = run_job(orch, [make_pdf("export.pdf", seed=40)], {"reuse": False})
+
+    exported = json.loads((settings.RESULTS_DIR / f"export_pdf_{job['id']}.json").read_text(encoding="utf-8"))
+    assert exported["status"] == "completed"
+    assert exported["results"]["cytoscape"] == job["results"]["cytoscape"]
@@ -0,0 +1,57 @@
+import io
+
+import fitz
+from PIL import Image, ImageDraw
+
+from app.config import settings
+from app.graph.knowledge_graph import KnowledgeGraph
+from app.pipeline.stages.structural_extractor import StructuralExtractor
+
+
+def _chart_png() -> bytes:
+    img = Image.new("RGB", (600, 400), "white")
+    d = ImageDraw.Draw(img)
+    for y in range(50, 360, 50):
+        d.line((40, y, 580, y), fill=(220, 220, 220))
+    d.line([(40 + i * 27, 300 - (i * 37) % 200) for i in range(21)], fill=(200, 0, 0), width=3)
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_unchanged_document_is_not_read_again(fake_llm, make_pdf, monkeypatch):
+    # Without the caches, any vision or embedding call would show up below
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "IMAGE_CACHE_ENABLED", False)
+    calls = {"vision": 0, "embeddings": 0}
+
+    class CountingOpenAI(fake_llm):
+        def _embed(self, model, input, **kwargs):
+            calls["embeddings"] += 1
+            return super()._embed(model, input, **kwargs)
+
+        def _chat(self, model, messages, **kwargs):
+            calls["vision"] += isinstance(messages[-1]["content"], list)
+            return super()._chat(model, messages, **kwargs)
+
+    path = make_pdf("same.pdf", seed=70)
+    with fitz.open(path) as doc:
+        doc[0].insert_image(fitz.Rect(72, 400, 472, 667), stream=_chart_png())
+        doc.saveIncr()
+    extractor = StructuralExtractor(CountingOpenAI())
+    kg = KnowledgeGraph.load()
+
+    first = extractor.ingest_pdf(path, kg)
+    after_first, ntotal = dict(calls), extractor.faiss_index.index.ntotal
+    assert after_first["vision"] > 0 and after_first["embeddings"] > 0
+
+    second = extractor.ingest_pdf(path, kg)
+    assert calls == after_first
+    assert extractor.faiss_index.index.ntotal == ntotal
+    assert [(c["id"], c["text"]) for c in second] == [(c["id"], c["text"]) for c in first]
+
+    # Changed bytes are read again and replace the previous records instead of adding to them
+    path.write_bytes(make_pdf("changed.pdf", seed=71).read_bytes())
+    extractor.ingest_pdf(path, kg)
+    assert calls["embeddings"] > after_first["embeddings"]
+    assert extractor.faiss_index.index.ntotal == ntotal - after_first["vision"]
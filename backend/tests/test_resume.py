@@ -0,0 +1,32 @@
+from app.pipeline.job_store import job_store
+from app.pipeline.orchestrator import PipelineOrchestrator
+
+
+def test_resume_does_not_resend_checkpointed_chunks(fake_llm, make_pdf, run_job, wait_job, monkeypatch):
+    orch = PipelineOrchestrator(execution="local")
+    orch._ensure_initialized()
+    extract = orch.kg_extractor.extract_triples
+    sent = []
+
+    def failing_third(chunk, *args, **kwargs):
+        sent.append(chunk["id"])
+        if len(sent) == 3:
+            raise RuntimeError("rate limit exhausted")
+        return extract(chunk, *args, **kwargs)
+
+    monkeypatch.setattr(orch.kg_extractor, "extract_triples", failing_third)
+    job = run_job(orch, [make_pdf("resume.pdf", pages=3, seed=50)], {"reuse": False, "extraction_concurrency": 1})
+    assert job["status"] == "failed"
+    done = sorted(u for u in job_store.load_checkpoints(job["id"]) if u.startswith("chunk:"))
+    assert done == ["chunk:0", "chunk:1"]
+    first_run, sent[:] = list(sent), []
+
+    monkeypatch.setattr(orch.kg_extractor, "extract_triples", lambda chunk, *a, **k: sent.append(chunk["id"]) or extract(chunk, *a, **k))
+    assert orch.resume_job(job["id"])["status"] == "queued"
+    resumed = wait_job(orch, job["id"])
+
+    assert resumed["status"] == "completed" and resumed["resume_count"] == 1
+    assert not set(sent) & set(first_run[:2])
+    assert sent[0] == first_run[2] and len(first_run[:2] + sent) == len(set(first_run[:2] + sent))
+    # Checkpoints are dropped once the job completes
+    assert job_store.load_checkpoints(job["id"]) == {}
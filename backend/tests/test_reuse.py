@@ -0,0 +1,16 @@
+from app.pipeline.job_store import job_store
+from app.pipeline.orchestrator import PipelineOrchestrator
+
+
+def test_identical_submission_reuses_the_result_whatever_its_priority(fake_llm, make_pdf, run_job):
+    path = make_pdf("reuse.pdf", seed=20)
+    orch = PipelineOrchestrator(execution="local")
+
+    source = run_job(orch, [path], {"user_instructions": "reuse"}, priority="interactive")
+    copy = run_job(orch, [path], {"user_instructions": "reuse", "priority": "bulk"})
+
+    assert source["status"] == copy["status"] == "completed"
+    assert copy["reused_from"] == source["id"]
+    assert copy["results"]["graph_stats"] == source["results"]["graph_stats"]
+    listed = {j["id"]: (j["node_count"], j["edge_count"]) for j in job_store.list_jobs()}
+    assert listed[copy["id"]] == listed[source["id"]] != (0, 0)
@@ -0,0 +1,81 @@
+import threading
+import time
+
+from app.pipeline.scheduler import JobScheduler
+
+
+class Runner:
+    """Records the order jobs start in; each job blocks until released (or all are)."""
+
+    def __init__(self):
+        self.started = []
+        self.release_all = threading.Event()
+        self._gates = {}
+
+    def __call__(self, job_id):
+        self._gates.setdefault(job_id, threading.Event())
+        self.started.append(job_id)
+        while not (self.release_all.is_set() or self._gates[job_id].is_set()):
+            time.sleep(0.01)
+
+    def release(self, job_id):
+        self._gates.setdefault(job_id, threading.Event()).set()
+
+    def wait_started(self, count, timeout=5):
+        deadline = time.time() + timeout
+        while len(self.started) < count and time.time() < deadline:
+            time.sleep(0.01)
+        return list(self.started)
+
+
+def _submit(scheduler, job_id, priority, submitter):
+    scheduler.submit(job_id, (job_id,), priority=priority, submitter=submitter)
+
+
+def test_interactive_first_then_submitters_in_rotation():
+    runner = Runner()
+    scheduler = JobScheduler(runner, max_workers=1)
+    _submit(scheduler, "running", "interactive", "alice")
+    assert runner.wait_started(1) == ["running"]
+
+    _submit(scheduler, "bob-1", "bulk", "bob")
+    _submit(scheduler, "bob-2", "bulk", "bob")
+    _submit(scheduler, "carol-1", "interactive", "carol")
+    _submit(scheduler, "dave-1", "bulk", "dave")
+    assert [scheduler.queue_position(j) for j in ("carol-1", "bob-1", "dave-1", "bob-2")] == [0, 1, 2, 3]
+    assert scheduler.stats()["queued"] == {"interactive": 1, "bulk": 3}
+
+    runner.release_all.set()
+    assert runner.wait_started(5) == ["running", "carol-1", "bob-1", "dave-1", "bob-2"]
+
+
+def test_cancel_removes_only_queued_jobs():
+    runner = Runner()
+    scheduler = JobScheduler(runner, max_workers=1)
+    _submit(scheduler, "running", "interactive", "alice")
+    runner.wait_started(1)
+    _submit(scheduler, "queued", "bulk", "alice")
+
+    assert not scheduler.cancel("running")
+    assert scheduler.cancel("queued")
+    assert not scheduler.cancel("queued")
+    assert scheduler.queue_position("queued") is None
+
+    runner.release_all.set()
+    time.sleep(0.2)
+    assert runner.started == ["running"]
+
+
+def test_submitter_cap_lets_others_through():
+    runner = Runner()
+    scheduler = JobScheduler(runner, max_workers=2, max_per_submitter=1)
+    _submit(scheduler, "alice-1", "bulk", "alice")
+    _submit(scheduler, "alice-2", "bulk", "alice")
+    _submit(scheduler, "bob-1", "bulk", "bob")
+
+    assert sorted(runner.wait_started(2)) == ["alice-1", "bob-1"]
+    assert scheduler.stats()["running_by_submitter"] == {"alice": 1, "bob": 1}
+
+    runner.release("alice-1")
+    assert runner.wait_started(3)[-1] == "alice-2"
+    runner.release_all.set()
@@ -0,0 +1,24 @@
+from app.config import settings
+from app.graph.knowledge_graph import KnowledgeGraph
+from app.pipeline.orchestrator import PipelineOrchestrator
+from app.utils import make_doc_id
+
+
+def test_budget_stop_still_ingests_every_document(fake_llm, make_pdf, run_job, monkeypatch):
+    # A one-slot queue keeps ingestion blocked on the consumer when the budget stops extraction
+    monkeypatch.setattr(settings, "STREAMING_QUEUE_SIZE", 1)
+    paths = [make_pdf(f"budget_{i}.pdf", pages=3, seed=10 + i) for i in range(3)]
+    orch = PipelineOrchestrator(execution="local")
+
+    job = run_job(orch, paths, {
+        "streaming": True, "reuse": False, "ontology_sample_chunks": 1, "budget_tokens": 100,
+    })
+
+    assert job["status"] == "completed"
+    assert job["budget"]["stopped"]
+    assert "structural_mapping" in job["completed_stages"]
+    assert job["stage_timings"]["structural_mapping"] > 0
+    kg = KnowledgeGraph.load()
+    assert {make_doc_id(p.name) for p in paths} <= set(kg.document_ids())
+    # Every document carries its completion marker: a new job would skip re-reading them
+    assert all(orch.structural_extractor.ingested_chunks(p, kg) for p in paths)
@@ -0,0 +1,40 @@
+from app.pipeline.stages.table_text import score_table, to_markdown, is_reliable, describe_parsed_table
+
+
+HEADER = ["Município", "2021", "2022"]
+ROWS = [["São Paulo", "1.234,5", "1.300,2"], ["Campinas", "-", "250,1"], ["Santos", "98,7%", "(1,2)"]]
+
+
+def test_clean_statistical_table_scores_high():
+    score, signals = score_table(HEADER, ROWS)
+    assert signals == {"header": 1.0, "fill": 1.0, "consistency": 1.0}
+    assert score == 1.0
+
+
+def test_garbled_table_scores_low():
+    rows = [["São Paulo 1.234,5", "", ""], ["", "Campinas", "12"], ["3", "", "texto"]]
+    score, signals = score_table(["", "1", "1"], rows)
+    assert signals["header"] == 0.0
+    assert score < 0.5
+
+
+def test_single_column_is_not_a_table():
+    assert score_table(["A"], [["1"], ["2"]])[0] == 0.0
+
+
+def test_markdown_pads_rows_and_escapes_pipes():
+    md = to_markdown(["a", "b"], [["x|y"], ["1", "2"]])
+    assert md.splitlines() == ["| a | b |", "|---|---|", "| x\\|y |  |", "| 1 | 2 |"]
+    assert to_markdown([], [["1", "2"]]).splitlines()[0] == "| Coluna 1 | Coluna 2 |"
+
+
+def test_reliability_threshold_and_description(monkeypatch):
+    from app.config import settings
+
+    score, signals = score_table(HEADER, ROWS)
+    parsed = {"header": HEADER, "rows": ROWS, "markdown": to_markdown(HEADER, ROWS), "score": score, "signals": signals}
+    monkeypatch.setattr(settings, "TABLE_TEXT_MIN_SCORE", 0.8)
+    assert is_reliable(parsed)
+    assert not is_reliable({**parsed, "score": 0.5})
+    assert not is_reliable({**parsed, "markdown": None})
+    assert describe_parsed_table(parsed) == "Tabela com 3 linhas e 3 colunas: Município, 2021, 2022."
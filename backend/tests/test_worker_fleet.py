@@ -0,0 +1,76 @@
+import threading
+import time
+
+from app.graph.knowledge_graph import KnowledgeGraph
+from app.pipeline.job_queue import RedisJobQueue
+from app.pipeline.orchestrator import PipelineOrchestrator
+from app.pipeline.stages.structural_extractor import FaissIndex, StructuralExtractor
+from app.pipeline.worker import PipelineWorker
+from app.utils import make_doc_id
+
+
+def _wait_for(api, job_ids, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        statuses = {job_id: api.get_job_status(job_id, include_results=False).get("status") for job_id in job_ids}
+        if all(s in ("completed", "failed", "cancelled") for s in statuses.values()):
+            return statuses
+        time.sleep(0.2)
+    raise AssertionError(f"Jobs did not finish: {statuses}")
+
+
+def test_store_lock_is_exclusive():
+    queue = RedisJobQueue(url="fakeredis://")
+    other = RedisJobQueue(url="fakeredis://")
+    key = "kg:pipeline:lock:stores"
+    with queue.store_lock(ttl=5):
+        token = queue.client.get(key)
+        assert token
+        assert not other.client.set(key, "other", nx=True)
+    assert queue.client.get(key) is None
+
+
+def test_two_workers_share_the_stores(fake_llm, make_pdf):
+    queue = RedisJobQueue(url="fakeredis://")
+    api = PipelineOrchestrator(execution="queue")
+    api.job_queue = queue
+    workers = [PipelineWorker(queue=queue, concurrency=1, orchestrator=PipelineOrchestrator(execution="local")) for _ in range(2)]
+    # Both load the (empty) stores before either writes: without the shared lock the last save wins
+    for worker in workers:
+        worker.orchestrator._ensure_initialized()
+
+    paths = [make_pdf(f"fleet_{i}.pdf", seed=i) for i in range(2)]
+    job_ids = [api.start_job([path], {"reuse": False}) for path in paths]
+    for worker in workers:
+        worker.start()
+    try:
+        statuses = _wait_for(api, job_ids)
+    finally:
+        for worker in workers:
+            worker.stop()
+    assert set(statuses.values()) == {"completed"}
+
+    doc_ids = {make_doc_id(path.name) for path in paths}
+    assert doc_ids <= set(KnowledgeGraph.load().document_ids())
+    vectors = FaissIndex.load().id_map.values()
+    assert all(any(node_id.startswith(doc_id) for node_id in vectors) for doc_id in doc_ids)
+
+
+def test_store_lock_is_not_held_while_a_document_is_consumed(fake_llm, make_pdf):
+    extractor = StructuralExtractor(fake_llm())
+    extractor.shared_lock = RedisJobQueue(url="fakeredis://").store_lock
+    kg = KnowledgeGraph.load()
+    first, second = make_pdf("held.pdf", pages=3, seed=1), make_pdf("other.pdf", seed=2)
+
+    stream = extractor.iter_pdf(first, kg, flush_pages=1, force=True)
+    assert next(stream)
+    # The consumer of the first document is still busy with its first page
+    other = threading.Thread(target=extractor.ingest_pdf, args=(second, kg), kwargs={"force": True}, daemon=True)
+    other.start()
+    other.join(timeout=60)
+    assert not other.is_alive()
+    assert len(list(stream)) == 2
+
+    doc_ids = {make_doc_id(p.name) for p in (first, second)}
+    assert doc_ids <= set(KnowledgeGraph.load().document_ids())
+    assert extractor.ingested_chunks(first, kg) is not None
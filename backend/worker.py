@@ -0,0 +1,24 @@
+import argparse
+import logging
+import time
+from app.config import settings
+from app.pipeline.worker import PipelineWorker
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline worker: runs jobs enqueued by the API on REDIS_URL")
+    parser.add_argument("--concurrency", type=int, default=settings.MAX_WORKERS, help="jobs run in parallel by this worker")
+    args = parser.parse_args()
+    # Workers only exist in queue mode (e.g. the job store must not fail jobs queued in Redis)
+    settings.PIPELINE_EXECUTION = "queue"
+
+    worker = PipelineWorker(concurrency=args.concurrency)
+    worker.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logger.info("Stopping worker (running jobs are interrupted and can be resumed)...")
+        worker.stop()
@@ -59,6 +59,16 @@ class APIClient {
         return response.json();
     }
 
+    // Server-sent events: snapshot, stage, progress (ETA, usage deltas) and the final status
+    subscribeJobEvents(jobId, onEvent, onError) {
+        const source = new EventSource(`${API_BASE_URL}/pipeline/events/${jobId}`);
+        ['snapshot', 'stage', 'progress', 'status'].forEach((type) => {
+            source.addEventListener(type, (e) => onEvent(type, JSON.parse(e.data)));
+        });
+        source.onerror = onError;
+        return source;
+    }
+
     async getGraph(jobId) {
         const response = await fetch(`${API_BASE_URL}/graphs/${jobId}`);
         if (!response.ok) {
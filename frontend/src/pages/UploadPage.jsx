@@ -18,21 +18,44 @@ const UploadPage = () => {
     }, []);
 
     useEffect(() => {
-        if (jobId && jobStatus?.status !== 'completed' && jobStatus?.status !== 'failed') {
-            const interval = setInterval(async () => {
+        if (!jobId) return;
+        const isFinished = (status) => ['completed', 'failed', 'cancelled'].includes(status);
+        let interval = null;
+
+        // Fallback when the event stream is unavailable: poll the status endpoint
+        const startPolling = () => {
+            interval = setInterval(async () => {
                 try {
                     const status = await api.getJobStatus(jobId);
                     setJobStatus(status);
-                    if (status.status === 'completed' || status.status === 'failed') {
+                    if (isFinished(status.status)) {
                         clearInterval(interval);
                     }
                 } catch (err) {
                     console.error('Falha ao obter status do trabalho:', err);
                 }
             }, 2000);
-            return () => clearInterval(interval);
-        }
-    }, [jobId, jobStatus]);
+        };
+
+        const source = api.subscribeJobEvents(
+            jobId,
+            (type, data) => {
+                setJobStatus((prev) => (type === 'snapshot' ? data : { ...prev, ...data }));
+                if (isFinished(data.status)) {
+                    source.close();
+                }
+            },
+            () => {
+                source.close();
+                if (!interval) startPolling();
+            }
+        );
+
+        return () => {
+            source.close();
+            if (interval) clearInterval(interval);
+        };
+    }, [jobId]);
 
     const loadDocuments = async () => {
         try {